@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import UserProfile, Portfolio, MarketData
+from .models import UserProfile, Portfolio, MarketData, LatestQuote, StockAlert
 
 # Register your models here.
 
@@ -29,3 +29,15 @@ class MarketDataAdmin(admin.ModelAdmin):
     list_filter = ['symbol']
     search_fields = ['symbol']
     ordering = ['-timestamp']
+
+@admin.register(LatestQuote)
+class LatestQuoteAdmin(admin.ModelAdmin):
+    list_display = ['symbol', 'current_price', 'daily_change', 'volume', 'timestamp']
+    search_fields = ['symbol']
+    ordering = ['symbol']
+
+@admin.register(StockAlert)
+class StockAlertAdmin(admin.ModelAdmin):
+    list_display = ['user', 'stock_symbol', 'alert_type', 'target_value', 'is_active', 'triggered', 'last_triggered_at']
+    list_filter = ['alert_type', 'is_active', 'triggered']
+    search_fields = ['user__email', 'stock_symbol']
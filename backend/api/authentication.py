@@ -0,0 +1,103 @@
+"""
+JWT authentication for the API and the websocket stack.
+
+``CachedJWTAuthentication`` verifies access tokens the way SimpleJWT does
+(HS256 signature, expiry, token type) but resolves the token's user through
+``user_cache`` instead of a query per request. ``JWTAuthMiddleware`` does
+the same for websocket connects, so token-authenticated sockets never
+touch the sessions table.
+"""
+from urllib.parse import parse_qs
+
+from channels.auth import AuthMiddlewareStack
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .services.user_cache import user_cache
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication with cached user resolution, plus an async ``aauthenticate``."""
+
+    def user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def check_user(self, user, validated_token):
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+    def get_user(self, validated_token):
+        return self.check_user(user_cache.get(self.user_id(validated_token)), validated_token)
+
+    async def aget_user(self, validated_token):
+        return self.check_user(await user_cache.aget(self.user_id(validated_token)), validated_token)
+
+    async def aauthenticate(self, request):
+        """``authenticate`` for async views; no thread hop on a cache hit."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aauthenticate_token(self, raw_token):
+        """The active user ``raw_token`` belongs to, or None if it does not check out."""
+        try:
+            return await self.aget_user(self.get_validated_token(raw_token))
+        except (AuthenticationFailed, InvalidToken, TokenError):
+            return None
+
+
+class JWTAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates websocket connections from an access token, sent as
+    ``?token=<jwt>`` (browsers cannot set headers on websockets) or an
+    ``Authorization: Bearer <jwt>`` header. A bad token connects as
+    AnonymousUser. Connections without a token go to ``fallback`` (the
+    session stack) when one is given.
+    """
+
+    def __init__(self, inner, fallback=None):
+        super().__init__(inner)
+        self.fallback = fallback
+        self.authentication = CachedJWTAuthentication()
+
+    def raw_token(self, scope):
+        token = parse_qs(scope.get('query_string', b'').decode()).get('token')
+        if token:
+            return token[0].encode()
+        header = dict(scope.get('headers', ())).get(b'authorization')
+        return self.authentication.get_raw_token(header) if header else None
+
+    async def __call__(self, scope, receive, send):
+        try:
+            raw_token = self.raw_token(scope)
+        except AuthenticationFailed:
+            raw_token = b''
+        if raw_token is None and self.fallback is not None:
+            return await self.fallback(scope, receive, send)
+
+        user = await self.authentication.aauthenticate_token(raw_token) if raw_token else None
+        return await super().__call__(dict(scope, user=user or AnonymousUser()), receive, send)
+
+
+def JWTAuthMiddlewareStack(inner):
+    """Token authentication, falling back to cookie sessions for connections without a token."""
+    return JWTAuthMiddleware(inner, fallback=AuthMiddlewareStack(inner))
@@ -0,0 +1,21 @@
+"""
+Benchmarks for the hot paths of the API.
+
+Each benchmark exposes ``run(**options)``-style callables returning a
+JSON-serialisable dict of timings; ``manage.py benchmark <name>`` runs them
+and prints the JSON. Benchmarks in DATABASE_BENCHMARKS load a seeded
+fixture (see ``fixtures``) and run against a throwaway test database.
+"""
+from . import capacity, rest, tasks, throttle, valuation, websocket
+
+BENCHMARKS = {
+    'valuation': valuation.run,
+    'portfolio_list': rest.portfolio_list,
+    'advisory': rest.advisory,
+    'fanout': websocket.fanout,
+    'tasks': tasks.run,
+    'throttle': throttle.run,
+    'capacity': capacity.run,
+}
+
+DATABASE_BENCHMARKS = {'portfolio_list', 'advisory', 'tasks'}
@@ -0,0 +1,40 @@
+import time
+
+import numpy as np
+
+
+def timed(fn, repeat, setup=None):
+    """
+    Runs ``fn`` ``repeat`` times, calling ``setup`` (untimed) before each
+    run; returns (last result, timing summary in ms).
+    """
+    samples = []
+    result = None
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples = np.array(samples)
+    return result, {
+        'runs': repeat,
+        'min_ms': round(float(samples.min()), 3),
+        'median_ms': round(float(np.median(samples)), 3),
+        'max_ms': round(float(samples.max()), 3),
+    }
+
+
+def latency_summary(samples_ms):
+    """Count, percentiles and max of latency samples in ms."""
+    samples = np.asarray(samples_ms, dtype=float)
+    if not len(samples):
+        return {'count': 0}
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        'count': len(samples),
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'max_ms': round(float(samples.max()), 3),
+    }
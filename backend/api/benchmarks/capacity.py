@@ -0,0 +1,324 @@
+"""
+Connection capacity and soak test for the websocket stack.
+
+Opens StockConsumer sockets against ``backend.asgi.application`` (the full
+stack: origin validation, auth middleware, routing) in growing steps, spread
+over ``symbols`` symbols. At every step it publishes ``messages`` rounds of
+simulated quotes to the symbols' groups the way the ingest worker does and
+records, per step:
+
+- fan-out latency percentiles (publish to receipt, every delivered frame);
+- Python heap allocated per added connection (tracemalloc) and process RSS;
+- CPU time per delivered frame and per published tick;
+- deliveries that never arrived within ``timeout``. Quotes still queued
+  when a newer one arrives are replaced, not delivered, and are counted as
+  superseded.
+
+The first step whose p99 exceeds ``latency_budget_ms`` or that loses
+deliveries is reported as the saturation point. With ``soak_seconds`` the
+largest healthy step then keeps running at ``rate`` rounds per second,
+reporting latency and RSS per window to show drift.
+
+Clients run in the same process and event loop as the application, so the
+figures include their (small) cost and are an upper bound for one worker.
+"""
+import asyncio
+import json
+import resource
+import string
+import time
+import tracemalloc
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from api.services.quote_hub import INGEST_HEARTBEAT_KEY, stock_group_name
+from api.services.simulator import simulator
+
+from .base import latency_summary
+from .fixtures import forget_quotes, simulated_market
+from .websocket import IN_MEMORY_LAYERS, Socket
+
+CONNECT_BATCH = 100
+# Long enough to span a connect batch or a round; a killed run stops refreshing it
+HEARTBEAT_TTL = 60
+
+
+def rss_bytes():
+    """Resident set size of this process (None where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * resource.getpagesize()
+
+
+def _mb(size):
+    return None if size is None else round(size / 2 ** 20, 2)
+
+
+def symbol_names(count):
+    """Up to 26**3 distinct four-letter symbols (valid for ``ws/stock/<symbol>/``)."""
+    names = []
+    for n in range(count):
+        letters = ''
+        for _ in range(3):
+            n, digit = divmod(n, 26)
+            letters = string.ascii_uppercase[digit] + letters
+        names.append('Z' + letters)
+    return names
+
+
+def _host():
+    return next((host for host in settings.ALLOWED_HOSTS if host not in ('*', '') and not host.startswith('.')),
+                'localhost')
+
+
+class Round:
+    """One published tick per symbol; done when every client has seen it (or a later one)."""
+
+    def __init__(self, number, expected):
+        self.number = number
+        self.remaining = expected
+        self.done = asyncio.get_running_loop().create_future()
+
+    def reach(self):
+        self.remaining -= 1
+        if self.remaining <= 0 and not self.done.done():
+            self.done.set_result(None)
+
+
+class Client:
+    """A socket plus a reader recording when each round reaches it."""
+
+    def __init__(self, application, symbol, host):
+        self.symbol = symbol
+        self.socket = Socket(application, f'/ws/stock/{symbol}/', headers=[
+            (b'host', host.encode()), (b'origin', f'http://{host}'.encode()),
+        ])
+        self.last_round = -1
+        self.reader = None
+
+    async def connect(self, timeout):
+        return await self.socket.connect(timeout)
+
+    def start(self, harness):
+        self.reader = asyncio.create_task(self.read(harness))
+
+    async def read(self, harness):
+        while True:
+            # Straight off the queue: receive_output would cancel the app on timeout
+            output = await self.socket.output_queue.get()
+            received_at = time.perf_counter()
+            if output.get('type') != 'websocket.send':
+                continue
+            data = harness.decode(output).get('data') or {}
+            number = data.get('round')
+            if number is None or number <= self.last_round:
+                continue
+            harness.latencies.append((received_at - data['sent_at']) * 1000)
+            for missed in range(self.last_round + 1, number + 1):
+                pending = harness.rounds.get(missed)
+                if pending:
+                    pending.reach()
+            self.last_round = number
+
+    async def close(self):
+        if self.reader:
+            self.reader.cancel()
+        try:
+            await self.socket.disconnect()
+        except Exception:
+            pass
+
+
+class Harness:
+    def __init__(self, symbols, timeout):
+        from backend.asgi import application
+
+        self.application = application
+        self.symbols = symbols
+        self.timeout = timeout
+        self.host = _host()
+        self.clients = []
+        self.rounds = {}
+        self.latencies = []
+        self.published = 0
+
+    async def heartbeat(self):
+        """Keeps pollers standing down while the harness publishes in place of the ingest worker."""
+        await cache.aset(INGEST_HEARTBEAT_KEY, 'capacity', HEARTBEAT_TTL)
+
+    @staticmethod
+    def decode(output):
+        return json.loads(output['text']) if output.get('text') else {}
+
+    async def grow(self, connections):
+        """Opens clients up to ``connections``; returns (connect ms, refused)."""
+        started, refused = time.perf_counter(), 0
+        while len(self.clients) < connections:
+            await self.heartbeat()
+            batch = [
+                Client(self.application, self.symbols[(len(self.clients) + i) % len(self.symbols)], self.host)
+                for i in range(min(CONNECT_BATCH, connections - len(self.clients)))
+            ]
+            accepted = await asyncio.gather(*[client.connect(self.timeout) for client in batch],
+                                            return_exceptions=True)
+            for client, ok in zip(batch, accepted):
+                if ok is True:
+                    client.start(self)
+                    self.clients.append(client)
+                else:
+                    refused += 1
+            if refused:
+                break
+        return (time.perf_counter() - started) * 1000, refused
+
+    async def publish(self, number):
+        """Publishes round ``number`` and waits for it; returns deliveries that timed out."""
+        await self.heartbeat()
+        current = self.rounds[number] = Round(number, len(self.clients))
+        quotes = simulator.fetch_quotes(self.symbols)
+        layer = get_channel_layer()
+        for symbol, quote in quotes.items():
+            await layer.group_send(stock_group_name(symbol), {
+                'type': 'stock_update',
+                'data': {**quote, 'round': number, 'sent_at': time.perf_counter()},
+            })
+            self.published += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(current.done), self.timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.rounds.pop(number, None)
+        return max(current.remaining, 0)
+
+    async def close(self):
+        for start in range(0, len(self.clients), CONNECT_BATCH):
+            await asyncio.gather(*[client.close() for client in self.clients[start:start + CONNECT_BATCH]])
+        self.clients = []
+
+
+def _levels(levels):
+    if isinstance(levels, str):
+        levels = [int(level) for level in levels.split(',') if level.strip()]
+    return sorted(set(levels))
+
+
+def run(levels='100,250,500,1000,2000', symbols=50, messages=10, latency_budget_ms=250,
+        soak_seconds=0, rate=2, timeout=10, **options):
+    levels = _levels(levels)
+    names = symbol_names(min(symbols, max(levels)))
+    layers = getattr(settings, 'CHANNEL_LAYERS', None) or IN_MEMORY_LAYERS
+
+    async def drive():
+        harness = Harness(names, timeout)
+        steps, saturation, healthy = [], None, None
+        number = 0
+        try:
+            for level in levels:
+                tracemalloc.start()
+                heap_before, rss_before = tracemalloc.get_traced_memory()[0], rss_bytes()
+                added = level - len(harness.clients)
+                connect_ms, refused = await harness.grow(level)
+                heap_after = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+                rss_after = rss_bytes()
+
+                harness.latencies = []
+                published_before, timeouts = harness.published, 0
+                cpu_started = time.process_time()
+                for _ in range(messages):
+                    timeouts += await harness.publish(number)
+                    number += 1
+                cpu_seconds = time.process_time() - cpu_started
+                delivered = len(harness.latencies)
+                deliveries = latency_summary(harness.latencies)
+                expected = messages * len(harness.clients)
+
+                step = {
+                    'connections': len(harness.clients),
+                    'refused': refused,
+                    'connect_ms': round(connect_ms, 3),
+                    'heap_kb_per_connection': round((heap_after - heap_before) / max(added, 1) / 1024, 2),
+                    'rss_mb': _mb(rss_after),
+                    'rss_kb_per_connection': (
+                        round((rss_after - rss_before) / max(added, 1) / 1024, 2) if rss_after and rss_before else None
+                    ),
+                    'deliveries': deliveries,
+                    'superseded': max(expected - delivered - timeouts, 0),
+                    'timeouts': timeouts,
+                    'cpu_us_per_delivery': round(cpu_seconds / max(delivered, 1) * 1e6, 2),
+                    'cpu_ms_per_tick': round(cpu_seconds / max(harness.published - published_before, 1) * 1000, 3),
+                }
+                steps.append(step)
+
+                reason = None
+                if refused:
+                    reason = f'{refused} connections refused'
+                elif timeouts:
+                    reason = f'{timeouts} deliveries timed out'
+                elif deliveries.get('p99_ms', 0) > latency_budget_ms:
+                    reason = f"p99 {deliveries['p99_ms']} ms over the {latency_budget_ms} ms budget"
+                if reason:
+                    saturation = {'connections': step['connections'], 'reason': reason}
+                    break
+                healthy = step['connections']
+
+            soak = await _soak(harness, number, soak_seconds, rate) if soak_seconds and not saturation else None
+        finally:
+            await harness.close()
+        return steps, saturation, healthy, soak
+
+    with simulated_market(), override_settings(CHANNEL_LAYERS=layers):
+        forget_quotes(names)
+        # The harness publishes in place of the ingest worker, so pollers stand down
+        cache.set(INGEST_HEARTBEAT_KEY, 'capacity', HEARTBEAT_TTL)
+        try:
+            steps, saturation, healthy, soak = async_to_sync(drive)()
+        finally:
+            cache.delete(INGEST_HEARTBEAT_KEY)
+
+    return {
+        'symbols': len(names),
+        'messages_per_step': messages,
+        'latency_budget_ms': latency_budget_ms,
+        'steps': steps,
+        'max_healthy_connections': healthy,
+        'saturation': saturation,
+        'soak': soak,
+    }
+
+
+async def _soak(harness, number, seconds, rate, windows=10):
+    """Publishes ``rate`` rounds per second for ``seconds``, summarising each window."""
+    window_seconds = seconds / windows
+    rss_start = rss_bytes()
+    started = time.perf_counter()
+    results = []
+    while time.perf_counter() - started < seconds:
+        harness.latencies = []
+        window_started, timeouts = time.perf_counter(), 0
+        while time.perf_counter() - window_started < window_seconds:
+            round_started = time.perf_counter()
+            timeouts += await harness.publish(number)
+            number += 1
+            await asyncio.sleep(max(0.0, 1 / rate - (time.perf_counter() - round_started)))
+        results.append({
+            'elapsed_s': round(time.perf_counter() - started, 1),
+            'deliveries': latency_summary(harness.latencies),
+            'timeouts': timeouts,
+            'rss_mb': _mb(rss_bytes()),
+        })
+    rss_end = rss_bytes()
+    return {
+        'connections': len(harness.clients),
+        'seconds': seconds,
+        'rate': rate,
+        'windows': results,
+        'rss_growth_mb': _mb(rss_end - rss_start) if rss_start and rss_end else None,
+    }
@@ -0,0 +1,312 @@
+"""
+Synthetic datasets at production scale.
+
+Rows are generated in chunks. Every chunk draws from its own RNG stream
+(seed, table, chunk start) and rows carry explicit primary keys allocated
+above the current maximum, so chunks are independent of each other: they
+can be written in any order, by any number of worker processes, and the
+same options always produce the same rows.
+"""
+import csv
+import io
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, connections
+from django.db.models import Max
+from django.utils import timezone
+
+from api.models import LatestQuote, MarketData, Portfolio, StockAlert, UserProfile
+from api.services.alert_engine import alert_engine
+from api.services.bulk import insert_rows
+from api.services.market_history import market_history
+from api.services.simulator import DAY, EPOCH, MarketSimulator
+from api.services.symbol_index import symbol_index
+from api.services.valuation import to_decimal
+
+# Current prices are read off the simulator at a fixed instant so they do
+# not depend on when the dataset is generated
+PRICE_MOMENT = EPOCH + 2000 * DAY + 15 * 3600
+
+TABLES = {
+    'users': User,
+    'profiles': UserProfile,
+    'holdings': Portfolio,
+    'alerts': StockAlert,
+    'ticks': MarketData,
+}
+
+ALERT_TYPES = ['price_above', 'price_below', 'percent_change', 'volume_above']
+ALERT_TYPE_WEIGHTS = [0.4, 0.4, 0.1, 0.1]
+
+
+def universe_symbols(symbols):
+    """The first ``symbols`` tickers of the simulator universe that fit the models."""
+    universe = MarketSimulator(universe_size=symbols + 50).universe
+    return [(symbol, name) for symbol, name in universe if len(symbol) <= 10][:symbols]
+
+
+def _choices(field):
+    return [value for value, _ in UserProfile._meta.get_field(field).choices]
+
+
+class SyntheticDataset:
+    """
+    ``users`` users with profiles, ``holdings`` distinct holdings per user,
+    ``alerts`` alerts spread over random users, and ``ticks`` MarketData rows
+    per symbol ending at the symbol's current price, plus a listing and a
+    LatestQuote for each of ``symbols`` symbols.
+    """
+
+    def __init__(self, users=1000, holdings=10, alerts=1000, ticks=0, symbols=500, tick_interval=60,
+                 seed=0, prefix='synthetic-', password='password', chunk_size=5000, use_copy=False):
+        self.users = users
+        self.alerts = alerts
+        self.ticks = ticks
+        self.tick_interval = tick_interval
+        self.seed = seed
+        self.prefix = prefix
+        self.password = password
+        self.chunk_size = chunk_size
+        self.use_copy = use_copy
+
+        self.listing = universe_symbols(symbols)
+        self.symbols = np.array([symbol for symbol, _ in self.listing], dtype=object)
+        self.holdings = min(holdings, len(self.symbols))
+        market = MarketSimulator(seed=seed)
+        self.prices = np.array([market.price(symbol, PRICE_MOMENT) for symbol in self.symbols])
+        self.password_hash = None
+        self.base_ids = {}
+        self.now = None
+
+    # Planning
+
+    def chunks(self, table):
+        """``(start, stop)`` ranges of one chunk each for ``table``."""
+        if table in ('users', 'profiles'):
+            total, per_chunk = self.users, self.chunk_size
+        elif table == 'holdings':
+            total, per_chunk = self.users, max(1, self.chunk_size // max(1, self.holdings))
+        elif table == 'alerts':
+            total, per_chunk = self.alerts, self.chunk_size
+        else:
+            total, per_chunk = (len(self.symbols) if self.ticks else 0), max(1, self.chunk_size // max(1, self.ticks))
+        return [(start, min(start + per_chunk, total)) for start in range(0, total, per_chunk)]
+
+    def phases(self):
+        """Tables in dependency order; tables within a phase are written concurrently."""
+        return [['users'], ['profiles', 'holdings', 'alerts', 'ticks']]
+
+    def prepare(self):
+        """Parent-process setup: one password hash, id ranges and reference data."""
+        self.password_hash = make_password(self.password)
+        self.now = timezone.now()
+        self.base_ids = {
+            table: model.objects.aggregate(top=Max('id'))['top'] or 0
+            for table, model in TABLES.items()
+        }
+
+        listing_file = io.StringIO()
+        writer = csv.writer(listing_file)
+        writer.writerow(['symbol', 'name'])
+        writer.writerows(self.listing)
+        listing_file.seek(0)
+        symbol_index.load_listing(listing_file, batch_size=self.chunk_size)
+
+        LatestQuote.objects.bulk_create([
+            LatestQuote(symbol=symbol, current_price=to_decimal(price), daily_change=0, volume=0, timestamp=self.now)
+            for symbol, price in zip(self.symbols, self.prices)
+        ], batch_size=self.chunk_size, update_conflicts=True, unique_fields=['symbol'],
+            update_fields=['current_price', 'daily_change', 'volume', 'timestamp'])
+        if self.ticks:
+            market_history.ensure_partitions()
+
+    def finish(self):
+        """Moves id sequences past the explicit ids and reloads the alert index."""
+        statements = connection.ops.sequence_reset_sql(no_style(), list(TABLES.values()))
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+        alert_engine.invalidate()
+        alert_engine.reload()
+
+    def exists(self):
+        return User.objects.filter(username__startswith=self.prefix).exists()
+
+    def clear(self):
+        """Deletes users with this dataset's prefix, with their profiles, holdings and alerts."""
+        return User.objects.filter(username__startswith=self.prefix).delete()[0]
+
+    # Rows
+
+    def rng(self, table, start):
+        return np.random.default_rng([self.seed, list(TABLES).index(table), start])
+
+    def user_id(self, index):
+        return self.base_ids['users'] + int(index) + 1
+
+    def username(self, index):
+        return f'{self.prefix}{int(index):07d}'
+
+    def rows(self, table, start, stop):
+        return getattr(self, f'{table}_rows')(self.rng(table, start), start, stop)
+
+    def users_rows(self, rng, start, stop):
+        return [
+            {
+                'id': self.user_id(i),
+                'username': self.username(i),
+                'email': f'{self.username(i)}@example.com',
+                'password': self.password_hash,
+                'first_name': 'Synthetic',
+                'last_name': f'User {i}',
+                'is_active': True,
+                'is_staff': False,
+                'is_superuser': False,
+                'date_joined': self.now,
+            }
+            for i in range(start, stop)
+        ]
+
+    def profiles_rows(self, rng, start, stop):
+        count = stop - start
+        columns = {
+            field: rng.choice(_choices(field), count)
+            for field in ('investment_type', 'investment_reason', 'income_range', 'investment_experience',
+                          'experience_level', 'preferred_sectors')
+        }
+        risk = rng.integers(0, 11, count)
+        horizon = rng.integers(1, 31, count)
+        return [
+            {
+                'id': self.base_ids['profiles'] + i + 1,
+                'user_id': self.user_id(i),
+                'name': f'Synthetic User {i}',
+                'risk_tolerance': int(risk[n]),
+                'investment_horizon': int(horizon[n]),
+                **{field: str(values[n]) for field, values in columns.items()},
+            }
+            for n, i in enumerate(range(start, stop))
+        ]
+
+    def holdings_rows(self, rng, start, stop):
+        rows = []
+        for i in range(start, stop):
+            picks = rng.choice(len(self.symbols), self.holdings, replace=False)
+            quantity = rng.integers(1, 500, self.holdings)
+            cost = self.prices[picks] * rng.uniform(0.7, 1.3, self.holdings)
+            for k, (symbol, shares, price) in enumerate(zip(picks, quantity, cost)):
+                rows.append({
+                    'id': self.base_ids['holdings'] + i * self.holdings + k + 1,
+                    'user_id': self.user_id(i),
+                    'stock_symbol': self.symbols[symbol],
+                    'quantity': int(shares),
+                    'purchase_price': to_decimal(price),
+                    'total_value': to_decimal(self.prices[symbol] * shares),
+                })
+        return rows
+
+    def alerts_rows(self, rng, start, stop):
+        count = stop - start
+        owners = rng.integers(0, self.users, count)
+        picks = rng.integers(0, len(self.symbols), count)
+        kinds = rng.choice(ALERT_TYPES, count, p=ALERT_TYPE_WEIGHTS)
+        # Price targets within +-5% of the current price, so a pass fires about half
+        offsets = rng.uniform(-0.05, 0.05, count)
+        percents = rng.uniform(1, 10, count)
+        volumes = rng.integers(10**5, 10**8, count)
+        rows = []
+        for n in range(count):
+            if kinds[n] in ('price_above', 'price_below'):
+                target = self.prices[picks[n]] * (1 + offsets[n])
+            elif kinds[n] == 'percent_change':
+                target = percents[n]
+            else:
+                target = volumes[n]
+            rows.append({
+                'id': self.base_ids['alerts'] + start + n + 1,
+                'user_id': self.user_id(owners[n]),
+                'stock_symbol': self.symbols[picks[n]],
+                'alert_type': str(kinds[n]),
+                'target_value': to_decimal(target),
+                'notification_email': f'{self.username(owners[n])}@example.com',
+            })
+        return rows
+
+    def ticks_rows(self, rng, start, stop):
+        # Log-price random walk run backwards from the current price
+        sigma = 0.02 * math.sqrt(self.tick_interval / DAY)
+        ages = np.arange(self.ticks - 1, -1, -1) * self.tick_interval
+        timestamps = [self.now - timedelta(seconds=int(age)) for age in ages]
+        rows = []
+        for j in range(start, stop):
+            steps = np.concatenate([[0.0], rng.normal(0, sigma, self.ticks - 1)])
+            path = self.prices[j] * np.exp(-np.cumsum(steps)[::-1])
+            volume = np.cumsum(rng.integers(0, 10_000, self.ticks))
+            for k in range(self.ticks):
+                rows.append({
+                    'id': self.base_ids['ticks'] + j * self.ticks + k + 1,
+                    'symbol': self.symbols[j],
+                    'current_price': to_decimal(path[k]),
+                    'daily_change': to_decimal(path[k] - path[0]),
+                    'volume': int(volume[k]),
+                    'timestamp': timestamps[k],
+                })
+        return rows
+
+    # Writing
+
+    def write_chunk(self, table, start, stop):
+        rows = self.rows(table, start, stop)
+        return table, insert_rows(TABLES[table], rows, batch_size=self.chunk_size, use_copy=self.use_copy)
+
+    def generate(self, workers=1, on_chunk=None):
+        """
+        Writes the dataset, fanning chunks out to ``workers`` processes (each
+        with its own database connection). Returns per-table row counts and
+        the wall time of the phase that wrote them.
+        """
+        self.prepare()
+        summary = {table: {'rows': 0, 'seconds': 0.0} for table in TABLES}
+        for phase in self.phases():
+            started = time.perf_counter()
+            jobs = [(table, start, stop) for table in phase for start, stop in self.chunks(table)]
+            if workers > 1 and jobs:
+                # Children must not share the parent's connection
+                connections.close_all()
+                with ProcessPoolExecutor(workers, initializer=_init_worker) as pool:
+                    results = pool.map(_write_chunk, [self] * len(jobs), *zip(*jobs))
+                    for table, count in results:
+                        summary[table]['rows'] += count
+                        if on_chunk:
+                            on_chunk(table, count)
+            else:
+                for job in jobs:
+                    table, count = self.write_chunk(*job)
+                    summary[table]['rows'] += count
+                    if on_chunk:
+                        on_chunk(table, count)
+            elapsed = round(time.perf_counter() - started, 3)
+            for table in phase:
+                summary[table]['seconds'] = elapsed
+        self.finish()
+        return summary
+
+
+def _init_worker():
+    import django
+    django.setup()
+    connections.close_all()
+
+
+def _write_chunk(dataset, table, start, stop):
+    try:
+        return dataset.write_chunk(table, start, stop)
+    finally:
+        connections.close_all()
@@ -0,0 +1,125 @@
+"""
+Reproducible database fixtures for the end-to-end benchmarks.
+
+Fixtures are small SyntheticDatasets, so the same sizes and seed give the
+same users, holdings and alerts on every run.
+"""
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import override_settings
+
+from api.models import LatestQuote, MarketData, StockAlert, StockSymbol
+from api.services.alert_engine import alert_engine
+from api.services.providers import SimulatedProvider, market_data
+from api.services.quote_cache import quote_cache
+from api.services.simulator import simulator
+
+from .datagen import SyntheticDataset
+
+USERNAME_PREFIX = 'bench-user-'
+PASSWORD = 'benchmark'
+
+_loaded = {}
+
+
+@contextmanager
+def isolated_database():
+    """Runs the benchmarks in a throwaway test database."""
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        _loaded.clear()
+
+
+@contextmanager
+def simulated_market(**simulator_options):
+    """
+    Points every provider path at the market simulator and runs Celery tasks
+    and emails in-process, so benchmarks never leave the machine.
+    ``simulator_options`` (``latency_ms``, ``error_rate``...) are applied to
+    the shared simulator for the duration.
+    """
+    from backend.celery import app
+
+    quote_providers, search_providers = market_data.quote_providers, market_data.search_providers
+    always_eager = app.conf.task_always_eager
+    previous = {name: getattr(simulator, name) for name in simulator_options}
+    with override_settings(
+        MARKET_DATA_BACKEND='simulated',
+        EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    ):
+        market_data.quote_providers = [SimulatedProvider()]
+        market_data.search_providers = [SimulatedProvider()]
+        app.conf.task_always_eager = True
+        for name, value in simulator_options.items():
+            setattr(simulator, name, value)
+        try:
+            yield
+        finally:
+            market_data.quote_providers, market_data.search_providers = quote_providers, search_providers
+            app.conf.task_always_eager = always_eager
+            for name, value in previous.items():
+                setattr(simulator, name, value)
+
+
+def load_fixture(users=200, holdings_per_user=10, alerts=2_000, symbols=500, seed=0, batch_size=2000):
+    """
+    Creates the benchmark users (with profiles), holdings, alerts, listings
+    and latest quotes, replacing any previous fixture. Returns a summary;
+    loading the same sizes twice in one process is a no-op.
+    """
+    key = (users, holdings_per_user, alerts, symbols, seed)
+    if key in _loaded:
+        return _loaded[key]
+    clear_fixture()
+
+    dataset = SyntheticDataset(
+        users=users, holdings=holdings_per_user, alerts=alerts, ticks=1, symbols=symbols, seed=seed,
+        prefix=USERNAME_PREFIX, password=PASSWORD, chunk_size=batch_size,
+    )
+    dataset.generate()
+    forget_quotes(dataset.symbols)
+
+    _loaded[key] = {
+        'users': users,
+        'holdings_per_user': dataset.holdings,
+        'holdings': users * dataset.holdings,
+        'alerts': alerts,
+        'symbols': len(dataset.symbols),
+        'seed': seed,
+    }
+    return _loaded[key]
+
+
+def clear_fixture():
+    """
+    Deletes the fixture users (and their holdings and alerts) along with all
+    listings and quotes; meant for the database from ``isolated_database``.
+    """
+    User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+    StockSymbol.objects.all().delete()
+    MarketData.objects.all().delete()
+    LatestQuote.objects.all().delete()
+    _loaded.clear()
+
+
+def forget_quotes(symbols):
+    """Drops ``symbols`` from both quote cache tiers so the next read is cold."""
+    quote_cache.clear()
+    cache.delete_many([quote_cache.key(symbol) for symbol in symbols])
+
+
+def fixture_users():
+    return User.objects.filter(username__startswith=USERNAME_PREFIX).order_by('username')
+
+
+def reset_alerts():
+    """Re-arms every fixture alert so each pass fires the same set."""
+    StockAlert.objects.filter(user__username__startswith=USERNAME_PREFIX).update(triggered=False, last_triggered_at=None)
+    alert_engine.invalidate()
+    alert_engine.reload()
@@ -0,0 +1,98 @@
+"""REST hot paths: the portfolio list endpoint and the stock advisory view."""
+import asyncio
+import time
+from collections import Counter
+
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import PortfolioViewSet, stock_advisory_view
+
+from .base import latency_summary
+from .datagen import universe_symbols
+from .fixtures import fixture_users, forget_quotes, load_fixture, simulated_market
+
+
+def portfolio_list(users=200, holdings_per_user=10, alerts=2_000, symbols=500, seed=0, repeat=5,
+                   sample_users=50, **options):
+    """Latency and query count of ``GET`` on PortfolioViewSet.list per user."""
+    fixture = load_fixture(users, holdings_per_user, alerts, symbols, seed)
+    view = PortfolioViewSet.as_view({'get': 'list'})
+    factory = APIRequestFactory()
+    sample = list(fixture_users()[:sample_users])
+
+    latencies, queries, statuses = [], [], Counter()
+    with simulated_market():
+        forget_quotes([symbol for symbol, _ in universe_symbols(symbols)])
+        for _ in range(repeat):
+            for user in sample:
+                request = factory.get('/api/portfolios/')
+                force_authenticate(request, user=user)
+                with CaptureQueriesContext(connection) as captured:
+                    started = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    latencies.append((time.perf_counter() - started) * 1000)
+                queries.append(len(captured.captured_queries))
+                statuses[response.status_code] += 1
+
+    return {
+        'fixture': fixture,
+        'requests': len(latencies),
+        'statuses': dict(statuses),
+        'queries_per_request': {'min': min(queries), 'max': max(queries)},
+        **latency_summary(latencies),
+    }
+
+
+def advisory_queries(symbols):
+    """Natural-language queries naming the fixture companies."""
+    actions = ['buy', 'sell', 'invest']
+    queries = []
+    for i, (_, name) in enumerate(universe_symbols(symbols)):
+        words = ' '.join(word for word in name.split() if word.isalpha())
+        queries.append(f"{actions[i % len(actions)]} {words}")
+    return queries
+
+
+def advisory(users=200, holdings_per_user=10, alerts=2_000, symbols=500, seed=0, requests=500,
+             concurrency=20, **options):
+    """
+    Requests per second through ``stock_advisory_view`` at ``concurrency``
+    concurrent requests: a cold pass with an empty quote cache, then
+    ``requests`` warm requests.
+    """
+    fixture = load_fixture(users, holdings_per_user, alerts, symbols, seed)
+    factory = RequestFactory()
+    queries = advisory_queries(symbols)
+
+    async def call(query, semaphore, latencies, statuses):
+        async with semaphore:
+            started = time.perf_counter()
+            response = await stock_advisory_view(factory.get('/api/stock-advisory/', {'query': query}))
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[response.status_code] += 1
+
+    async def drive(batch):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies, statuses = [], Counter()
+        started = time.perf_counter()
+        await asyncio.gather(*[call(query, semaphore, latencies, statuses) for query in batch])
+        elapsed = time.perf_counter() - started
+        return {
+            'requests': len(batch),
+            'requests_per_sec': round(len(batch) / elapsed, 1),
+            'statuses': dict(statuses),
+            **latency_summary(latencies),
+        }
+
+    with simulated_market():
+        forget_quotes([symbol for symbol, _ in universe_symbols(symbols)])
+        # Runs on the caller's thread so DB work sees the benchmark database
+        cold = async_to_sync(drive)(queries)
+        warm = async_to_sync(drive)([queries[i % len(queries)] for i in range(requests)])
+
+    return {'fixture': fixture, 'concurrency': concurrency, 'cold': cold, 'warm': warm}
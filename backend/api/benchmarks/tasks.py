@@ -0,0 +1,40 @@
+"""Wall time of the periodic Celery tasks over the benchmark fixture."""
+from django.core import mail
+
+from api.models import StockAlert
+from api.tasks import check_stock_alerts, update_portfolio_values
+
+from .base import timed
+from .datagen import universe_symbols
+from .fixtures import USERNAME_PREFIX, forget_quotes, load_fixture, reset_alerts, simulated_market
+
+
+def run(users=200, holdings_per_user=10, alerts=2_000, symbols=500, seed=0, repeat=5, **options):
+    """
+    ``update_portfolio_values`` and ``check_stock_alerts`` run in-process.
+    Alerts are re-armed before every pass, so each pass fires (and emails)
+    the same alerts.
+    """
+    fixture = load_fixture(users, holdings_per_user, alerts, symbols, seed)
+
+    def rearm():
+        reset_alerts()
+        mail.outbox = []
+
+    with simulated_market():
+        forget_quotes([symbol for symbol, _ in universe_symbols(symbols)])
+        _, portfolio_timing = timed(update_portfolio_values, repeat)
+        fired, alert_timing = timed(check_stock_alerts, repeat, setup=rearm)
+        emails = len(mail.outbox)
+
+    triggered = StockAlert.objects.filter(user__username__startswith=USERNAME_PREFIX, triggered=True).count()
+    return {
+        'fixture': fixture,
+        'update_portfolio_values': portfolio_timing,
+        'check_stock_alerts': {
+            **alert_timing,
+            'fired': fired,
+            'triggered': triggered,
+            'emails': emails,
+        },
+    }
@@ -0,0 +1,60 @@
+"""Per-request overhead of the GCRA throttles against DRF's stock throttle."""
+import time
+from types import SimpleNamespace
+
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import UserRateThrottle
+
+from api.services.rate_limit import RateLimiter
+from api.throttling import UserGCRAThrottle
+
+from .base import latency_summary
+
+
+def _requests(users):
+    factory = APIRequestFactory()
+    requests = []
+    for user_id in range(1, users + 1):
+        request = Request(factory.get('/api/'))
+        request.user = SimpleNamespace(pk=user_id, is_authenticated=True)
+        requests.append(request)
+    return requests
+
+
+def _measure(throttle_class, requests, count):
+    samples = []
+    allowed = 0
+    for i in range(count):
+        request = requests[i % len(requests)]
+        started = time.perf_counter()
+        allowed += throttle_class().allow_request(request, None)
+        samples.append((time.perf_counter() - started) * 1000)
+    return {'allowed': allowed, **latency_summary(samples)}
+
+
+def run(requests=20000, users=100, **options):
+    clients = _requests(users)
+    # Fresh keys per run and phase, so earlier state (in Redis too) never leaks in
+    run_id = time.time_ns()
+
+    def gcra(rate, phase):
+        limiter = RateLimiter(key_prefix=f'bench_rate_limit_{run_id}_{phase}')
+        return type('BenchGCRAThrottle', (UserGCRAThrottle,), {'rate': rate, 'limiter': limiter})
+
+    def drf(rate, phase):
+        return type('BenchUserRateThrottle', (UserRateThrottle,), {
+            'rate': rate, 'cache_format': f'bench_throttle_{run_id}_{phase}_%(scope)s_%(ident)s',
+        })
+
+    # A rate no client reaches, then one every client is over after a request
+    open_rate, closed_rate = f'{requests * 10}/minute', '1/hour'
+    return {
+        'backend': 'redis' if RateLimiter()._redis_script() else 'local',
+        'requests': requests,
+        'clients': users,
+        'gcra_allowed': _measure(gcra(open_rate, 'open'), clients, requests),
+        'drf_allowed': _measure(drf(open_rate, 'open'), clients, requests),
+        'gcra_rejected': _measure(gcra(closed_rate, 'closed'), clients, requests),
+        'drf_rejected': _measure(drf(closed_rate, 'closed'), clients, requests),
+    }
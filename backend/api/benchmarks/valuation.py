@@ -0,0 +1,39 @@
+"""Valuation engine throughput on synthetic columnar holdings."""
+import numpy as np
+
+from api.services.valuation import Holdings, value_holdings
+
+from .base import timed
+
+
+def synthetic_holdings(holdings, users, symbols, seed=0):
+    """Random holdings spread over ``users`` users and ``symbols`` tickers, plus a price map."""
+    rng = np.random.default_rng(seed)
+    tickers = np.array([f'SYM{i:05d}' for i in range(symbols)], dtype=object)
+    data = Holdings(
+        ids=np.arange(1, holdings + 1),
+        user_ids=rng.integers(1, users + 1, holdings),
+        symbols=tickers[rng.integers(0, symbols, holdings)],
+        quantity=rng.integers(1, 500, holdings),
+        price_cents=rng.integers(100, 100_000, holdings),
+    )
+    prices = {ticker: float(price) for ticker, price in zip(tickers, rng.uniform(1, 1000, symbols))}
+    return data, prices
+
+
+def run(holdings=1_000_000, users=10_000, symbols=5_000, repeat=5, **options):
+    data, prices = synthetic_holdings(holdings, users, symbols)
+
+    def value():
+        valuation = value_holdings(data, prices)
+        return valuation, valuation.per_user()
+
+    (valuation, per_user), timing = timed(value, repeat)
+    return {
+        'holdings': holdings,
+        'users': len(per_user),
+        'symbols': symbols,
+        'total_value': round(float(valuation.user_value.sum()), 2),
+        'holdings_per_sec': round(holdings / (timing['median_ms'] / 1000)),
+        **timing,
+    }
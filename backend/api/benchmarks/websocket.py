@@ -0,0 +1,110 @@
+"""Websocket fan-out: one published tick delivered to N StockConsumer sockets."""
+import asyncio
+import json
+import time
+
+from asgiref.sync import async_to_sync
+from asgiref.testing import ApplicationCommunicator
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.conf import settings
+from django.core.cache import cache
+from django.test.utils import override_settings
+
+from api.routing import websocket_urlpatterns
+from api.services.quote_hub import INGEST_HEARTBEAT_KEY, stock_group_name
+
+from .base import latency_summary
+from .fixtures import forget_quotes, simulated_market
+
+IN_MEMORY_LAYERS = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+
+
+class Socket(ApplicationCommunicator):
+    """
+    Minimal in-process websocket client for an ASGI application (what
+    channels.testing.WebsocketCommunicator does, without needing daphne).
+    """
+
+    def __init__(self, application, path, query_string='', **scope):
+        super().__init__(application, {
+            'type': 'websocket',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query_string.encode(),
+            'headers': [],
+            'subprotocols': [],
+            **scope,
+        })
+
+    async def connect(self, timeout):
+        await self.send_input({'type': 'websocket.connect'})
+        return (await self.receive_output(timeout))['type'] == 'websocket.accept'
+
+    async def receive_json(self, timeout):
+        return json.loads((await self.receive_output(timeout))['text'])
+
+    async def send_json(self, message):
+        await self.send_input({'type': 'websocket.receive', 'text': json.dumps(message)})
+
+    async def disconnect(self, code=1000, timeout=1):
+        await self.send_input({'type': 'websocket.disconnect', 'code': code})
+        await self.wait(timeout)
+
+
+def fanout(subscribers=100, messages=20, symbol='AAPL', timeout=10, **options):
+    """
+    Connects ``subscribers`` sockets to ``ws/stock/<symbol>/`` and publishes
+    ``messages`` ticks to the symbol's group the way the ingest worker does,
+    measuring publish-to-receive latency on every socket.
+
+    Uses the configured channel layer, or an in-memory one if none is set.
+    """
+    application = URLRouter(websocket_urlpatterns)
+    layers = getattr(settings, 'CHANNEL_LAYERS', None) or IN_MEMORY_LAYERS
+
+    async def receive(socket):
+        frame = await socket.receive_json(timeout)
+        return frame['data'], time.perf_counter()
+
+    async def drive():
+        sockets = [Socket(application, f'/ws/stock/{symbol}/') for _ in range(subscribers)]
+        started = time.perf_counter()
+        for socket in sockets:
+            if not await socket.connect(timeout):
+                raise RuntimeError(f"Websocket for {symbol} was refused")
+        connect_ms = (time.perf_counter() - started) * 1000
+
+        layer = get_channel_layer()
+        latencies, rounds = [], []
+        try:
+            for sequence in range(messages):
+                sent_at = time.perf_counter()
+                await layer.group_send(stock_group_name(symbol), {
+                    'type': 'stock_update',
+                    'data': {'symbol': symbol, 'price': 100.0 + sequence, 'sequence': sequence, 'sent_at': sent_at},
+                })
+                deliveries = await asyncio.gather(*[receive(socket) for socket in sockets])
+                latencies += [(received_at - data['sent_at']) * 1000 for data, received_at in deliveries]
+                rounds.append((max(received_at for _, received_at in deliveries) - sent_at) * 1000)
+        finally:
+            for socket in sockets:
+                await socket.disconnect()
+        return connect_ms, latencies, rounds
+
+    with simulated_market(), override_settings(CHANNEL_LAYERS=layers):
+        forget_quotes([symbol])
+        # The benchmark publishes in place of the ingest worker, so pollers stand down
+        cache.set(INGEST_HEARTBEAT_KEY, 'benchmark', None)
+        try:
+            connect_ms, latencies, rounds = async_to_sync(drive)()
+        finally:
+            cache.delete(INGEST_HEARTBEAT_KEY)
+
+    return {
+        'subscribers': subscribers,
+        'messages': messages,
+        'connect_ms': round(connect_ms, 3),
+        'deliveries': latency_summary(latencies),
+        'fanout': latency_summary(rounds),
+    }
@@ -1,33 +1,56 @@
 import json
+from collections import Counter
+from urllib.parse import parse_qs
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.core.cache import cache
-from .models import Portfolio, Investment
+from .models import Portfolio
 from .utils import validate_stock_symbol
-import yfinance as yf
+from .services.quote_cache import quote_cache
+from .services.outbox import Outbox
+from .services.quote_hub import quote_hub, stock_group_name
+from .services.portfolio_stream import PortfolioStream
+from .services import wire
 import asyncio
 
 class StockConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.symbol = self.scope['url_route']['kwargs']['symbol']
+        self.subscribed = False
+        # Sends go through a bounded queue; a quote still waiting is
+        # replaced by the next one
+        self.outbox = Outbox(self.send_message, self.close, 'stock', self.channel_name)
         try:
             validate_stock_symbol(self.symbol)
             self.room_name = f"stock_{self.symbol}"
-            self.room_group_name = f"stock_group_{self.symbol}"
+            self.room_group_name = stock_group_name(self.symbol)
             
             await self.channel_layer.group_add(
                 self.room_group_name,
                 self.channel_name
             )
             await self.accept()
+            self.outbox.start()
             
-            # Start sending real-time updates
-            asyncio.create_task(self.send_stock_updates())
+            # Updates come from the shared per-symbol poller in the quote hub
+            await quote_hub.subscribe(self.symbol)
+            self.subscribed = True
+
+            # Send the last published quote so the socket doesn't wait for the next poll
+            snapshot = await quote_cache.apeek(self.symbol)
+            if snapshot:
+                await self.stock_update({'data': snapshot})
             
         except Exception as e:
             await self.close()
 
     async def disconnect(self, close_code):
+        self.outbox.stop()
+        if self.subscribed:
+            await quote_hub.unsubscribe(self.symbol)
+            self.subscribed = False
         try:
             await self.channel_layer.group_discard(
                 self.room_group_name,
@@ -51,61 +74,42 @@ class StockConsumer(AsyncWebsocketConsumer):
         except:
             pass
 
+    async def send_message(self, message):
+        await self.send(text_data=json.dumps(message))
+
     async def stock_message(self, event):
         message = event['message']
-        await self.send(text_data=json.dumps({
+        self.outbox.put({
             'message': message
-        }))
+        })
 
-    async def send_stock_updates(self):
-        while True:
-            try:
-                # Get stock data
-                stock_data = await self.get_stock_data(self.symbol)
-                
-                # Send update to WebSocket
-                await self.send(text_data=json.dumps({
-                    'type': 'stock_update',
-                    'data': stock_data
-                }))
-                
-                # Wait for 5 seconds before next update
-                await asyncio.sleep(5)
-                
-            except Exception as e:
-                await self.send(text_data=json.dumps({
-                    'type': 'error',
-                    'message': str(e)
-                }))
-                break
+    async def stock_update(self, event):
+        self.outbox.put({
+            'type': 'stock_update',
+            'data': event['data']
+        }, key='quote')
 
-    @database_sync_to_async
-    def get_stock_data(self, symbol):
-        # Try to get from cache first
-        cache_key = f'stock_data_{symbol}'
-        cached_data = cache.get(cache_key)
-        if cached_data:
-            return cached_data
-            
-        # If not in cache, fetch from yfinance
-        stock = yf.Ticker(symbol)
-        data = {
-            'symbol': symbol,
-            'price': stock.info.get('currentPrice'),
-            'change': stock.info.get('regularMarketChange'),
-            'volume': stock.info.get('regularMarketVolume'),
-            'high': stock.info.get('dayHigh'),
-            'low': stock.info.get('dayLow'),
-        }
-        
-        # Cache for 60 seconds
-        cache.set(cache_key, data, 60)
-        return data
+    async def stock_error(self, event):
+        self.outbox.put({
+            'type': 'error',
+            'message': event['message']
+        }, key='error')
 
 class PortfolioConsumer(AsyncWebsocketConsumer):
+    """
+    Pushes a snapshot of the user's portfolio, then coalesced deltas driven
+    by price ticks for the held symbols (see services.portfolio_stream).
+    """
+
     async def connect(self):
         self.portfolio_id = self.scope['url_route']['kwargs']['portfolio_id']
         self.user = self.scope['user']
+        self.stream = None
+        self.flush_task = None
+        # Strict: a dropped message would leave the client's copy wrong,
+        # so overflowing closes the socket and the client resumes
+        self.outbox = Outbox(self.send_message, self.close, 'portfolio', self.channel_name, strict=True)
+        self.symbols = []
         
         if not self.user.is_authenticated:
             await self.close()
@@ -125,23 +129,57 @@ class PortfolioConsumer(AsyncWebsocketConsumer):
                 self.room_group_name,
                 self.channel_name
             )
+
+            self.stream = await self.load_stream()
+            # Ticks for every held symbol arrive through its stock group
+            for symbol in self.stream.symbols:
+                await self.channel_layer.group_add(stock_group_name(symbol), self.channel_name)
             await self.accept()
-            
-            # Start sending portfolio updates
-            asyncio.create_task(self.send_portfolio_updates())
+            self.outbox.start()
+
+            for symbol in self.stream.symbols:
+                await quote_hub.subscribe(symbol)
+                self.symbols.append(symbol)
+
+            params = parse_qs(self.scope.get('query_string', b'').decode())
+            missed = await self.stream.aresume(params.get('stream', [None])[0], self.since(params))
+            if missed is None:
+                await self.send_snapshot()
+            else:
+                for seq, delta in missed:
+                    self.outbox.put(self.stream.delta_message(seq, delta))
+                # Plus whatever changed while the client was away
+                self.outbox.put(self.next_delta, key='delta')
             
         except Exception as e:
             await self.close()
 
     async def disconnect(self, close_code):
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        self.outbox.stop()
+        for symbol in self.symbols:
+            await quote_hub.unsubscribe(symbol)
+        self.symbols = []
         try:
             await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
             )
+            if self.stream:
+                for symbol in self.stream.symbols:
+                    await self.channel_layer.group_discard(stock_group_name(symbol), self.channel_name)
         except:
             pass
 
+    @staticmethod
+    def since(params):
+        try:
+            return int(params['since'][0])
+        except (KeyError, ValueError):
+            return None
+
     @database_sync_to_async
     def get_portfolio(self):
         try:
@@ -150,50 +188,295 @@ class PortfolioConsumer(AsyncWebsocketConsumer):
             return None
 
     @database_sync_to_async
-    def get_portfolio_data(self):
-        portfolio = Portfolio.objects.get(id=self.portfolio_id)
-        investments = Investment.objects.filter(portfolio=portfolio)
-        
-        total_value = 0
-        investment_data = []
-        
-        for investment in investments:
-            stock = yf.Ticker(investment.stock_symbol)
-            current_price = stock.info.get('currentPrice', 0)
-            value = current_price * investment.shares
-            total_value += value
-            
-            investment_data.append({
-                'symbol': investment.stock_symbol,
-                'shares': investment.shares,
-                'current_price': current_price,
-                'value': value,
-                'gain_loss': value - (investment.purchase_price * investment.shares)
-            })
-            
-        return {
-            'total_value': total_value,
-            'investments': investment_data
-        }
+    def load_stream(self):
+        return PortfolioStream.load(self.user.id)
+
+    async def send_message(self, message):
+        await self.send(text_data=json.dumps(message, cls=DjangoJSONEncoder))
+
+    async def send_snapshot(self):
+        message = self.stream.snapshot_message()
+        await self.stream.asave()
+        self.outbox.put(message)
+
+    async def next_delta(self):
+        # Built when the outbox gets to it, so a client that is behind gets
+        # one delta covering everything since its last message
+        try:
+            delta = self.stream.advance()
+            if delta is None:
+                return None
+            await self.stream.asave()
+            return self.stream.delta_message(self.stream.seq, delta)
+        except Exception as e:
+            return {
+                'type': 'error',
+                'message': str(e)
+            }
+
+    async def flush_later(self):
+        # Every tick until then is folded into the one delta
+        await asyncio.sleep(settings.PORTFOLIO_PUSH_WINDOW_MS / 1000)
+        self.flush_task = None
+        self.outbox.put(self.next_delta, key='delta')
+
+    async def stock_update(self, event):
+        data = event['data']
+        if self.stream.reprice(data.get('symbol'), data.get('price')) and self.flush_task is None:
+            self.flush_task = asyncio.create_task(self.flush_later())
+
+    async def stock_error(self, event):
+        # A failed poll leaves the holding at its last price
+        pass
+
+    async def stock_message(self, event):
+        pass
+
+class MultiplexConsumer(AsyncWebsocketConsumer):
+    """
+    One socket for any number of symbols and portfolios.
+
+    The client sends ``{"action": "subscribe" | "unsubscribe", "symbols":
+    [...], "portfolios": [...]}``; a portfolio entry is its id, or
+    ``{"id": ..., "stream": ..., "since": ...}`` to resume a stream. Every
+    update due within ``MULTIPLEX_TICK_MS`` goes out in one ``batch`` frame:
+    the latest quote per symbol, poll errors, and the portfolio snapshot and
+    delta messages (as PortfolioConsumer sends them, plus a ``portfolio``
+    id). ``?format=msgpack`` switches frames both ways to MessagePack.
+    """
+
+    async def connect(self):
+        self.user = self.scope.get('user')
+        params = parse_qs(self.scope.get('query_string', b'').decode())
+        self.format = params.get('format', [wire.JSON])[0]
+        self.quotes = set()
+        self.watching = Counter()
+        self.streams = {}
+        self.pending_quotes = {}
+        self.pending_errors = {}
+        self.pending_portfolios = {}
+        self.dirty = set()
+        self.tick_task = None
+        # Frames are built when the outbox gets to them, so a slow client
+        # gets fewer, fuller frames rather than a backlog
+        self.outbox = Outbox(self.send_message, self.close, 'multiplex', self.channel_name)
+
+        if self.format not in wire.formats():
+            await self.close()
+            return
+        await self.accept()
+        self.outbox.start()
+
+    async def disconnect(self, close_code):
+        if self.tick_task:
+            self.tick_task.cancel()
+            self.tick_task = None
+        self.outbox.stop()
+        for symbol in list(self.watching):
+            await self.unwatch(symbol, force=True)
+
+    async def send_message(self, message):
+        frame = wire.encode(message, self.format)
+        if self.format == wire.MSGPACK:
+            await self.send(bytes_data=frame)
+        else:
+            await self.send(text_data=frame)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            request = wire.decode(text_data, bytes_data)
+            action = request['action']
+            if action not in ('subscribe', 'unsubscribe'):
+                raise ValueError(f'Unknown action: {action}')
+            symbols = request.get('symbols') or []
+            portfolios = request.get('portfolios') or []
+            if not isinstance(symbols, list) or not isinstance(portfolios, list):
+                raise ValueError('symbols and portfolios must be lists')
+        except Exception as e:
+            self.outbox.put({'type': 'error', 'message': f'Invalid request: {e}'})
+            return
 
-    async def send_portfolio_updates(self):
-        while True:
+        if action == 'subscribe':
+            await self.subscribe(symbols, portfolios)
+        else:
+            await self.unsubscribe(symbols, portfolios)
+
+    async def subscribe(self, symbols, portfolios):
+        added, rejected = [], []
+        for symbol in symbols:
             try:
-                # Get portfolio data
-                portfolio_data = await self.get_portfolio_data()
-                
-                # Send update to WebSocket
-                await self.send(text_data=json.dumps({
-                    'type': 'portfolio_update',
-                    'data': portfolio_data
-                }))
-                
-                # Wait for 5 seconds before next update
-                await asyncio.sleep(5)
-                
-            except Exception as e:
-                await self.send(text_data=json.dumps({
-                    'type': 'error',
-                    'message': str(e)
-                }))
-                break
+                symbol = validate_stock_symbol(symbol)
+            except ValidationError:
+                rejected.append(symbol)
+                continue
+            if symbol in self.quotes:
+                added.append(symbol)
+                continue
+            if len(self.quotes) >= settings.MULTIPLEX_MAX_SYMBOLS:
+                rejected.append(symbol)
+                continue
+            self.quotes.add(symbol)
+            await self.watch(symbol)
+            added.append(symbol)
+            # Start from the last published quote rather than the next poll
+            snapshot = await quote_cache.apeek(symbol)
+            if snapshot:
+                self.pending_quotes[symbol] = snapshot
+
+        opened, refused = [], []
+        for entry in portfolios:
+            portfolio_id, stream_id, since = self.portfolio_entry(entry)
+            if portfolio_id in self.streams:
+                opened.append(portfolio_id)
+            elif portfolio_id is not None and await self.open_portfolio(portfolio_id, stream_id, since):
+                opened.append(portfolio_id)
+            else:
+                refused.append(entry)
+
+        self.outbox.put({
+            'type': 'subscribed',
+            'symbols': added,
+            'portfolios': opened,
+            'rejected': {'symbols': rejected, 'portfolios': refused},
+        })
+        self.schedule()
+
+    async def unsubscribe(self, symbols, portfolios):
+        for symbol in symbols:
+            symbol = str(symbol).upper()
+            if symbol in self.quotes:
+                self.quotes.discard(symbol)
+                self.pending_quotes.pop(symbol, None)
+                self.pending_errors.pop(symbol, None)
+                await self.unwatch(symbol)
+        for entry in portfolios:
+            portfolio_id, _, _ = self.portfolio_entry(entry)
+            stream = self.streams.pop(portfolio_id, None)
+            if stream is None:
+                continue
+            self.pending_portfolios.pop(portfolio_id, None)
+            self.dirty.discard(portfolio_id)
+            for symbol in stream.symbols:
+                await self.unwatch(symbol)
+        self.outbox.put({
+            'type': 'unsubscribed',
+            'symbols': [str(symbol).upper() for symbol in symbols],
+            'portfolios': [self.portfolio_entry(entry)[0] for entry in portfolios],
+        })
+
+    @staticmethod
+    def portfolio_entry(entry):
+        """(portfolio id, stream id, since) from an id or a resume object."""
+        if isinstance(entry, dict):
+            stream_id, since = entry.get('stream'), entry.get('since')
+            entry = entry.get('id')
+        else:
+            stream_id, since = None, None
+        try:
+            return int(entry), stream_id, int(since) if since is not None else None
+        except (TypeError, ValueError):
+            return None, None, None
+
+    async def open_portfolio(self, portfolio_id, stream_id, since):
+        if not self.user or not self.user.is_authenticated:
+            return False
+        stream = await self.load_stream(portfolio_id)
+        if stream is None:
+            return False
+        self.streams[portfolio_id] = stream
+        for symbol in stream.symbols:
+            await self.watch(symbol)
+
+        missed = await stream.aresume(stream_id, since)
+        if missed is None:
+            messages = [stream.snapshot_message(portfolio=portfolio_id)]
+            await stream.asave()
+        else:
+            messages = [stream.delta_message(seq, delta, portfolio=portfolio_id) for seq, delta in missed]
+            # Plus whatever changed while the client was away
+            self.dirty.add(portfolio_id)
+        self.pending_portfolios.setdefault(portfolio_id, []).extend(messages)
+        return True
+
+    @database_sync_to_async
+    def load_stream(self, portfolio_id):
+        if not Portfolio.objects.filter(id=portfolio_id, user=self.user).exists():
+            return None
+        return PortfolioStream.load(self.user.id)
+
+    async def watch(self, symbol):
+        """References ``symbol`` for quotes or a portfolio; the first one joins its group."""
+        self.watching[symbol] += 1
+        if self.watching[symbol] == 1:
+            await self.channel_layer.group_add(stock_group_name(symbol), self.channel_name)
+            await quote_hub.subscribe(symbol)
+
+    async def unwatch(self, symbol, force=False):
+        if symbol not in self.watching:
+            return
+        self.watching[symbol] -= 1
+        if force or self.watching[symbol] <= 0:
+            del self.watching[symbol]
+            await quote_hub.unsubscribe(symbol)
+            try:
+                await self.channel_layer.group_discard(stock_group_name(symbol), self.channel_name)
+            except Exception:
+                pass
+
+    def schedule(self):
+        if self.tick_task is None:
+            self.tick_task = asyncio.create_task(self.tick())
+
+    async def tick(self):
+        # Everything that arrives until then shares one frame
+        await asyncio.sleep(settings.MULTIPLEX_TICK_MS / 1000)
+        self.tick_task = None
+        self.outbox.put(self.next_frame, key='batch')
+
+    async def next_frame(self):
+        frame = {'type': 'batch'}
+        if self.pending_quotes:
+            frame['quotes'] = list(self.pending_quotes.values())
+            self.pending_quotes = {}
+        if self.pending_errors:
+            frame['errors'] = [
+                {'symbol': symbol, 'message': message} for symbol, message in self.pending_errors.items()
+            ]
+            self.pending_errors = {}
+
+        messages = []
+        for portfolio_id in list(self.pending_portfolios):
+            messages += self.pending_portfolios.pop(portfolio_id)
+        dirty, self.dirty = self.dirty, set()
+        for portfolio_id in dirty:
+            stream = self.streams.get(portfolio_id)
+            delta = stream.advance() if stream else None
+            if delta is not None:
+                messages.append(stream.delta_message(stream.seq, delta, portfolio=portfolio_id))
+                await stream.asave()
+        if messages:
+            frame['portfolios'] = messages
+
+        return frame if len(frame) > 1 else None
+
+    async def stock_update(self, event):
+        data = event['data']
+        symbol = data.get('symbol')
+        due = symbol in self.quotes
+        if due:
+            self.pending_quotes[symbol] = data
+        for portfolio_id, stream in self.streams.items():
+            if stream.reprice(symbol, data.get('price')):
+                self.dirty.add(portfolio_id)
+                due = True
+        if due:
+            self.schedule()
+
+    async def stock_error(self, event):
+        symbol = event.get('symbol')
+        if symbol in self.quotes:
+            self.pending_errors[symbol] = event['message']
+            self.schedule()
+
+    async def stock_message(self, event):
+        pass
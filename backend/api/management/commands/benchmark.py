@@ -0,0 +1,68 @@
+import json
+import platform
+from contextlib import nullcontext
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from api.benchmarks import BENCHMARKS, DATABASE_BENCHMARKS
+from api.benchmarks.fixtures import isolated_database
+
+BASE_OPTIONS = ('verbosity', 'settings', 'pythonpath', 'traceback', 'no_color', 'force_color', 'skip_checks')
+
+
+class Command(BaseCommand):
+    help = 'Run API benchmarks and print the results as JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+        # Sizes default per benchmark when not given
+        parser.add_argument('--holdings', type=int, help='Holdings for the valuation benchmark')
+        parser.add_argument('--users', type=int)
+        parser.add_argument('--holdings-per-user', type=int)
+        parser.add_argument('--alerts', type=int)
+        parser.add_argument('--symbols', type=int)
+        parser.add_argument('--seed', type=int)
+        parser.add_argument('--repeat', type=int)
+        parser.add_argument('--requests', type=int, help='Warm requests for the advisory benchmark, checks for the throttle benchmark')
+        parser.add_argument('--concurrency', type=int, help='Concurrent advisory requests')
+        parser.add_argument('--subscribers', type=int, help='Websockets for the fan-out benchmark')
+        parser.add_argument('--messages', type=int, help='Ticks published in the fan-out benchmark')
+        parser.add_argument('--levels', help='Comma-separated connection counts the capacity benchmark steps through')
+        parser.add_argument('--latency-budget-ms', type=float, help='p99 fan-out latency that marks capacity saturation')
+        parser.add_argument('--soak-seconds', type=float, help='Soak the largest healthy capacity step this long')
+        parser.add_argument('--rate', type=float, help='Rounds per second while soaking')
+        parser.add_argument('--output', help='Also write the JSON results to this file')
+
+    def handle(self, *args, **options):
+        names = options.pop('names') or list(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+        output = options.pop('output')
+        options = {
+            name: value for name, value in options.items()
+            if value is not None and name not in BASE_OPTIONS
+        }
+
+        # Fixtures go into a throwaway database, never the configured one
+        database = isolated_database() if DATABASE_BENCHMARKS.intersection(names) else nullcontext()
+        with database:
+            results = {
+                'meta': {
+                    'started_at': timezone.now().isoformat(),
+                    'python': platform.python_version(),
+                    'django': django.get_version(),
+                    'database': connection.vendor,
+                    'options': options,
+                },
+            }
+            for name in names:
+                results[name] = BENCHMARKS[name](**options)
+
+        report = json.dumps(results, indent=2)
+        if output:
+            with open(output, 'w') as f:
+                f.write(report)
+        self.stdout.write(report)
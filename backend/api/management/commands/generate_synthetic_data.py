@@ -0,0 +1,64 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from api.benchmarks.datagen import SyntheticDataset
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generate a reproducible synthetic dataset (users, profiles, holdings, alerts, ticks) for profiling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--holdings', type=int, default=10, help='Distinct holdings per user')
+        parser.add_argument('--alerts', type=int, default=1000, help='Total stock alerts')
+        parser.add_argument('--ticks', type=int, default=0, help='MarketData ticks per symbol')
+        parser.add_argument('--symbols', type=int, default=500)
+        parser.add_argument('--tick-interval', type=int, default=60, help='Seconds between generated ticks')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='synthetic-', help='Username prefix of the generated users')
+        parser.add_argument('--password', default='password', help='Password of every generated user (hashed once)')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Rows per chunk / bulk_create batch')
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes (Postgres only)')
+        parser.add_argument('--copy', action='store_true', help='Stream rows with Postgres COPY')
+        parser.add_argument('--clear', action='store_true', help='Delete users with the same prefix first')
+
+    def handle(self, *args, **options):
+        dataset = SyntheticDataset(
+            users=options['users'],
+            holdings=options['holdings'],
+            alerts=options['alerts'],
+            ticks=options['ticks'],
+            symbols=options['symbols'],
+            tick_interval=options['tick_interval'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            password=options['password'],
+            chunk_size=options['chunk_size'],
+            use_copy=options['copy'],
+        )
+        workers = options['workers']
+        if workers > 1 and connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING(f'{connection.vendor} takes one writer at a time; using 1 worker'))
+            workers = 1
+        if options['copy'] and connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('COPY needs Postgres; using bulk_create'))
+
+        if options['clear']:
+            self.stdout.write(f"Deleted {dataset.clear()} rows for users prefixed '{dataset.prefix}'")
+        elif dataset.exists():
+            raise CommandError(f"Users prefixed '{dataset.prefix}' already exist; pass --clear or another --prefix")
+
+        progress = {}
+
+        def on_chunk(table, count):
+            progress[table] = progress.get(table, 0) + count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{table}: {progress[table]}')
+
+        started = time.perf_counter()
+        summary = dataset.generate(workers=workers, on_chunk=on_chunk)
+        summary['total_seconds'] = round(time.perf_counter() - started, 3)
+        self.stdout.write(json.dumps(summary, indent=2))
+        self.stdout.write(self.style.SUCCESS('Successfully generated synthetic data'))
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand
+from api.services.ingest import PriceIngestor
+
+
+class Command(BaseCommand):
+    help = 'Continuously ingest quotes for every watched, held or alerted symbol into MarketData'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None, help='Seconds between cycles (default: MARKET_DATA_INGEST_INTERVAL)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--copy', action='store_true', help='Write history rows with Postgres COPY')
+        parser.add_argument('--symbols', nargs='*', default=[], help='Extra symbols to ingest every cycle')
+        parser.add_argument('--cycles', type=int, default=None, help='Stop after this many cycles')
+        parser.add_argument('--once', action='store_true', help='Run a single cycle')
+
+    def handle(self, *args, **options):
+        ingestor = PriceIngestor(
+            interval=options['interval'],
+            batch_size=options['batch_size'],
+            use_copy=options['copy'],
+            extra_symbols=options['symbols'],
+        )
+        cycles = 1 if options['once'] else options['cycles']
+        self.stdout.write(f'Ingesting every {ingestor.interval}s')
+        try:
+            ingestor.run(cycles=cycles, on_cycle=lambda stats: self.stdout.write(json.dumps(stats)))
+        except KeyboardInterrupt:
+            self.stdout.write('Stopped')
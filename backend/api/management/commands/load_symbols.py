@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.services.symbol_index import symbol_index
+
+
+class Command(BaseCommand):
+    help = 'Load a CSV listing file (symbol and name columns) into the local symbol index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the listing CSV (e.g. Alpha Vantage LISTING_STATUS)')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], newline='') as listing_file:
+                loaded = symbol_index.load_listing(listing_file, batch_size=options['batch_size'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f'Loaded {loaded} symbols into the symbol index'))
@@ -0,0 +1,68 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .services import metrics
+
+logger = logging.getLogger('api.performance')
+
+
+class PerformanceMiddleware:
+    """
+    Records wall time, database queries and outbound provider calls for
+    every request, per view, into the ``/metrics`` histograms, and logs a
+    breakdown of requests slower than ``SLOW_REQUEST_MS``.
+
+    Works in both sync and async stacks so async views are not pushed
+    through a thread just to be measured.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self.record(request, response, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self.record(request, response, stats)
+        return response
+
+    def record(self, request, response, stats):
+        elapsed = time.perf_counter() - stats.started
+        match = request.resolver_match
+        # Route patterns, not paths, so label cardinality stays bounded
+        view = match.route if match else 'unmatched'
+        method = request.method
+
+        metrics.http_requests.inc(view=view, method=method, status=response.status_code)
+        metrics.http_request_duration.observe(elapsed, view=view, method=method)
+        metrics.db_queries_per_request.observe(stats.db_queries, view=view)
+        metrics.db_time_per_request.observe(stats.db_seconds, view=view)
+        metrics.provider_calls_per_request.observe(stats.provider_calls, view=view)
+        metrics.provider_time_per_request.observe(stats.provider_seconds, view=view)
+
+        if elapsed * 1000 >= settings.SLOW_REQUEST_MS:
+            logger.warning(
+                "Slow request %s %s (%s) %d in %.0fms; %s",
+                method, request.path, view, response.status_code, elapsed * 1000, stats.breakdown(),
+            )
@@ -0,0 +1,35 @@
+# Generated by Django 5.0 on 2026-10-18 11:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_userprofile_preferred_sectors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSymbol',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=20, unique=True)),
+                ('name', models.CharField(max_length=255)),
+                ('normalized_name', models.CharField(db_index=True, max_length=255)),
+                ('exchange', models.CharField(blank=True, max_length=20)),
+                ('source', models.CharField(default='listing', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SymbolAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('stock', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='api.stocksymbol')),
+            ],
+        ),
+    ]
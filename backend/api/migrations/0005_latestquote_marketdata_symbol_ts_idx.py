@@ -0,0 +1,44 @@
+# Generated by Django 5.0 on 2026-10-18 11:17
+
+from django.db import migrations, models
+
+
+def backfill_latest_quotes(apps, schema_editor):
+    MarketData = apps.get_model('api', 'MarketData')
+    LatestQuote = apps.get_model('api', 'LatestQuote')
+    latest = []
+    for symbol in MarketData.objects.values_list('symbol', flat=True).distinct():
+        row = MarketData.objects.filter(symbol=symbol).order_by('-timestamp', '-id').first()
+        latest.append(LatestQuote(
+            symbol=row.symbol,
+            current_price=row.current_price,
+            daily_change=row.daily_change,
+            volume=row.volume,
+            timestamp=row.timestamp,
+        ))
+    LatestQuote.objects.bulk_create(latest, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_stocksymbol_symbolalias'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestQuote',
+            fields=[
+                ('symbol', models.CharField(max_length=10, primary_key=True, serialize=False)),
+                ('current_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('daily_change', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('volume', models.BigIntegerField()),
+                ('timestamp', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='marketdata',
+            index=models.Index(fields=['symbol', '-timestamp'], name='marketdata_symbol_ts_idx'),
+        ),
+        migrations.RunPython(backfill_latest_quotes, migrations.RunPython.noop),
+    ]
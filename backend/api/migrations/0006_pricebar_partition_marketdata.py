@@ -0,0 +1,73 @@
+# Generated by Django 5.0 on 2026-10-18 11:19
+
+from django.db import migrations, models
+
+
+def partition_market_data(apps, schema_editor):
+    """
+    Turns api_marketdata into a table range-partitioned by day on
+    "timestamp" (Postgres only). Existing rows land in the default
+    partition; daily partitions are created ahead of time by the history
+    maintenance task. The primary key has to include the partition key.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexdef FROM pg_indexes "
+            "WHERE tablename = 'api_marketdata' AND indexname NOT LIKE '%_pkey'"
+        )
+        index_definitions = [row[0] for row in cursor.fetchall()]
+        cursor.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM api_marketdata")
+        next_id = cursor.fetchone()[0]
+
+        cursor.execute("ALTER TABLE api_marketdata RENAME TO api_marketdata_legacy")
+        cursor.execute(f"CREATE SEQUENCE api_marketdata_id_seq_partitioned START WITH {int(next_id)}")
+        cursor.execute(
+            'CREATE TABLE api_marketdata ('
+            'LIKE api_marketdata_legacy INCLUDING DEFAULTS, '
+            'PRIMARY KEY (id, "timestamp")'
+            ') PARTITION BY RANGE ("timestamp")'
+        )
+        cursor.execute(
+            "ALTER TABLE api_marketdata ALTER COLUMN id "
+            "SET DEFAULT nextval('api_marketdata_id_seq_partitioned')"
+        )
+        cursor.execute("ALTER SEQUENCE api_marketdata_id_seq_partitioned OWNED BY api_marketdata.id")
+        cursor.execute("CREATE TABLE api_marketdata_default PARTITION OF api_marketdata DEFAULT")
+        cursor.execute("INSERT INTO api_marketdata SELECT * FROM api_marketdata_legacy")
+        cursor.execute("DROP TABLE api_marketdata_legacy")
+        # Recreate the secondary indexes under their original names
+        for definition in index_definitions:
+            cursor.execute(definition)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_latestquote_marketdata_symbol_ts_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceBar',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('symbol', models.CharField(max_length=10)),
+                ('interval', models.CharField(choices=[('1m', '1 minute'), ('1h', '1 hour'), ('1d', '1 day')], max_length=2)),
+                ('start', models.DateTimeField()),
+                ('open', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('high', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('low', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('close', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('volume', models.BigIntegerField(default=0)),
+                ('ticks', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['interval', 'start'], name='pricebar_interval_start_idx')],
+                'unique_together': {('symbol', 'interval', 'start')},
+            },
+        ),
+        migrations.RunPython(partition_market_data, migrations.RunPython.noop),
+    ]
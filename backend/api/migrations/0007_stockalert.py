@@ -0,0 +1,31 @@
+# Generated by Django 5.0 on 2026-10-18 11:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_pricebar_partition_marketdata'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stock_symbol', models.CharField(db_index=True, max_length=10)),
+                ('alert_type', models.CharField(choices=[('price_above', 'Price above'), ('price_below', 'Price below'), ('percent_change', 'Daily change above (%)'), ('volume_above', 'Volume above')], max_length=20)),
+                ('target_value', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('notification_email', models.EmailField(max_length=254)),
+                ('is_active', models.BooleanField(default=True)),
+                ('triggered', models.BooleanField(default=False)),
+                ('last_triggered_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_alerts', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
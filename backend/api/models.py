@@ -101,6 +101,32 @@ class Portfolio(models.Model):
         return f"{self.user.username}'s {self.stock_symbol} holdings"
 
 
+class StockAlert(models.Model):
+    """
+    Price, percent-change or volume threshold a user wants to be emailed about.
+    An alert fires once; it is re-armed by clearing ``triggered``.
+    """
+    ALERT_TYPE_CHOICES = [
+        ('price_above', 'Price above'),
+        ('price_below', 'Price below'),
+        ('percent_change', 'Daily change above (%)'),
+        ('volume_above', 'Volume above'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_alerts')
+    stock_symbol = models.CharField(max_length=10, db_index=True)  # Ticker symbol (e.g., AAPL)
+    alert_type = models.CharField(max_length=20, choices=ALERT_TYPE_CHOICES)
+    target_value = models.DecimalField(max_digits=16, decimal_places=2)  # Price, percent or share volume
+    notification_email = models.EmailField()
+    is_active = models.BooleanField(default=True)
+    triggered = models.BooleanField(default=False)
+    last_triggered_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.stock_symbol} {self.alert_type} {self.target_value} for {self.user.username}"
+
+
 class MarketData(models.Model):
     """
     Stores real-time market data.
@@ -113,5 +139,99 @@ class MarketData(models.Model):
     sentiment_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)  # Sentiment score
     timestamp = models.DateTimeField(auto_now_add=True)  # Time when the market data was collected
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['symbol', '-timestamp'], name='marketdata_symbol_ts_idx'),
+        ]
+
     def __str__(self):
         return f"Market Data for {self.symbol} at {self.timestamp}"
+
+
+class LatestQuote(models.Model):
+    """
+    Latest MarketData tick per symbol, upserted by ingest alongside the history
+    rows so current-price reads are primary-key lookups instead of
+    latest('timestamp') scans over the tick table.
+    """
+    symbol = models.CharField(max_length=10, primary_key=True)  # Stock symbol (e.g., AAPL)
+    current_price = models.DecimalField(max_digits=10, decimal_places=2)
+    daily_change = models.DecimalField(max_digits=10, decimal_places=2)
+    volume = models.BigIntegerField()
+    timestamp = models.DateTimeField()  # Timestamp of the MarketData tick this row mirrors
+
+    def as_quote(self):
+        """Same shape as the quote cache snapshots."""
+        return {
+            'symbol': self.symbol,
+            'price': float(self.current_price),
+            'change': float(self.daily_change),
+            'previous_close': float(self.current_price - self.daily_change),
+            'volume': self.volume,
+            'timestamp': self.timestamp.isoformat(),
+            'source': 'LatestQuote',
+        }
+
+    def __str__(self):
+        return f"{self.symbol} at {self.current_price} ({self.timestamp})"
+
+
+class PriceBar(models.Model):
+    """
+    OHLCV bar downsampled from MarketData ticks. 1-minute bars are built from
+    the ticks, 1-hour bars from 1-minute bars and 1-day bars from 1-hour bars,
+    so long chart ranges never scan the tick history.
+    """
+    INTERVAL_CHOICES = [
+        ('1m', '1 minute'),
+        ('1h', '1 hour'),
+        ('1d', '1 day'),
+    ]
+
+    symbol = models.CharField(max_length=10)  # Stock symbol (e.g., AAPL)
+    interval = models.CharField(max_length=2, choices=INTERVAL_CHOICES)
+    start = models.DateTimeField()  # Start of the bar, aligned to the interval
+    open = models.DecimalField(max_digits=10, decimal_places=2)
+    high = models.DecimalField(max_digits=10, decimal_places=2)
+    low = models.DecimalField(max_digits=10, decimal_places=2)
+    close = models.DecimalField(max_digits=10, decimal_places=2)
+    volume = models.BigIntegerField(default=0)  # Shares traded during the bar
+    ticks = models.IntegerField(default=0)  # Number of ticks the bar was built from
+
+    class Meta:
+        unique_together = ['symbol', 'interval', 'start']
+        indexes = [
+            models.Index(fields=['interval', 'start'], name='pricebar_interval_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.symbol} {self.interval} bar at {self.start}"
+
+
+class StockSymbol(models.Model):
+    """
+    Local symbol/company-name index used to resolve free-text stock queries.
+    Seeded from a bulk listing file and extended with remote search results.
+    """
+    symbol = models.CharField(max_length=20, unique=True)  # Ticker symbol (e.g., AAPL)
+    name = models.CharField(max_length=255)  # Company name as listed
+    normalized_name = models.CharField(max_length=255, db_index=True)  # Name after clean_query normalization
+    exchange = models.CharField(max_length=20, blank=True)
+    source = models.CharField(max_length=20, default='listing')  # 'listing' for bulk loads, 'remote' for search write-backs
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.symbol} ({self.name})"
+
+
+class SymbolAlias(models.Model):
+    """
+    Normalized query text that a remote search resolved to a symbol
+    (e.g. "google" -> GOOGL), so the same query is answered locally next time.
+    """
+    alias = models.CharField(max_length=255, unique=True)
+    stock = models.ForeignKey(StockSymbol, on_delete=models.CASCADE, related_name='aliases')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.alias} -> {self.stock.symbol}"
@@ -4,4 +4,5 @@ from . import consumers
 websocket_urlpatterns = [
     re_path(r'ws/stock/(?P<symbol>\w+)/$', consumers.StockConsumer.as_asgi()),
     re_path(r'ws/portfolio/(?P<portfolio_id>\w+)/$', consumers.PortfolioConsumer.as_asgi()),
+    re_path(r'ws/stream/$', consumers.MultiplexConsumer.as_asgi()),
 ]
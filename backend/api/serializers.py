@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model, authenticate
 from .models import UserProfile, Portfolio, MarketData
+from .services.market_prices import latest_prices
+from .services.valuation import to_cents
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.password_validation import validate_password
 
@@ -183,15 +185,19 @@ class PortfolioSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         data = super().to_representation(instance)
-        try:
-            market_data = MarketData.objects.filter(
-                stock_symbol=instance.stock_symbol
-            ).latest('timestamp')
-            data['current_price'] = str(market_data.current_price)
-            current_value = instance.quantity * market_data.current_price
+        # List views prefetch every symbol's price once into the context
+        prices = self.context.get('latest_prices')
+        if prices is None:
+            prices = latest_prices([instance.stock_symbol])
+        current_price = prices.get(instance.stock_symbol)
+        if current_price is not None:
+            # Cached quotes carry float precision; render them like the stored rows
+            current_price = to_cents(current_price)
+            data['current_price'] = str(current_price)
+            current_value = instance.quantity * current_price
             purchase_value = instance.quantity * instance.purchase_price
             data['profit_loss'] = str(current_value - purchase_value)
-        except MarketData.DoesNotExist:
+        else:
             data['current_price'] = str(instance.purchase_price)
             data['profit_loss'] = '0.00'
         return data
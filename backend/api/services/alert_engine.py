@@ -0,0 +1,223 @@
+import bisect
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import StockAlert
+from .notifications import alert_notification, notification_queue
+
+VERSION_KEY = 'alert_engine_version'
+
+ALERT_FIELDS = ('id', 'stock_symbol', 'alert_type', 'target_value')
+
+
+class ThresholdBook:
+    """
+    Alert thresholds for one symbol and alert type, kept sorted so the
+    alerts a value crosses are a contiguous slice found by bisection.
+    """
+
+    def __init__(self):
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, target, alert_id):
+        bisect.insort(self._entries, (target, alert_id))
+
+    def remove(self, target, alert_id):
+        index = bisect.bisect_left(self._entries, (target, alert_id))
+        if index < len(self._entries) and self._entries[index] == (target, alert_id):
+            del self._entries[index]
+
+    def below(self, value):
+        """Entries with a target strictly below ``value``."""
+        return self._entries[:bisect.bisect_left(self._entries, (value,))]
+
+    def above(self, value):
+        """Entries with a target strictly above ``value``."""
+        return self._entries[bisect.bisect_right(self._entries, (value, float('inf'))):]
+
+
+class AlertEngine:
+    """
+    Evaluates StockAlerts against price ticks as they arrive.
+
+    Active alerts are indexed per symbol and alert type in ThresholdBooks, so
+    a tick finds the alerts it triggers in O(log n + k) instead of checking
+    every alert. A matched alert leaves the index straight away; firing
+    claims the row with ``triggered=False`` so a tick seen by several workers
+    still sends one notification.
+
+    Each process holds its own index, loaded lazily and reloaded when
+    another process bumps the cache version (StockAlert saves and deletes do,
+    see api.signals).
+    """
+
+    def __init__(self, version_check_interval=5):
+        self.version_check_interval = version_check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0
+        self._books = {}
+        self._alerts = {}
+        self.stats_counters = {'ticks': 0, 'matches': 0, 'fired': 0}
+
+    def symbols(self):
+        self._ensure_loaded()
+        return list(self._books)
+
+    def add(self, alert_id, symbol, alert_type, target):
+        with self._lock:
+            self._add(alert_id, symbol, alert_type, float(target))
+
+    def remove(self, alert_id):
+        with self._lock:
+            self._remove(alert_id)
+
+    def match(self, quote):
+        """
+        Alerts triggered by ``quote`` (a quote cache snapshot), removed from
+        the index. Returns ``[(alert_id, message)]``.
+        """
+        self._ensure_loaded()
+        symbol = quote.get('symbol')
+        price = quote.get('price')
+        books = self._books.get(symbol)
+        if not books or price is None:
+            return []
+
+        price = float(price)
+        candidates = []
+        if 'price_above' in books:
+            candidates += [
+                (alert_id, f"{symbol} price is above {target:.2f}")
+                for target, alert_id in books['price_above'].below(price)
+            ]
+        if 'price_below' in books:
+            candidates += [
+                (alert_id, f"{symbol} price is below {target:.2f}")
+                for target, alert_id in books['price_below'].above(price)
+            ]
+        previous_close = quote.get('previous_close')
+        if 'percent_change' in books and previous_close:
+            change = (price - float(previous_close)) / float(previous_close) * 100
+            candidates += [
+                (alert_id, f"{symbol} price changed by {change:.2f}%")
+                for target, alert_id in books['percent_change'].below(abs(change))
+            ]
+        volume = quote.get('volume')
+        if 'volume_above' in books and volume is not None:
+            candidates += [
+                (alert_id, f"{symbol} volume is above {target:.0f}")
+                for target, alert_id in books['volume_above'].below(float(volume))
+            ]
+
+        with self._lock:
+            self.stats_counters['ticks'] += 1
+            matches = [(alert_id, message) for alert_id, message in candidates if self._remove(alert_id)]
+            self.stats_counters['matches'] += len(matches)
+        return matches
+
+    def process(self, quotes):
+        """Matches every quote in ``quotes`` and fires the triggered alerts."""
+        matches = []
+        for quote in quotes:
+            matches += self.match(quote)
+        return self.fire(matches) if matches else []
+
+    def fire(self, matches):
+        """
+        Marks matched alerts triggered with one bulk_update and queues their
+        notifications. If that fails nothing was claimed, and the index is
+        rebuilt so the matched alerts can fire on a later tick.
+        """
+        messages = dict(matches)
+        now = timezone.now()
+        try:
+            with transaction.atomic():
+                claimed = list(
+                    StockAlert.objects.select_for_update(skip_locked=True)
+                    .filter(id__in=messages, is_active=True, triggered=False)
+                )
+                for alert in claimed:
+                    alert.triggered = True
+                    alert.last_triggered_at = now
+                StockAlert.objects.bulk_update(claimed, ['triggered', 'last_triggered_at'])
+        except Exception:
+            self.reload()
+            raise
+
+        if claimed:
+            notification_queue.enqueue([alert_notification(alert, messages[alert.id]) for alert in claimed])
+        self.stats_counters['fired'] += len(claimed)
+        return claimed
+
+    def stats(self):
+        self._ensure_loaded()
+        return {
+            'alerts': len(self._alerts),
+            'symbols': len(self._books),
+            'version': self._version,
+            **self.stats_counters,
+        }
+
+    def reload(self):
+        """Rebuilds this process's index from the database on next use."""
+        self._version = None
+
+    def invalidate(self):
+        """Makes every other process reload its index on its next version check."""
+        if cache.add(VERSION_KEY, 1, None):
+            version = 1
+        else:
+            version = cache.incr(VERSION_KEY)
+        # Our own index was updated in place
+        if self._version == version - 1:
+            self._version = version
+
+    def _add(self, alert_id, symbol, alert_type, target):
+        self._remove(alert_id)
+        self._books.setdefault(symbol, {}).setdefault(alert_type, ThresholdBook()).add(target, alert_id)
+        self._alerts[alert_id] = (symbol, alert_type, target)
+
+    def _remove(self, alert_id):
+        entry = self._alerts.pop(alert_id, None)
+        if entry is None:
+            return False
+        symbol, alert_type, target = entry
+        books = self._books[symbol]
+        books[alert_type].remove(target, alert_id)
+        if not books[alert_type]:
+            del books[alert_type]
+        if not books:
+            del self._books[symbol]
+        return True
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.version_check_interval:
+            return
+        version = cache.get(VERSION_KEY, 0)
+        self._checked_at = now
+        if version == self._version:
+            return
+
+        rows = StockAlert.objects.filter(is_active=True, triggered=False).values_list(*ALERT_FIELDS)
+        with self._lock:
+            # match() reads the books without the lock: build aside, then swap
+            books, alerts = {}, {}
+            for alert_id, symbol, alert_type, target in rows.iterator(chunk_size=5000):
+                target = float(target)
+                books.setdefault(symbol, {}).setdefault(alert_type, ThresholdBook()).add(target, alert_id)
+                alerts[alert_id] = (symbol, alert_type, target)
+            self._books, self._alerts = books, alerts
+            self._version = version
+
+
+# Shared by the quote hub and the alert tasks running in this process
+alert_engine = AlertEngine()
@@ -0,0 +1,88 @@
+import csv
+import io
+
+from django.db import connection, transaction
+from django.db.models.fields import DateField, DateTimeField
+from django.db.models.sql import InsertQuery
+from django.utils import timezone
+
+
+# Unquoted empty CSV fields would otherwise read back as NULL
+NULL = r'\N'
+
+
+def _csv_value(value):
+    if value is None:
+        return NULL
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def copy_rows(model, columns, rows):
+    """
+    Streams ``rows`` (sequences in ``columns`` order) into ``model``'s table
+    with ``COPY ... FROM STDIN``. Postgres only.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(_csv_value(value) for value in row)
+    names = ', '.join(connection.ops.quote_name(model._meta.get_field(column).column) for column in columns)
+    sql = (
+        f'COPY {connection.ops.quote_name(model._meta.db_table)} ({names}) '
+        f"FROM STDIN WITH (FORMAT csv, NULL '{NULL}')"
+    )
+    with connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy'):  # psycopg 3
+            with raw.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+        else:  # psycopg2
+            buffer.seek(0)
+            raw.copy_expert(sql, buffer)
+
+
+def _auto_now(field, now):
+    if isinstance(field, (DateField, DateTimeField)) and (field.auto_now or field.auto_now_add):
+        return now if isinstance(field, DateTimeField) else now.date()
+    return None
+
+
+def insert_rows(model, rows, batch_size=1000, use_copy=False):
+    """
+    Inserts ``rows`` (dicts of field attname -> value) in one transaction,
+    with ``COPY`` on Postgres when ``use_copy`` is set and chunked raw
+    ``INSERT`` statements otherwise. Values are written as given, including
+    for ``auto_now``/``auto_now_add`` fields, which ``bulk_create`` would
+    overwrite. Fields a row leaves out get their model default (auto_now
+    fields get the current time). Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    now = timezone.now()
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field.attname in rows[0] or not field.primary_key
+    ]
+    defaults = {}
+    for field in fields:
+        auto = _auto_now(field, now)
+        defaults[field.attname] = auto if auto is not None else field.get_default()
+
+    with transaction.atomic():
+        if use_copy and connection.vendor == 'postgresql':
+            columns = [field.attname for field in fields]
+            copy_rows(model, [field.name for field in fields], (
+                [row.get(column, defaults[column]) for column in columns] for row in rows
+            ))
+        else:
+            objs = [model(**{**defaults, **row}) for row in rows]
+            batch_size = max(1, min(batch_size, connection.ops.bulk_batch_size(fields, objs)))
+            for offset in range(0, len(objs), batch_size):
+                # raw=True takes each value as set instead of calling pre_save,
+                # the way loaddata saves fixtures
+                query = InsertQuery(model)
+                query.insert_values(fields, objs[offset:offset + batch_size], raw=True)
+                query.get_compiler(connection=connection).execute_sql()
+    return len(rows)
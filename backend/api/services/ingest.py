@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from ..models import Portfolio, StockAlert
+from .alert_engine import alert_engine
+from .market_prices import record_ticks
+from .providers import fetch_quotes_bulk
+from .quote_cache import quote_cache
+from .quote_hub import INGEST_HEARTBEAT_KEY, stock_group_name, watched_symbols
+from .rate_budget import background
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_quote(symbol, quote):
+    """Provider snapshot -> tick, or None when it has no usable price."""
+    try:
+        price = float(quote['price'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if price <= 0:
+        return None
+    tick = {
+        'symbol': symbol.upper(),
+        'price': round(price, 2),
+        'change': round(float(quote.get('change') or 0), 2),
+        'volume': int(quote.get('volume') or 0),
+        'source': quote.get('source'),
+    }
+    if quote.get('previous_close'):
+        tick['previous_close'] = float(quote['previous_close'])
+    return tick
+
+
+class PriceIngestor:
+    """
+    Single writer for price ticks.
+
+    Every cycle it takes the union of the symbols people watch (quote hub
+    subscriptions), hold (Portfolio rows) and have alerts on, fetches them
+    with one bulk quote call, and then:
+
+    - appends the ticks to MarketData and upserts LatestQuote in one batch
+      (``COPY`` on Postgres when ``use_copy`` is set),
+    - refreshes the quote cache,
+    - publishes each tick to its ``stock_group_<symbol>`` channel group,
+    - runs the ticks through the alert engine.
+
+    A heartbeat key tells QuoteHub pollers to stand down while it runs.
+    """
+
+    def __init__(self, interval=None, batch_size=1000, use_copy=False, fetcher=fetch_quotes_bulk,
+                 channel_layer=None, extra_symbols=()):
+        self.interval = interval or settings.MARKET_DATA_INGEST_INTERVAL
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.fetcher = fetcher
+        self.extra_symbols = [symbol.upper() for symbol in extra_symbols]
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._channel_layer = channel_layer
+
+    @property
+    def channel_layer(self):
+        if self._channel_layer is None:
+            self._channel_layer = get_channel_layer()
+        return self._channel_layer
+
+    def symbols(self):
+        held = Portfolio.objects.values_list('stock_symbol', flat=True).distinct()
+        alerted = StockAlert.objects.filter(is_active=True, triggered=False).values_list(
+            'stock_symbol', flat=True,
+        ).distinct()
+        symbols = set(watched_symbols()) | set(held) | set(alerted) | set(self.extra_symbols)
+        return sorted(symbol.upper() for symbol in symbols if symbol)
+
+    def run_once(self):
+        """One fetch/write/publish cycle; returns timings in milliseconds."""
+        cache.set(INGEST_HEARTBEAT_KEY, self.worker_id, self.interval * 3)
+        started = time.perf_counter()
+        symbols = self.symbols()
+        quotes = self.fetcher(symbols) if symbols else {}
+        fetched = time.perf_counter()
+
+        ticks = [tick for tick in (normalize_quote(s, q) for s, q in quotes.items()) if tick]
+        record_ticks(ticks, batch_size=self.batch_size, use_copy=self.use_copy)
+        quote_cache.set_many({tick['symbol']: tick for tick in ticks})
+        written = time.perf_counter()
+
+        async_to_sync(self.publish)(ticks)
+        published = time.perf_counter()
+
+        fired = alert_engine.process(ticks)
+        done = time.perf_counter()
+
+        return {
+            'symbols': len(symbols),
+            'ticks': len(ticks),
+            'alerts_fired': len(fired),
+            'fetch_ms': round((fetched - started) * 1000, 1),
+            'write_ms': round((written - fetched) * 1000, 1),
+            'publish_ms': round((published - written) * 1000, 1),
+            'alerts_ms': round((done - published) * 1000, 1),
+        }
+
+    async def publish(self, ticks):
+        await asyncio.gather(*[
+            self.channel_layer.group_send(stock_group_name(tick['symbol']), {
+                'type': 'stock_update',
+                'data': tick,
+            })
+            for tick in ticks
+        ])
+
+    def run(self, cycles=None, on_cycle=None):
+        """Runs a cycle every ``interval`` seconds (forever unless ``cycles``)."""
+        count = 0
+        try:
+            while cycles is None or count < cycles:
+                started = time.monotonic()
+                close_old_connections()
+                try:
+                    with background():
+                        stats = self.run_once()
+                except Exception as e:
+                    logger.exception("Ingest cycle failed: %s", e)
+                else:
+                    if on_cycle:
+                        on_cycle(stats)
+                count += 1
+                if cycles is None or count < cycles:
+                    time.sleep(max(0, self.interval - (time.monotonic() - started)))
+        finally:
+            cache.delete(INGEST_HEARTBEAT_KEY)
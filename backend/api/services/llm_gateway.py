@@ -0,0 +1,196 @@
+"""
+Gateway in front of the LLM provider.
+
+Every recommendation prompt goes through ``llm_gateway``, which:
+
+- caps concurrent provider calls per worker (``LLM_MAX_CONCURRENCY``);
+- shares one provider call between identical prompts that are in flight
+  at the same time;
+- caches responses in the shared cache under a fingerprint of the
+  normalized prompt, the model and ``max_tokens`` for ``LLM_CACHE_TTL``
+  seconds.
+
+Prompts are built from bucketed inputs (``risk_bucket``, ``band_price``),
+so users with similar profiles asking about a symbol whose price has not
+left its band produce the same prompt and share the cached answer. A move
+out of the band changes the prompt, and with it the cache key, so cached
+advice never outlives the price it was given for by more than a band.
+"""
+import asyncio
+import hashlib
+import math
+import re
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .loops import LoopLocal
+from .providers import ProviderError, gemini, http_client
+
+llm_requests = metrics.registry.register(metrics.Counter(
+    'llm_requests', 'LLM gateway requests by mode and how they were answered.', ('mode', 'outcome'),
+))
+
+
+def normalize_prompt(prompt):
+    return re.sub(r'\s+', ' ', prompt).strip().casefold()
+
+
+def fingerprint(prompt, *params):
+    """Hash of the normalized prompt and whatever else shapes the answer (model, token cap)."""
+    text = '\n'.join([*map(str, params), normalize_prompt(prompt)])
+    return hashlib.sha256(text.encode()).hexdigest()[:32]
+
+
+def price_band(price, width=None):
+    """
+    Index of the ``width``-wide (relative) band ``price`` falls in, or None
+    for a price with no band (zero, negative or missing).
+    """
+    width = width or settings.LLM_PRICE_BAND
+    if not price or float(price) <= 0:
+        return None
+    return math.floor(math.log(float(price)) / math.log1p(width))
+
+
+def band_price(price, width=None):
+    """The lower edge of ``price``'s band, as shown in prompts (0 when it has none)."""
+    width = width or settings.LLM_PRICE_BAND
+    band = price_band(price, width)
+    if band is None:
+        return 0
+    return round((1 + width) ** band, 2)
+
+
+def risk_bucket(risk_tolerance):
+    """0-10 risk tolerance as the label the model actually reasons about."""
+    if risk_tolerance is None:
+        return 'Unknown'
+    if risk_tolerance <= 3:
+        return 'Low'
+    if risk_tolerance <= 6:
+        return 'Moderate'
+    return 'High'
+
+
+class _LoopState:
+    """Primitives bound to one event loop (asyncio objects cannot be shared between loops)."""
+
+    def __init__(self, max_concurrency):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.inflight = {}
+
+
+class LLMGateway:
+    def __init__(self, provider=None, max_concurrency=None, cache_ttl=None, namespace='llm'):
+        self.provider = provider or gemini
+        self.max_concurrency = max_concurrency or settings.LLM_MAX_CONCURRENCY
+        self.cache_ttl = cache_ttl if cache_ttl is not None else settings.LLM_CACHE_TTL
+        self.namespace = namespace
+        self._states = LoopLocal(lambda: _LoopState(self.max_concurrency))
+
+    def key(self, prompt, max_tokens=150):
+        model = getattr(self.provider, 'model', '')
+        return f'{self.namespace}:{fingerprint(prompt, model, max_tokens)}'
+
+    def _state(self):
+        return self._states.get()
+
+    def _lead(self, state, key):
+        future = asyncio.get_running_loop().create_future()
+        state.inflight[key] = future
+        return future
+
+    def _fail(self, future, error):
+        if not isinstance(error, Exception):
+            # Cancelled or closed: followers still need an answer
+            error = ProviderError('LLM request was abandoned')
+        future.set_exception(error)
+        # Mark it retrieved; nobody may be waiting on it
+        future.exception()
+
+    async def generate(self, prompt, max_tokens=150):
+        """The full response text for ``prompt``."""
+        key = self.key(prompt, max_tokens)
+        cached = await cache.aget(key)
+        if cached is not None:
+            llm_requests.inc(mode='full', outcome='cached')
+            return cached
+
+        state = self._state()
+        pending = state.inflight.get(key)
+        if pending is not None:
+            llm_requests.inc(mode='full', outcome='coalesced')
+            return await asyncio.shield(pending)
+
+        future = self._lead(state, key)
+        try:
+            async with state.semaphore:
+                text = await self.provider.generate(prompt, max_tokens=max_tokens)
+            future.set_result(text)
+            # Still in flight until cached, so nobody in between calls again
+            await cache.aset(key, text, self.cache_ttl)
+        except BaseException as e:
+            if not future.done():
+                llm_requests.inc(mode='full', outcome='error')
+                self._fail(future, e)
+            raise
+        finally:
+            state.inflight.pop(key, None)
+        llm_requests.inc(mode='full', outcome='generated')
+        return text
+
+    async def stream(self, prompt, max_tokens=150):
+        """
+        Yields the response in chunks as the provider produces them. Cached
+        and coalesced answers arrive as a single chunk.
+        """
+        key = self.key(prompt, max_tokens)
+        cached = await cache.aget(key)
+        if cached is not None:
+            llm_requests.inc(mode='stream', outcome='cached')
+            yield cached
+            return
+
+        state = self._state()
+        pending = state.inflight.get(key)
+        if pending is not None:
+            llm_requests.inc(mode='stream', outcome='coalesced')
+            yield await asyncio.shield(pending)
+            return
+
+        future = self._lead(state, key)
+        chunks = []
+        try:
+            async with state.semaphore:
+                async for chunk in self.provider.stream(prompt, max_tokens=max_tokens):
+                    chunks.append(chunk)
+                    yield chunk
+            text = ''.join(chunks)
+            future.set_result(text)
+            await cache.aset(key, text, self.cache_ttl)
+        except BaseException as e:
+            if not future.done():
+                llm_requests.inc(mode='stream', outcome='error')
+                self._fail(future, e)
+            raise
+        finally:
+            state.inflight.pop(key, None)
+        llm_requests.inc(mode='stream', outcome='generated')
+
+    def generate_sync(self, prompt, max_tokens=150):
+        """Blocking ``generate`` for sync callers (in-flight sharing is per event loop)."""
+        cached = cache.get(self.key(prompt, max_tokens))
+        if cached is not None:
+            llm_requests.inc(mode='full', outcome='cached')
+            return cached
+        return async_to_sync(self._generate_privately)(prompt, max_tokens)
+
+    async def _generate_privately(self, prompt, max_tokens):
+        async with http_client.private_session():
+            return await self.generate(prompt, max_tokens=max_tokens)
+
+
+llm_gateway = LLMGateway()
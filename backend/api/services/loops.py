@@ -0,0 +1,45 @@
+"""
+Per-event-loop state.
+
+asyncio objects (sessions, futures, semaphores, locks) belong to the loop
+that created them, and sync code reaches async code through
+``async_to_sync``, which can run each call on a loop of its own. Such
+state is kept per running loop in a ``LoopLocal``.
+
+A weak mapping keyed by loop does not work here: the values reference
+their loop, so the keys never die. Entries are held strongly instead and
+dropped once their loop has been closed.
+"""
+import asyncio
+import threading
+
+
+class LoopLocal:
+    """One value per running event loop, made by ``factory`` on first use."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get(self):
+        loop = asyncio.get_running_loop()
+        value = self._values.get(loop)
+        if value is None:
+            value = self.factory()
+            with self._lock:
+                self._prune()
+                self._values[loop] = value
+        return value
+
+    def pop(self):
+        """Forgets (and returns) the running loop's value, if it has one."""
+        with self._lock:
+            return self._values.pop(asyncio.get_running_loop(), None)
+
+    def __len__(self):
+        return len(self._values)
+
+    def _prune(self):
+        for loop in [loop for loop in self._values if loop.is_closed()]:
+            del self._values[loop]
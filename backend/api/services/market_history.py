@@ -0,0 +1,266 @@
+import logging
+from datetime import timedelta
+
+import pandas as pd
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.utils import timezone
+
+from ..models import MarketData, PriceBar
+from .valuation import to_decimal
+
+logger = logging.getLogger(__name__)
+
+PARENT_TABLE = MarketData._meta.db_table
+PARTITION_PREFIX = f'{PARENT_TABLE}_p'
+
+# Bar size and the interval each one is built from (None: raw ticks)
+INTERVALS = {
+    '1m': (timedelta(minutes=1), None),
+    '1h': (timedelta(hours=1), '1m'),
+    '1d': (timedelta(days=1), '1h'),
+}
+
+# How far back each rollup run recomputes, so late ticks and missed runs
+# are folded in; bars are upserted, so re-running a window is harmless
+ROLLUP_LOOKBACK = {
+    '1m': timedelta(minutes=15),
+    '1h': timedelta(hours=3),
+    '1d': timedelta(days=3),
+}
+
+# Widest chart range served from each interval, finest first
+MAX_RANGE = {
+    '1m': timedelta(days=1),
+    '1h': timedelta(days=60),
+}
+
+BAR_FIELDS = ['open', 'high', 'low', 'close', 'volume', 'ticks']
+
+
+def floor_time(moment, interval):
+    """Start of the ``interval`` bar containing ``moment``."""
+    return pd.Timestamp(moment).floor(INTERVALS[interval][0]).to_pydatetime()
+
+
+class MarketHistory:
+    """
+    Retention and downsampling for the MarketData tick history.
+
+    On Postgres the tick table is range-partitioned by day (see migration
+    0006): ``ensure_partitions`` creates the upcoming daily partitions and
+    ``prune`` detaches and drops the ones past the retention window, which
+    is a catalog operation rather than a mass DELETE. Other backends fall
+    back to deleting old rows.
+
+    ``rollup`` folds ticks into 1-minute OHLCV bars and each bar interval
+    into the next coarser one; ``bars`` answers chart queries from the
+    finest interval that keeps the number of bars bounded.
+    """
+
+    def __init__(self, tick_retention_days=None, bar_retention_days=None):
+        self.tick_retention = timedelta(days=tick_retention_days or settings.MARKET_DATA_RETENTION_DAYS)
+        retention = bar_retention_days or settings.PRICE_BAR_RETENTION_DAYS
+        self.bar_retention = {
+            interval: timedelta(days=days) for interval, days in retention.items() if days
+        }
+
+    # Partitions
+
+    def partitioned(self):
+        if connection.vendor != 'postgresql':
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+                "WHERE c.relname = %s",
+                [PARENT_TABLE],
+            )
+            return cursor.fetchone() is not None
+
+    def partitions(self):
+        """``{partition name: day}`` for the daily partitions of the tick table."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid "
+                "JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = %s",
+                [PARENT_TABLE],
+            )
+            names = [row[0] for row in cursor.fetchall()]
+        days = {}
+        for name in names:
+            suffix = name[len(PARTITION_PREFIX):]
+            if name.startswith(PARTITION_PREFIX) and suffix.isdigit():
+                days[name] = pd.Timestamp(suffix).date()
+        return days
+
+    def ensure_partitions(self, days_ahead=None, now=None):
+        """Creates daily partitions from today through ``days_ahead`` days out."""
+        if not self.partitioned():
+            return []
+        days_ahead = settings.MARKET_DATA_PARTITION_DAYS_AHEAD if days_ahead is None else days_ahead
+        today = (now or timezone.now()).date()
+        existing = set(self.partitions().values())
+        created = []
+        for offset in range(days_ahead + 1):
+            day = today + timedelta(days=offset)
+            if day in existing:
+                continue
+            name = f'{PARTITION_PREFIX}{day:%Y%m%d}'
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(
+                        f'CREATE TABLE "{name}" PARTITION OF "{PARENT_TABLE}" '
+                        f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+                    )
+            except DatabaseError as e:
+                # The default partition already holds rows for that day
+                logger.warning("Could not create partition %s: %s", name, e)
+                continue
+            created.append(name)
+        return created
+
+    def prune(self, now=None):
+        """Drops ticks and bars older than their retention window."""
+        now = now or timezone.now()
+        cutoff = now - self.tick_retention
+        dropped = []
+        if self.partitioned():
+            with connection.cursor() as cursor:
+                for name, day in sorted(self.partitions().items(), key=lambda item: item[1]):
+                    if day + timedelta(days=1) > cutoff.date():
+                        continue
+                    cursor.execute(f'ALTER TABLE "{PARENT_TABLE}" DETACH PARTITION "{name}"')
+                    cursor.execute(f'DROP TABLE "{name}"')
+                    dropped.append(name)
+                # Only the default partition needs row-level deletes
+                cursor.execute(f'DELETE FROM "{PARENT_TABLE}_default" WHERE "timestamp" < %s', [cutoff])
+                deleted = cursor.rowcount
+        else:
+            deleted, _ = MarketData.objects.filter(timestamp__lt=cutoff).delete()
+
+        bars_deleted = 0
+        for interval, retention in self.bar_retention.items():
+            count, _ = PriceBar.objects.filter(interval=interval, start__lt=now - retention).delete()
+            bars_deleted += count
+
+        logger.info("Pruned %d tick partitions, %d ticks and %d bars", len(dropped), deleted, bars_deleted)
+        return {'partitions': dropped, 'ticks': deleted, 'bars': bars_deleted}
+
+    # Rollups
+
+    def rollup(self, interval, start, end):
+        """Rebuilds the ``interval`` bars that start in [start, end)."""
+        start, end = floor_time(start, interval), floor_time(end, interval)
+        frame = self._source_frame(interval, start, end)
+        if frame.empty:
+            return 0
+
+        frame['start'] = frame['start'].dt.floor(INTERVALS[interval][0])
+        bars = frame.groupby(['symbol', 'start'], sort=False).agg(
+            open=('open', 'first'),
+            high=('high', 'max'),
+            low=('low', 'min'),
+            close=('close', 'last'),
+            volume=('volume', 'sum'),
+            ticks=('ticks', 'sum'),
+        )
+        rows = [
+            PriceBar(
+                symbol=symbol,
+                interval=interval,
+                start=bar_start.to_pydatetime(),
+                open=to_decimal(bar.open),
+                high=to_decimal(bar.high),
+                low=to_decimal(bar.low),
+                close=to_decimal(bar.close),
+                volume=int(bar.volume),
+                ticks=int(bar.ticks),
+            )
+            for (symbol, bar_start), bar in zip(bars.index, bars.itertuples())
+        ]
+        with transaction.atomic():
+            PriceBar.objects.bulk_create(
+                rows,
+                batch_size=1000,
+                update_conflicts=True,
+                unique_fields=['symbol', 'interval', 'start'],
+                update_fields=BAR_FIELDS,
+            )
+        return len(rows)
+
+    def rollup_recent(self, now=None):
+        """Recomputes the recently completed bars of every interval, finest first."""
+        now = now or timezone.now()
+        return {
+            interval: self.rollup(interval, now - ROLLUP_LOOKBACK[interval], now)
+            for interval in INTERVALS
+        }
+
+    def _source_frame(self, interval, start, end):
+        source = INTERVALS[interval][1]
+        if source is not None:
+            rows = PriceBar.objects.filter(
+                interval=source, start__gte=start, start__lt=end,
+            ).order_by('symbol', 'start').values_list('symbol', 'start', *BAR_FIELDS)
+            frame = pd.DataFrame.from_records(list(rows), columns=['symbol', 'start', *BAR_FIELDS])
+            for column in ('open', 'high', 'low', 'close'):
+                frame[column] = frame[column].astype(float)
+            return frame
+
+        rows = MarketData.objects.filter(
+            timestamp__gte=start, timestamp__lt=end,
+        ).order_by('symbol', 'timestamp', 'id').values_list('symbol', 'timestamp', 'current_price', 'volume')
+        frame = pd.DataFrame.from_records(list(rows), columns=['symbol', 'start', 'price', 'volume'])
+        if frame.empty:
+            return frame
+        price = frame.pop('price').astype(float)
+        frame['open'] = frame['high'] = frame['low'] = frame['close'] = price
+        # Tick volume is the cumulative volume for the day: bar volume is the
+        # sum of increments, and a drop means the day rolled over. A symbol's
+        # first tick counts from its last tick before the window, or the
+        # oldest bar would lose that increment once the window slides on
+        increments = frame.groupby('symbol')['volume'].diff()
+        first = ~frame['symbol'].duplicated()
+        previous = frame.loc[first, 'symbol'].map(self._previous_volumes(start, end)).astype(float)
+        increments[first] = frame.loc[first, 'volume'] - previous
+        frame['volume'] = increments.mask(increments < 0, frame['volume']).fillna(0).astype('int64')
+        frame['ticks'] = 1
+        return frame
+
+    def _previous_volumes(self, start, end):
+        """``{symbol: volume}`` of the last tick before ``start``, for the symbols ticking in [start, end)."""
+        previous = MarketData.objects.filter(
+            symbol=OuterRef('symbol'), timestamp__lt=start,
+        ).order_by('-timestamp', '-id').values('volume')[:1]
+        rows = (
+            MarketData.objects.filter(timestamp__gte=start, timestamp__lt=end)
+            .values('symbol').annotate(window_ticks=Count('id'), previous=Subquery(previous))
+            .values_list('symbol', 'previous')
+        )
+        return {symbol: volume for symbol, volume in rows if volume is not None}
+
+    # Queries
+
+    def pick_interval(self, start, end, now=None):
+        """Finest interval whose bar count stays bounded for [start, end)."""
+        now = now or timezone.now()
+        for interval, max_range in MAX_RANGE.items():
+            retention = self.bar_retention.get(interval)
+            if end - start <= max_range and (retention is None or start >= now - retention):
+                return interval
+        return '1d'
+
+    def bars(self, symbol, start, end, interval=None):
+        """OHLCV bars for ``symbol`` in [start, end), oldest first."""
+        interval = interval or self.pick_interval(start, end)
+        rows = PriceBar.objects.filter(
+            symbol=symbol, interval=interval, start__gte=start, start__lt=end,
+        ).order_by('start').values('start', *BAR_FIELDS)
+        return interval, list(rows)
+
+
+market_history = MarketHistory()
@@ -0,0 +1,126 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from ..models import LatestQuote, MarketData
+from .bulk import copy_rows
+from .quote_cache import quote_cache
+
+LATEST_FIELDS = ['current_price', 'daily_change', 'volume', 'timestamp']
+
+
+def record_ticks(ticks, batch_size=1000, use_copy=False):
+    """
+    Appends ``ticks`` (dicts with ``symbol``, ``price`` and optionally
+    ``change`` and ``volume``) to the MarketData history and upserts the
+    newest tick per symbol into LatestQuote, in one transaction.
+
+    With ``use_copy`` on Postgres the history rows are streamed with
+    ``COPY ... FROM STDIN`` instead of multi-row INSERTs.
+    """
+    now = timezone.now()
+    rows = [
+        MarketData(
+            symbol=tick['symbol'],
+            current_price=Decimal(str(tick['price'])),
+            daily_change=Decimal(str(tick.get('change') or 0)),
+            volume=tick.get('volume') or 0,
+            timestamp=now,
+        )
+        for tick in ticks
+    ]
+    if not rows:
+        return []
+
+    with transaction.atomic():
+        if use_copy and connection.vendor == 'postgresql':
+            _copy_market_data(rows)
+        else:
+            rows = MarketData.objects.bulk_create(rows, batch_size=batch_size)
+        latest = {
+            row.symbol: LatestQuote(
+                symbol=row.symbol,
+                current_price=row.current_price,
+                daily_change=row.daily_change,
+                volume=row.volume,
+                timestamp=row.timestamp,
+            )
+            for row in rows
+        }
+        LatestQuote.objects.bulk_create(
+            latest.values(),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['symbol'],
+            update_fields=LATEST_FIELDS,
+        )
+    return rows
+
+
+def _copy_market_data(rows):
+    copy_rows(MarketData, ['symbol', 'current_price', 'daily_change', 'volume', 'timestamp'], (
+        [row.symbol, row.current_price, row.daily_change, row.volume, row.timestamp] for row in rows
+    ))
+
+
+def _fresh(max_age):
+    queryset = LatestQuote.objects.all()
+    if max_age is not None:
+        queryset = queryset.filter(timestamp__gte=timezone.now() - timedelta(seconds=max_age))
+    return queryset
+
+
+def stored_quotes(symbols, max_age=None):
+    """``{symbol: quote}`` from LatestQuote rows younger than ``max_age`` seconds."""
+    symbols = list(dict.fromkeys(symbols))
+    if not symbols:
+        return {}
+    return {symbol: row.as_quote() for symbol, row in _fresh(max_age).in_bulk(symbols).items()}
+
+
+async def astored_quote(symbol, max_age=None):
+    row = await _fresh(max_age).filter(pk=symbol).afirst()
+    return row.as_quote() if row else None
+
+
+def current_quotes(symbols):
+    """
+    Current quote per symbol: fresh quote cache entries, then recent
+    LatestQuote rows, then one bulk provider fetch for whatever is left.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    quotes = quote_cache.get_many(symbols, max_age=quote_cache.soft_ttl)
+
+    missing = [symbol for symbol in symbols if symbol not in quotes]
+    if missing:
+        stored = stored_quotes(missing, max_age=settings.LATEST_QUOTE_MAX_AGE)
+        if stored:
+            quote_cache.set_many(stored)
+            quotes.update(stored)
+            missing = [symbol for symbol in missing if symbol not in stored]
+    if missing:
+        quotes.update(quote_cache.get_or_load_many(missing))
+    return quotes
+
+
+def latest_prices(symbols):
+    """
+    ``{symbol: Decimal price}`` for ``symbols`` without calling a provider:
+    live quotes from the quote cache first, then the LatestQuote row for the
+    rest. Costs one cache round trip and at most one primary-key query.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    prices = {
+        symbol: Decimal(str(quote['price']))
+        for symbol, quote in quote_cache.get_many(symbols).items()
+        if quote.get('price') is not None
+    }
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    if missing:
+        prices.update(
+            (symbol, row.current_price) for symbol, row in LatestQuote.objects.in_bulk(missing).items()
+        )
+    return prices
@@ -0,0 +1,230 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter per label set, in Prometheus text format."""
+    kind = 'counter'
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}_total{_labels(zip(self.labelnames, key))} {_number(value)}'
+
+
+class Gauge(Counter):
+    """Last value set per label set."""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_labels(zip(self.labelnames, key))} {_number(value)}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in Prometheus text format."""
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['buckets'][index] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(name, '') for name in self.labelnames))
+        return series['count'] if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = {key: {**value, 'buckets': list(value['buckets'])} for key, value in self._series.items()}
+        for key, value in sorted(series.items()):
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), value['buckets']):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                yield f'{self.name}_bucket{_labels(labels + [("le", le)])} {cumulative}'
+            yield f'{self.name}_sum{_labels(labels)} {_number(value["sum"])}'
+            yield f'{self.name}_count{_labels(labels)} {value["count"]}'
+
+
+class Registry:
+    """The metrics this process exposes on ``/metrics``."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    'http_requests', 'HTTP requests by view, method and status.', ('view', 'method', 'status'),
+))
+http_request_duration = registry.register(Histogram(
+    'http_request_duration_seconds', 'Wall time of HTTP requests.', ('view', 'method'),
+))
+db_queries_per_request = registry.register(Histogram(
+    'http_request_db_queries', 'Database queries per HTTP request.', ('view',), buckets=COUNT_BUCKETS,
+))
+db_time_per_request = registry.register(Histogram(
+    'http_request_db_seconds', 'Time spent in database queries per HTTP request.', ('view',),
+))
+provider_calls_per_request = registry.register(Histogram(
+    'http_request_provider_calls', 'Outbound provider calls per HTTP request.', ('view',), buckets=COUNT_BUCKETS,
+))
+provider_time_per_request = registry.register(Histogram(
+    'http_request_provider_seconds', 'Time spent in outbound provider calls per HTTP request.', ('view',),
+))
+provider_call_duration = registry.register(Histogram(
+    'provider_call_duration_seconds', 'Outbound provider calls, in and out of requests.', ('provider', 'outcome'),
+))
+
+
+class RequestStats:
+    """Database and provider work done on behalf of one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.provider_calls = 0
+        self.provider_seconds = 0.0
+        self.providers = {}
+
+    def add_provider_call(self, provider, seconds):
+        self.provider_calls += 1
+        self.provider_seconds += seconds
+        calls, total = self.providers.get(provider, (0, 0.0))
+        self.providers[provider] = (calls + 1, total + seconds)
+
+    def breakdown(self):
+        providers = ', '.join(
+            f'{provider} {calls}x {total * 1000:.0f}ms' for provider, (calls, total) in sorted(self.providers.items())
+        )
+        return (
+            f'db: {self.db_queries} queries {self.db_seconds * 1000:.0f}ms, '
+            f'providers: {self.provider_calls} calls {self.provider_seconds * 1000:.0f}ms'
+            + (f' [{providers}]' if providers else '')
+        )
+
+
+# Copied into sync_to_async threads and tasks, so work a request hands off
+# is still counted against it
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def current_stats():
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    """``connection.execute_wrapper`` hook installed on every connection."""
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def install_query_hook(sender, connection, **kwargs):
+    """``connection_created`` receiver."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def track_provider_call(provider):
+    """Times an outbound call to ``provider`` (works around sync or async code)."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        seconds = time.perf_counter() - started
+        provider_call_duration.observe(seconds, provider=provider, outcome=outcome)
+        stats = _current.get()
+        if stats is not None:
+            stats.add_provider_call(provider, seconds)
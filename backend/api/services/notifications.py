@@ -0,0 +1,97 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+
+from .providers import LatencyTracker
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = 'alert_notification_stats'
+
+
+def alert_notification(alert, message):
+    """JSON-serialisable notification payload for a fired StockAlert."""
+    return {
+        'alert_id': alert.id,
+        'recipient': alert.notification_email,
+        'symbol': alert.stock_symbol,
+        'message': message,
+        'triggered_at': time.time(),
+    }
+
+
+def digest_message(recipient, notifications):
+    """One email covering every alert that fired for ``recipient``."""
+    symbols = sorted({notification['symbol'] for notification in notifications})
+    if len(notifications) == 1:
+        subject = f"Stock Alert: {symbols[0]}"
+    else:
+        subject = f"Stock Alerts: {len(notifications)} triggered ({', '.join(symbols)})"
+    body = "\n".join(notification['message'] for notification in notifications)
+    return EmailMessage(subject=subject, body=body, from_email=settings.DEFAULT_FROM_EMAIL, to=[recipient])
+
+
+class NotificationQueue:
+    """
+    Delivers alert notifications off the evaluation path.
+
+    ``enqueue`` hands fired alerts to the ``send_alert_notifications`` task
+    (on ``ALERT_NOTIFICATION_QUEUE`` when set), so a market-wide move never
+    waits on SMTP inside an alert pass. ``dispatch`` runs in the worker:
+    alerts are coalesced into one digest per recipient and sent over
+    a single SMTP connection in batches of ``batch_size`` messages.
+
+    Batch send time and trigger-to-send delay are recorded per worker and
+    mirrored to the cache for the metrics endpoint.
+    """
+
+    def __init__(self, batch_size=None, latency=None):
+        self.batch_size = batch_size or settings.ALERT_NOTIFICATION_BATCH_SIZE
+        self.latency = latency or LatencyTracker()
+        self.stats = {'notifications': 0, 'emails': 0, 'batches': 0, 'failed': 0}
+
+    def enqueue(self, notifications):
+        if notifications:
+            # api.tasks imports the alert engine, which imports this module
+            from ..tasks import send_alert_notifications
+            send_alert_notifications.delay(list(notifications))
+
+    def dispatch(self, notifications):
+        """Sends digests for ``notifications``; returns the number of emails sent."""
+        if not notifications:
+            return 0
+        by_recipient = {}
+        for notification in notifications:
+            by_recipient.setdefault(notification['recipient'], []).append(notification)
+        messages = [digest_message(recipient, items) for recipient, items in by_recipient.items()]
+
+        sent = 0
+        with get_connection(fail_silently=False) as connection:
+            for offset in range(0, len(messages), self.batch_size):
+                batch = messages[offset:offset + self.batch_size]
+                started = time.perf_counter()
+                try:
+                    sent += connection.send_messages(batch) or 0
+                except Exception as e:
+                    self.stats['failed'] += len(batch)
+                    logger.warning("Alert notification batch of %d failed: %s", len(batch), e)
+                    continue
+                self.latency.record('batch', time.perf_counter() - started)
+                self.stats['batches'] += 1
+
+        now = time.time()
+        for notification in notifications:
+            self.latency.record('delivery', now - notification['triggered_at'])
+        self.stats['notifications'] += len(notifications)
+        self.stats['emails'] += sent
+        cache.set(STATS_KEY, self.snapshot(), None)
+        return sent
+
+    def snapshot(self):
+        return {**self.stats, 'latency': self.latency.snapshot()}
+
+
+notification_queue = NotificationQueue()
@@ -0,0 +1,174 @@
+"""
+Bounded outbound queues for websocket connections.
+
+Consumers never ``await self.send`` from their event handlers. They
+``put`` messages into their connection's ``Outbox``, and a writer task
+sends them one at a time, so a client that reads slowly stalls only its
+own writer and never the handlers or the rest of the worker.
+
+Messages put under a key replace the one still waiting under that key
+(latest value wins), so a socket that falls behind on quotes gets the
+newest price per symbol instead of every tick in between. A message can
+also be a coroutine function, called when its turn comes, for payloads
+that should be built as late as possible.
+
+The queue holds at most ``WEBSOCKET_OUTBOX_SIZE`` messages. A message that
+does not fit is dropped. A connection is closed as a slow consumer
+(code 1013, try again later) when it is still overflowing
+``WEBSOCKET_SLOW_GRACE`` seconds after it first overflowed, or when a
+single send blocks for ``WEBSOCKET_SEND_TIMEOUT`` seconds. Strict outboxes,
+for protocols where a lost message corrupts the client's state, close on
+the first overflow instead.
+"""
+import asyncio
+import itertools
+import logging
+import time
+import weakref
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+TRY_AGAIN_LATER = 1013
+
+outbox_depth = metrics.registry.register(metrics.Gauge(
+    'websocket_outbox_depth', 'Messages waiting in websocket outboxes.', ('consumer',),
+))
+outbox_messages = metrics.registry.register(metrics.Counter(
+    'websocket_outbox_messages', 'Outbound websocket messages by outcome (sent, superseded, overflow).',
+    ('consumer', 'outcome'),
+))
+slow_disconnects = metrics.registry.register(metrics.Counter(
+    'websocket_slow_disconnects', 'Connections closed for not keeping up with their messages.', ('consumer', 'reason'),
+))
+
+_outboxes = weakref.WeakSet()
+
+
+def connection_stats():
+    """Queue depth and counters of every open outbox in this process."""
+    return sorted((outbox.stats() for outbox in list(_outboxes)), key=lambda stats: stats['connection'])
+
+
+class Outbox:
+    def __init__(self, send, close, consumer, connection='', max_size=None, send_timeout=None,
+                 slow_grace=None, strict=False):
+        self._send = send
+        self._close = close
+        self.consumer = consumer
+        self.connection = connection
+        self.max_size = max_size or settings.WEBSOCKET_OUTBOX_SIZE
+        self.send_timeout = send_timeout or settings.WEBSOCKET_SEND_TIMEOUT
+        self.slow_grace = slow_grace if slow_grace is not None else settings.WEBSOCKET_SLOW_GRACE
+        self.strict = strict
+        self.counts = {'sent': 0, 'superseded': 0, 'overflow': 0}
+        self.peak = 0
+        self.closed = False
+        self._pending = OrderedDict()
+        self._ids = itertools.count()
+        self._ready = asyncio.Event()
+        self._overflowing_since = None
+        self._writer = None
+        _outboxes.add(self)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def start(self):
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._write())
+
+    def stop(self):
+        """Discards whatever is still queued; call from the consumer's disconnect."""
+        if self._writer is not None:
+            self._writer.cancel()
+            self._writer = None
+        outbox_depth.inc(-len(self._pending), consumer=self.consumer)
+        self._pending.clear()
+        self.closed = True
+        _outboxes.discard(self)
+
+    def put(self, message, key=None):
+        """Queues ``message`` (replacing the one waiting under ``key``); False if it was dropped."""
+        if self.closed:
+            return False
+        if key is not None and key in self._pending:
+            self._pending[key] = message
+            self._count('superseded')
+            return True
+
+        if len(self._pending) >= self.max_size:
+            self._count('overflow')
+            now = time.monotonic()
+            if self._overflowing_since is None:
+                self._overflowing_since = now
+            if self.strict or now - self._overflowing_since >= self.slow_grace:
+                self._give_up('overflow')
+            return False
+
+        self._pending[key if key is not None else ('message', next(self._ids))] = message
+        outbox_depth.inc(consumer=self.consumer)
+        self.peak = max(self.peak, len(self._pending))
+        self._ready.set()
+        return True
+
+    def stats(self):
+        return {
+            'consumer': self.consumer,
+            'connection': self.connection,
+            'depth': len(self._pending),
+            'peak_depth': self.peak,
+            **self.counts,
+        }
+
+    def _count(self, outcome):
+        self.counts[outcome] += 1
+        outbox_messages.inc(consumer=self.consumer, outcome=outcome)
+
+    async def _write(self):
+        while True:
+            if not self._pending:
+                self._overflowing_since = None
+                self._ready.clear()
+                await self._ready.wait()
+                continue
+
+            _, message = self._pending.popitem(last=False)
+            outbox_depth.inc(-1, consumer=self.consumer)
+            try:
+                if callable(message):
+                    message = await message()
+                    if message is None:
+                        continue
+                await asyncio.wait_for(self._send(message), self.send_timeout)
+            except asyncio.TimeoutError:
+                self._give_up('send_timeout')
+                return
+            except Exception as e:
+                logger.warning("Websocket send failed on %s: %s", self.connection or self.consumer, e)
+                continue
+            self._count('sent')
+
+    def _give_up(self, reason):
+        if self.closed:
+            return
+        slow_disconnects.inc(consumer=self.consumer, reason=reason)
+        logger.warning(
+            "Closing slow %s websocket %s (%s, %d queued)", self.consumer, self.connection, reason, len(self._pending),
+        )
+        writer = self._writer
+        self._writer = None
+        self.stop()
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+        asyncio.create_task(self._close_quietly())
+
+    async def _close_quietly(self):
+        try:
+            await asyncio.wait_for(self._close(TRY_AGAIN_LATER), self.send_timeout)
+        except Exception:
+            pass
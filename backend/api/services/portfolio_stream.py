@@ -0,0 +1,172 @@
+"""
+Delta-encoded portfolio pushes for PortfolioConsumer.
+
+A portfolio socket gets one ``portfolio_snapshot`` (the totals and every
+holding, as the REST portfolio view shapes them) and after that only
+``portfolio_delta`` messages holding what changed: the totals that moved
+and, per holding, the fields that differ from what the client already has.
+
+Updates are driven by the price ticks published to the held symbols'
+``stock_group_<symbol>`` groups. Ticks only reprice in memory; the
+portfolio is revalued and diffed once per ``PORTFOLIO_PUSH_WINDOW_MS``
+however many ticks arrived, and nothing is sent when nothing changed.
+
+Every message carries its stream id and a sequence number. The stream's
+last document and its recent deltas are kept in the shared cache for
+``PORTFOLIO_RESUME_TTL`` seconds, so a client reconnecting with
+``?stream=<id>&since=<seq>`` is sent the deltas it missed (and one more
+for whatever changed while it was away) instead of a new snapshot.
+"""
+import math
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from ..models import Portfolio
+from .market_prices import latest_prices
+from .valuation import Holdings, value_holdings
+
+TOTAL_FIELDS = ('total_value', 'total_cost', 'gain_loss')
+
+
+def portfolio_document(valuation):
+    """Totals plus one record per holding, in the order the holdings were loaded."""
+    return {
+        **valuation.totals(),
+        'investments': valuation.records(),
+    }
+
+
+def diff_documents(old, new):
+    """
+    What a client holding ``old`` needs to get to ``new``: changed totals,
+    changed fields per holding (whole records for new holdings) and the ids
+    of holdings that are gone. Empty when nothing changed.
+    """
+    delta = {field: new[field] for field in TOTAL_FIELDS if new[field] != old.get(field)}
+
+    previous_by_id = {record['id']: record for record in old.get('investments', ())}
+    changed = []
+    for record in new['investments']:
+        previous = previous_by_id.pop(record['id'], None)
+        if previous is None:
+            changed.append(record)
+            continue
+        fields = {field: value for field, value in record.items() if previous.get(field) != value}
+        if fields:
+            changed.append({'id': record['id'], **fields})
+    if changed:
+        delta['investments'] = changed
+    if previous_by_id:
+        delta['removed'] = sorted(previous_by_id)
+    return delta
+
+
+class PortfolioStream:
+    """
+    One socket's view of a user's portfolio: the holdings, the latest price
+    per held symbol and the last document sent, plus the sequence numbers
+    and delta log that make the stream resumable.
+    """
+
+    def __init__(self, user_id, holdings, prices, stream_id=None):
+        self.user_id = user_id
+        self.holdings = holdings
+        self.prices = dict(prices)
+        self.id = stream_id or uuid.uuid4().hex
+        self.seq = 0
+        self.document = None
+        self.log = []
+
+    @classmethod
+    def load(cls, user_id):
+        """
+        Loads the user's holdings and their last known prices. Only touches
+        the database and the quote cache; symbols without a price yet get
+        one from their first tick.
+        """
+        holdings = Holdings.from_queryset(Portfolio.objects.filter(user_id=user_id).order_by('stock_symbol'))
+        prices = {symbol: float(price) for symbol, price in latest_prices(holdings.symbols).items()}
+        return cls(user_id, holdings, prices)
+
+    @property
+    def symbols(self):
+        return list(self.holdings.symbols)
+
+    @staticmethod
+    def key(stream_id):
+        return f'portfolio_stream:{stream_id}'
+
+    def current(self):
+        return portfolio_document(value_holdings(self.holdings, self.prices))
+
+    def snapshot(self):
+        """Starts the stream over from a full document."""
+        self.document = self.current()
+        self.seq += 1
+        self.log = []
+        return self.document
+
+    def snapshot_message(self, **extra):
+        """Starts the stream over and returns the ``portfolio_snapshot`` message for it."""
+        document = self.snapshot()
+        return {'type': 'portfolio_snapshot', **extra, 'stream': self.id, 'seq': self.seq, 'data': document}
+
+    def delta_message(self, seq, delta, **extra):
+        return {'type': 'portfolio_delta', **extra, 'stream': self.id, 'seq': seq, 'data': delta}
+
+    def reprice(self, symbol, price):
+        """Takes a tick; True when it moved the price of a held symbol."""
+        if symbol not in self.holdings.symbols:
+            return False
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            return False
+        if math.isnan(price) or self.prices.get(symbol) == price:
+            return False
+        self.prices[symbol] = price
+        return True
+
+    def advance(self):
+        """The delta since the last message (None if there is none), under the next sequence number."""
+        current = self.current()
+        delta = diff_documents(self.document, current)
+        if not delta:
+            return None
+        self.document = current
+        self.seq += 1
+        self.log.append((self.seq, delta))
+        del self.log[:-settings.PORTFOLIO_RESUME_LOG]
+        return delta
+
+    async def asave(self):
+        await cache.aset(self.key(self.id), {
+            'user_id': self.user_id,
+            'seq': self.seq,
+            'document': self.document,
+            'log': self.log,
+        }, settings.PORTFOLIO_RESUME_TTL)
+
+    async def aresume(self, stream_id, since):
+        """
+        Picks up stream ``stream_id`` after sequence number ``since``.
+        Returns the ``(seq, delta)`` pairs the client missed, or None when
+        the stream is unknown, expired, someone else's or too far behind to
+        replay, in which case the caller sends a snapshot.
+        """
+        if not stream_id or since is None:
+            return None
+        record = await cache.aget(self.key(stream_id))
+        if not record or record['user_id'] != self.user_id or since > record['seq']:
+            return None
+        missed = [(seq, delta) for seq, delta in record['log'] if seq > since]
+        if (missed[0][0] if missed else record['seq'] + 1) != since + 1:
+            # The log no longer reaches back to the client's last message
+            return None
+        self.id = stream_id
+        self.seq = record['seq']
+        self.document = record['document']
+        self.log = list(record['log'])
+        return missed
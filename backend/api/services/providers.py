@@ -0,0 +1,630 @@
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import json
+import logging
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import aiohttp
+import pandas as pd
+import yfinance as yf
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+
+from .loops import LoopLocal
+from .metrics import track_provider_call
+from .rate_budget import BudgetExhausted, call_budget
+from .simulator import SimulatedOutage, simulated, simulator
+
+logger = logging.getLogger(__name__)
+
+
+class ProviderError(Exception):
+    """Raised when an upstream market data or LLM provider call fails."""
+
+
+# What parsing a malformed provider response (an error body, a list where
+# an object was expected, a non-numeric price) raises
+MALFORMED_RESPONSE_ERRORS = (AttributeError, KeyError, TypeError, ValueError)
+
+
+class HttpClient:
+    """
+    Pooled aiohttp client shared by all providers.
+
+    aiohttp sessions are bound to the event loop that created them, so one
+    session (and connection pool) is kept per running loop, and dropped once
+    that loop is closed. Each pool caps
+    total and per-host connections and keeps idle connections alive so
+    repeated calls to the same provider skip the TCP/TLS handshake.
+
+    Sync code calling in through ``async_to_sync`` wraps its calls in
+    ``private_session``: its loop is either a throwaway one whose session
+    nothing would close, or a server loop whose shared pool must not be
+    closed under other requests.
+    """
+
+    def __init__(self, limit=None, limit_per_host=None, timeout=None,
+                 connect_timeout=None, keepalive_timeout=None):
+        self.limit = limit or settings.MARKET_DATA_HTTP_MAX_CONNECTIONS
+        self.limit_per_host = limit_per_host or settings.MARKET_DATA_HTTP_MAX_PER_HOST
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout or settings.MARKET_DATA_HTTP_TIMEOUT,
+            sock_connect=connect_timeout or settings.MARKET_DATA_HTTP_CONNECT_TIMEOUT,
+        )
+        self.keepalive_timeout = keepalive_timeout or settings.MARKET_DATA_HTTP_KEEPALIVE
+        self._sessions = LoopLocal(self._new_session)
+        self._private = contextvars.ContextVar(f'http_client_private_{id(self)}', default=None)
+
+    def _new_session(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.limit,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=self.keepalive_timeout,
+            ttl_dns_cache=300,
+        )
+        return aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+
+    def session(self):
+        session = self._private.get()
+        if session is not None:
+            return session
+        session = self._sessions.get()
+        if session.closed:
+            self._sessions.pop()
+            session = self._sessions.get()
+        return session
+
+    async def request_json(self, method, url, **kwargs):
+        try:
+            with track_provider_call(urlsplit(url).hostname or 'unknown'):
+                async with self.session().request(method, url, **kwargs) as response:
+                    if response.status != 200:
+                        raise ProviderError(f"{url} returned HTTP {response.status}")
+                    return await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderError(f"{url} failed: {e!r}") from e
+
+    async def stream_lines(self, method, url, **kwargs):
+        """Yields the response body line by line as it arrives (for server-sent events)."""
+        try:
+            with track_provider_call(urlsplit(url).hostname or 'unknown'):
+                async with self.session().request(method, url, **kwargs) as response:
+                    if response.status != 200:
+                        raise ProviderError(f"{url} returned HTTP {response.status}")
+                    async for line in response.content:
+                        yield line.decode().rstrip('\r\n')
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise ProviderError(f"{url} failed: {e!r}") from e
+
+    async def get_json(self, url, params=None):
+        return await self.request_json('GET', url, params=params)
+
+    async def post_json(self, url, payload, params=None, headers=None):
+        return await self.request_json('POST', url, json=payload, params=params, headers=headers)
+
+    @contextlib.asynccontextmanager
+    async def private_session(self):
+        """Calls made inside the block (and tasks it starts) use a session of their own, closed on exit."""
+        session = self._new_session()
+        token = self._private.set(session)
+        try:
+            yield session
+        finally:
+            self._private.reset(token)
+            await session.close()
+
+    async def close(self):
+        session = self._sessions.pop()
+        if session is not None:
+            await session.close()
+
+
+http_client = HttpClient()
+
+
+async def spend_budget(provider, api_key=None):
+    """Takes a call token for ``provider``; an exhausted budget is a provider failure."""
+    try:
+        await call_budget.aacquire(provider, api_key or '')
+    except BudgetExhausted as e:
+        raise ProviderError(str(e)) from e
+
+
+class MarketDataProvider:
+    """
+    Base class for quote/search providers.
+
+    ``get_quote`` returns the latest price as a float (or None when the
+    provider has no usable quote) and ``search`` returns a list of
+    ``(symbol, company name)`` matches, best first.
+    """
+    name = None
+    label = None
+    api_key_setting = None
+
+    def __init__(self, client=None):
+        self.client = client or http_client
+
+    async def get_json(self, url, params=None):
+        """GET against this provider's shared call budget."""
+        await spend_budget(self.name, getattr(settings, self.api_key_setting or '', None))
+        return await self.client.get_json(url, params=params)
+
+    async def get_quote(self, symbol):
+        raise NotImplementedError
+
+    async def search(self, query):
+        raise NotImplementedError
+
+
+class FinnhubProvider(MarketDataProvider):
+    name = 'finnhub'
+    label = 'Finnhub'
+    api_key_setting = 'FINNHUB_API_KEY'
+    base_url = 'https://finnhub.io/api/v1'
+
+    async def get_quote(self, symbol):
+        data = await self.get_json(f"{self.base_url}/quote", params={
+            'symbol': symbol, 'token': settings.FINNHUB_API_KEY,
+        })
+        return float(data['c']) if data.get('c') else None
+
+    async def get_snapshot(self, symbol):
+        """Full quote snapshot in the ``fetch_quote`` shape, or None."""
+        data = await self.get_json(f"{self.base_url}/quote", params={
+            'symbol': symbol, 'token': settings.FINNHUB_API_KEY,
+        })
+        if not data.get('c'):
+            return None
+        return {
+            'symbol': symbol,
+            'price': data['c'],
+            'change': data.get('d'),
+            'previous_close': data.get('pc'),
+            'volume': None,
+            'high': data.get('h'),
+            'low': data.get('l'),
+            'source': self.label,
+        }
+
+    async def search(self, query):
+        data = await self.get_json(f"{self.base_url}/search", params={
+            'q': query, 'token': settings.FINNHUB_API_KEY,
+        })
+        return [(r['symbol'], r['description']) for r in data.get('result', [])]
+
+
+class AlphaVantageProvider(MarketDataProvider):
+    name = 'alpha_vantage'
+    label = 'Alpha Vantage'
+    api_key_setting = 'ALPHA_VANTAGE_API_KEY'
+    base_url = 'https://www.alphavantage.co/query'
+
+    async def get_quote(self, symbol):
+        data = await self.get_json(self.base_url, params={
+            'function': 'GLOBAL_QUOTE', 'symbol': symbol, 'apikey': settings.ALPHA_VANTAGE_API_KEY,
+        })
+        price = data.get('Global Quote', {}).get('05. price')
+        return float(price) if price else None
+
+    async def search(self, query):
+        data = await self.get_json(self.base_url, params={
+            'function': 'SYMBOL_SEARCH', 'keywords': query, 'apikey': settings.ALPHA_VANTAGE_API_KEY,
+        })
+        return [(r['1. symbol'], r['2. name']) for r in data.get('bestMatches', [])]
+
+
+class TwelveDataProvider(MarketDataProvider):
+    name = 'twelve_data'
+    label = 'Twelve Data'
+    api_key_setting = 'TWELVEDATA_API_KEY'
+    base_url = 'https://api.twelvedata.com'
+
+    async def get_quote(self, symbol):
+        data = await self.get_json(f"{self.base_url}/price", params={
+            'symbol': symbol, 'apikey': settings.TWELVEDATA_API_KEY,
+        })
+        price = data.get('price')
+        return float(price) if price else None
+
+    async def search(self, query):
+        data = await self.get_json(f"{self.base_url}/symbol_search", params={
+            'symbol': query,
+        })
+        return [(r['symbol'], r['instrument_name']) for r in data.get('data', [])]
+
+
+class YFinanceProvider(MarketDataProvider):
+    """yfinance has no async API, so calls run in the default thread pool."""
+    name = 'yfinance'
+    label = 'Yahoo Finance'
+
+    async def get_quote(self, symbol):
+        with track_provider_call('yfinance'):
+            info = await sync_to_async(lambda: yf.Ticker(symbol).info, thread_sensitive=False)()
+        price = info.get('currentPrice')
+        return float(price) if price else None
+
+    async def search(self, query):
+        return []
+
+
+class SimulatedProvider(MarketDataProvider):
+    """Offline provider backed by the deterministic market simulator."""
+    name = 'simulated'
+    label = 'Simulator'
+
+    async def get_quote(self, symbol):
+        return (await self.get_snapshot(symbol))['price']
+
+    async def get_snapshot(self, symbol):
+        try:
+            return await simulator.afetch_quote(symbol)
+        except SimulatedOutage as e:
+            raise ProviderError(str(e)) from e
+
+    async def search(self, query):
+        try:
+            return await simulator.asearch(query)
+        except SimulatedOutage as e:
+            raise ProviderError(str(e)) from e
+
+
+def fetch_quote(symbol):
+    """Fetch a full quote snapshot for a symbol from yfinance (blocking)."""
+    if simulated():
+        return simulator.fetch_quote(symbol)
+    with track_provider_call('yfinance'):
+        info = yf.Ticker(symbol).info
+    return {
+        'symbol': symbol,
+        'price': info.get('currentPrice'),
+        'change': info.get('regularMarketChange'),
+        'previous_close': info.get('previousClose'),
+        'volume': info.get('regularMarketVolume') or info.get('volume'),
+        'high': info.get('dayHigh'),
+        'low': info.get('dayLow'),
+        'source': YFinanceProvider.label,
+    }
+
+
+def fetch_quotes_bulk(symbols, batch_size=None):
+    """
+    Fetch snapshots for many symbols at once (blocking).
+
+    Symbols are downloaded from yfinance in batches of ``batch_size`` with a
+    single multi-ticker ``download`` call each; anything yfinance has no
+    price for is then fetched from Finnhub concurrently over the shared HTTP
+    pool. Returns ``{symbol: snapshot}`` for the symbols that were found.
+    """
+    batch_size = batch_size or settings.QUOTE_BATCH_SIZE
+    symbols = list(dict.fromkeys(symbols))
+    if simulated():
+        return _simulated_snapshots(symbols, batch_size)
+    quotes = {}
+    for start in range(0, len(symbols), batch_size):
+        batch = symbols[start:start + batch_size]
+        try:
+            quotes.update(_download_snapshots(batch))
+        except Exception as e:
+            logger.warning("yfinance batch download failed for %d symbols: %s", len(batch), e)
+
+    missing = [symbol for symbol in symbols if symbol not in quotes]
+    if missing and settings.FINNHUB_API_KEY:
+        quotes.update(async_to_sync(_finnhub_snapshots)(missing))
+    return quotes
+
+
+def _simulated_snapshots(symbols, batch_size):
+    quotes = {}
+    for start in range(0, len(symbols), batch_size):
+        try:
+            quotes.update(simulator.fetch_quotes(symbols[start:start + batch_size]))
+        except SimulatedOutage as e:
+            logger.warning("Simulated batch of %d symbols failed: %s", len(symbols[start:start + batch_size]), e)
+    return quotes
+
+
+def _download_snapshots(symbols):
+    with track_provider_call('yfinance'):
+        data = yf.download(
+            symbols, period='5d', interval='1d', group_by='ticker',
+            auto_adjust=False, threads=True, progress=False,
+        )
+    quotes = {}
+    for symbol in symbols:
+        if isinstance(data.columns, pd.MultiIndex):
+            if symbol not in data.columns.get_level_values(0):
+                continue
+            frame = data[symbol]
+        else:
+            frame = data
+        frame = frame.dropna(subset=['Close'])
+        if frame.empty:
+            continue
+        last = frame.iloc[-1]
+        previous_close = float(frame['Close'].iloc[-2]) if len(frame) > 1 else None
+        price = float(last['Close'])
+        quotes[symbol] = {
+            'symbol': symbol,
+            'price': price,
+            'change': price - previous_close if previous_close is not None else None,
+            'previous_close': previous_close,
+            'volume': int(last['Volume']) if pd.notna(last['Volume']) else None,
+            'high': float(last['High']),
+            'low': float(last['Low']),
+            'source': YFinanceProvider.label,
+        }
+    return quotes
+
+
+async def _finnhub_snapshots(symbols):
+    provider = FinnhubProvider()
+    semaphore = asyncio.Semaphore(settings.MARKET_DATA_HTTP_MAX_PER_HOST)
+
+    async def fetch(symbol):
+        async with semaphore:
+            try:
+                return await provider.get_snapshot(symbol)
+            except ProviderError as e:
+                logger.warning("Finnhub quote failed for %s: %s", symbol, e)
+                return None
+
+    async with provider.client.private_session():
+        snapshots = await asyncio.gather(*[fetch(symbol) for symbol in symbols])
+    return {snapshot['symbol']: snapshot for snapshot in snapshots if snapshot}
+
+
+class GeminiProvider:
+    """Text generation through the Gemini REST API on the shared HTTP pool."""
+    model = 'gemini-pro'
+    base_url = "https://generativelanguage.googleapis.com/v1/models"
+
+    def __init__(self, client=None):
+        self.client = client or http_client
+
+    async def generate(self, prompt, max_tokens=150):
+        await spend_budget('gemini', settings.GEMINI_API_KEY)
+        data = await self.client.post_json(
+            f'{self.base_url}/{self.model}:generateContent',
+            self._body(prompt, max_tokens),
+            params={'key': settings.GEMINI_API_KEY},
+            headers={'Content-Type': 'application/json'},
+        )
+        try:
+            parts = data['candidates'][0]['content']['parts']
+        except (KeyError, IndexError, TypeError) as e:
+            raise ProviderError(f"Unexpected Gemini response: {str(data)[:200]}") from e
+        return ''.join(part.get('text', '') for part in parts)
+
+    async def stream(self, prompt, max_tokens=150):
+        """Yields the generated text in chunks as the model produces them."""
+        await spend_budget('gemini', settings.GEMINI_API_KEY)
+        lines = self.client.stream_lines(
+            'POST', f'{self.base_url}/{self.model}:streamGenerateContent',
+            json=self._body(prompt, max_tokens),
+            params={'key': settings.GEMINI_API_KEY, 'alt': 'sse'},
+            headers={'Content-Type': 'application/json'},
+        )
+        async for line in lines:
+            if not line.startswith('data:'):
+                continue
+            try:
+                event = json.loads(line[len('data:'):])
+                parts = event['candidates'][0]['content']['parts']
+            except (ValueError, KeyError, IndexError) as e:
+                raise ProviderError(f"Unexpected Gemini stream event: {line[:200]}") from e
+            for part in parts:
+                if part.get('text'):
+                    yield part['text']
+
+    @staticmethod
+    def _body(prompt, max_tokens):
+        return {
+            'contents': [{'parts': [{'text': prompt}]}],
+            'generationConfig': {'maxOutputTokens': max_tokens},
+        }
+
+
+PROVIDERS = {
+    provider.name: provider
+    for provider in (FinnhubProvider, AlphaVantageProvider, TwelveDataProvider, YFinanceProvider, SimulatedProvider)
+}
+
+
+class LatencyTracker:
+    """
+    Rolling latency samples and win counts per provider.
+
+    Keeps the most recent ``window`` call latencies (seconds) for each
+    provider; percentiles feed the hedge delay and the histogram is what we
+    look at when tuning it by hand.
+    """
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, window=500):
+        self.window = window
+        self.samples = {}
+        self.wins = {}
+
+    def record(self, provider, seconds):
+        self.samples.setdefault(provider, deque(maxlen=self.window)).append(seconds)
+
+    def record_win(self, provider):
+        self.wins[provider] = self.wins.get(provider, 0) + 1
+
+    def count(self, provider):
+        return len(self.samples.get(provider, ()))
+
+    def percentile(self, provider, pct):
+        samples = sorted(self.samples.get(provider, ()))
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def histogram(self, provider):
+        counts = [0] * (len(self.BUCKETS) + 1)
+        for sample in self.samples.get(provider, ()):
+            counts[bisect.bisect_left(self.BUCKETS, sample)] += 1
+        labels = [str(bucket) for bucket in self.BUCKETS] + ['+Inf']
+        return dict(zip(labels, counts))
+
+    def snapshot(self):
+        return {
+            provider: {
+                'count': self.count(provider),
+                'wins': self.wins.get(provider, 0),
+                'p50': self.percentile(provider, 50),
+                'p95': self.percentile(provider, 95),
+                'p99': self.percentile(provider, 99),
+                'histogram': self.histogram(provider),
+            }
+            for provider in set(self.samples) | set(self.wins)
+        }
+
+
+class ProviderChain:
+    """
+    Ordered fallback over several providers.
+
+    Searches go to each provider in turn until one returns a usable result;
+    provider errors and malformed responses are logged and treated as a
+    miss. Quotes follow
+    ``mode``:
+
+    - ``sequential``: the next provider starts only after the previous one
+      missed.
+    - ``hedged``: the next provider also starts if the current one has not
+      answered within its observed p95 latency (``hedge_delay``).
+    - ``race``: every provider starts at once.
+
+    In the concurrent modes the first usable quote wins and the other
+    requests are cancelled.
+    """
+    MODES = ('sequential', 'hedged', 'race')
+
+    def __init__(self, quote_providers, search_providers, mode='sequential',
+                 hedge_delay=0.3, min_hedge_delay=0.05, max_hedge_delay=2.0,
+                 min_samples=20, latency=None):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown quote mode {mode!r}; expected one of {self.MODES}")
+        self.quote_providers = quote_providers
+        self.search_providers = search_providers
+        self.mode = mode
+        self.default_hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+        self.min_samples = min_samples
+        self.latency = latency or LatencyTracker()
+
+    @classmethod
+    def from_settings(cls, client=None):
+        return cls(
+            [PROVIDERS[name](client) for name in settings.MARKET_DATA_QUOTE_PROVIDERS],
+            [PROVIDERS[name](client) for name in settings.MARKET_DATA_SEARCH_PROVIDERS],
+            mode=settings.MARKET_DATA_QUOTE_MODE,
+            hedge_delay=settings.MARKET_DATA_HEDGE_DELAY_MS / 1000,
+            min_hedge_delay=settings.MARKET_DATA_HEDGE_MIN_DELAY_MS / 1000,
+            max_hedge_delay=settings.MARKET_DATA_HEDGE_MAX_DELAY_MS / 1000,
+        )
+
+    def hedge_delay(self, provider):
+        """Seconds to wait on ``provider`` before starting the next one."""
+        if self.latency.count(provider.name) < self.min_samples:
+            return self.default_hedge_delay
+        p95 = self.latency.percentile(provider.name, 95)
+        return min(self.max_hedge_delay, max(self.min_hedge_delay, p95))
+
+    async def get_price(self, symbol):
+        """Returns ``(price, source label)``; price is None if every provider missed."""
+        if not self.quote_providers:
+            return None, None
+        if self.mode == 'sequential':
+            for provider in self.quote_providers:
+                price = await self._timed_quote(provider, symbol)
+                if price:
+                    self.latency.record_win(provider.name)
+                    return price, provider.label
+        else:
+            price, provider = await self._concurrent_quote(symbol)
+            if price:
+                self.latency.record_win(provider.name)
+                return price, provider.label
+        return None, self.quote_providers[-1].label
+
+    async def _timed_quote(self, provider, symbol):
+        # A cancelled hedge raises out of here and is never recorded as a sample
+        started = time.monotonic()
+        try:
+            price = await provider.get_quote(symbol)
+        except ProviderError as e:
+            logger.warning("%s quote failed for %s: %s", provider.label, symbol, e)
+            price = None
+        except MALFORMED_RESPONSE_ERRORS as e:
+            logger.warning("%s returned a malformed quote for %s: %r", provider.label, symbol, e)
+            price = None
+        self.latency.record(provider.name, time.monotonic() - started)
+        return price
+
+    async def _concurrent_quote(self, symbol):
+        waiting = list(self.quote_providers)
+        pending = {}
+
+        def launch():
+            provider = waiting.pop(0)
+            pending[asyncio.create_task(self._timed_quote(provider, symbol))] = provider
+            return provider
+
+        try:
+            latest = launch()
+            while self.mode == 'race' and waiting:
+                launch()
+
+            while pending:
+                timeout = self.hedge_delay(latest) if waiting else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    latest = launch()
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    price = task.result()
+                    if price:
+                        return price, provider
+                if not pending and waiting:
+                    latest = launch()
+            return None, None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def get_snapshot(self, symbol):
+        """Price-only quote snapshot in the same shape as ``fetch_quote``, or None."""
+        price, source = await self.get_price(symbol)
+        if price is None:
+            return None
+        return {'symbol': symbol, 'price': price, 'source': source}
+
+    async def search_symbol(self, query):
+        """Returns ``(symbol, company)`` for the best match, or ``(None, None)``."""
+        for provider in self.search_providers:
+            try:
+                results = await provider.search(query)
+            except ProviderError as e:
+                logger.warning("%s search failed for %r: %s", provider.label, query, e)
+                continue
+            except MALFORMED_RESPONSE_ERRORS as e:
+                logger.warning("%s returned malformed search results for %r: %r", provider.label, query, e)
+                continue
+            if results:
+                return results[0]
+        return None, None
+
+
+market_data = ProviderChain.from_settings()
+gemini = GeminiProvider()
@@ -0,0 +1,397 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from .loops import LoopLocal
+from .providers import fetch_quote, fetch_quotes_bulk
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = (
+    'l1_hits', 'l2_hits', 'misses', 'stale_served', 'loads', 'coalesced',
+    'lock_waits', 'refreshes', 'refresh_errors',
+)
+
+
+class QuoteCache:
+    """
+    Two-tier quote cache: a bounded in-process LRU in front of the Django
+    cache (django_redis in production).
+
+    Entries carry the time they were fetched and are judged against two TTLs:
+
+    - younger than ``soft_ttl``: fresh, returned as is;
+    - between ``soft_ttl`` and ``hard_ttl``: stale, returned immediately
+      while a single background refresh runs;
+    - older than ``hard_ttl`` (or missing): loaded synchronously.
+
+    Loads are single-flight: concurrent callers in one process share one
+    load, and a short cache lock keeps other processes from loading the same
+    symbol at the same time (they wait briefly for the winner's result).
+
+    ``get`` takes a blocking loader, ``aget`` a coroutine loader; both fill
+    the same tiers.
+    """
+
+    def __init__(self, namespace='quote', loader=fetch_quote, max_entries=None,
+                 soft_ttl=None, hard_ttl=None, lock_ttl=10, refresh_workers=4):
+        self.namespace = namespace
+        self.loader = loader
+        self.max_entries = max_entries or settings.QUOTE_CACHE_MAX_ENTRIES
+        self.soft_ttl = soft_ttl if soft_ttl is not None else settings.QUOTE_CACHE_SOFT_TTL
+        self.hard_ttl = hard_ttl if hard_ttl is not None else settings.QUOTE_CACHE_HARD_TTL
+        self.lock_ttl = lock_ttl
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        # Futures belong to their loop; WSGI and runserver run each async view on its own
+        self._ainflight = LoopLocal(dict)
+        self._refreshing = set()
+        self._tasks = set()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix=f'{namespace}-refresh')
+        self._counters = dict.fromkeys(COUNTERS, 0)
+
+    def key(self, symbol):
+        return f'{self.namespace}:{symbol}'
+
+    def lock_key(self, symbol):
+        return f'{self.namespace}:{symbol}:lock'
+
+    # Blocking API (views via sync_to_async, Celery tasks)
+
+    def get(self, symbol, loader=None):
+        """Returns the cached quote for ``symbol``, loading it when needed (None if unavailable)."""
+        loader = loader or self.loader
+        entry = self._l1_get(symbol)
+        if entry is None or self._age(entry) >= self.soft_ttl:
+            entry = self._resolve(symbol, cache.get(self.key(symbol)))
+        else:
+            self._count('l1_hits')
+
+        if entry is not None:
+            age = self._age(entry)
+            if age < self.hard_ttl:
+                if age >= self.soft_ttl:
+                    self._count('stale_served')
+                    self._refresh_in_background(symbol, loader)
+                return entry['data']
+
+        self._count('misses')
+        return self._load(symbol, loader)
+
+    def get_many(self, symbols, max_age=None):
+        """
+        Returns ``{symbol: quote}`` for the symbols cached in either tier and
+        younger than ``max_age`` (default: the hard TTL). Never loads.
+        """
+        max_age = max_age if max_age is not None else self.hard_ttl
+        quotes = {}
+        missing = []
+        for symbol in dict.fromkeys(symbols):
+            entry = self._l1_get(symbol)
+            if entry is not None and self._age(entry) < max_age:
+                self._count('l1_hits')
+                quotes[symbol] = entry['data']
+            else:
+                missing.append(symbol)
+
+        if missing:
+            found = cache.get_many([self.key(symbol) for symbol in missing])
+            for symbol in missing:
+                entry = found.get(self.key(symbol))
+                if entry is not None and self._age(entry) < max_age:
+                    self._l1_put(symbol, entry)
+                    self._count('l2_hits')
+                    quotes[symbol] = entry['data']
+        return quotes
+
+    def get_or_load_many(self, symbols, bulk_loader=fetch_quotes_bulk):
+        """
+        Returns ``{symbol: quote}`` for ``symbols``, loading every symbol that
+        is not fresh in either tier with one ``bulk_loader`` call.
+        """
+        quotes = self.get_many(symbols, max_age=self.soft_ttl)
+        missing = [symbol for symbol in dict.fromkeys(symbols) if symbol not in quotes]
+        if missing:
+            for _ in missing:
+                self._count('misses')
+            loaded = bulk_loader(missing)
+            self._count('loads')
+            if loaded:
+                self.set_many(loaded)
+                quotes.update(loaded)
+        return quotes
+
+    def peek(self, symbol):
+        """Returns the cached quote without ever loading it."""
+        entry = self._l1_get(symbol)
+        if entry is None or self._age(entry) >= self.soft_ttl:
+            entry = self._resolve(symbol, cache.get(self.key(symbol)), count=False)
+        if entry is not None and self._age(entry) < self.hard_ttl:
+            return entry['data']
+        return None
+
+    def set(self, symbol, data):
+        entry = self._entry(data)
+        self._l1_put(symbol, entry)
+        cache.set(self.key(symbol), entry, self.hard_ttl)
+
+    def set_many(self, quotes):
+        entries = {symbol: self._entry(data) for symbol, data in quotes.items()}
+        for symbol, entry in entries.items():
+            self._l1_put(symbol, entry)
+        cache.set_many({self.key(symbol): entry for symbol, entry in entries.items()}, self.hard_ttl)
+
+    # Async API (consumers, the quote hub, async views)
+
+    async def aget(self, symbol, loader):
+        """Async variant of ``get``; ``loader`` is a coroutine function."""
+        entry = self._l1_get(symbol)
+        if entry is None or self._age(entry) >= self.soft_ttl:
+            entry = self._resolve(symbol, await cache.aget(self.key(symbol)))
+        else:
+            self._count('l1_hits')
+
+        if entry is not None:
+            age = self._age(entry)
+            if age < self.hard_ttl:
+                if age >= self.soft_ttl:
+                    self._count('stale_served')
+                    self._arefresh_in_background(symbol, loader)
+                return entry['data']
+
+        self._count('misses')
+        return await self._aload(symbol, loader)
+
+    async def apeek(self, symbol):
+        entry = self._l1_get(symbol)
+        if entry is None:
+            entry = await cache.aget(self.key(symbol))
+            if entry is not None:
+                self._l1_put(symbol, entry)
+        if entry is not None and self._age(entry) < self.hard_ttl:
+            return entry['data']
+        return None
+
+    async def aset(self, symbol, data):
+        entry = self._entry(data)
+        self._l1_put(symbol, entry)
+        await cache.aset(self.key(symbol), entry, self.hard_ttl)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats['entries'] = len(self._lru)
+        lookups = stats['l1_hits'] + stats['l2_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['l1_hits'] + stats['l2_hits']) / lookups if lookups else None
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._lru.clear()
+
+    # Internals
+
+    def _entry(self, data):
+        return {'data': data, 'fetched_at': time.time()}
+
+    def _age(self, entry):
+        return time.time() - entry['fetched_at']
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def _l1_get(self, symbol):
+        with self._lock:
+            entry = self._lru.get(symbol)
+            if entry is not None:
+                self._lru.move_to_end(symbol)
+            return entry
+
+    def _l1_put(self, symbol, entry):
+        with self._lock:
+            self._lru[symbol] = entry
+            self._lru.move_to_end(symbol)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+
+    def _resolve(self, symbol, shared, count=True):
+        """Picks the fresher of the local and shared entries, promoting the shared one."""
+        local = self._l1_get(symbol)
+        if local is not None and self._age(local) < self.soft_ttl:
+            if count:
+                self._count('l1_hits')
+            return local
+        if shared is not None and (local is None or shared['fetched_at'] > local['fetched_at']):
+            self._l1_put(symbol, shared)
+            if count and self._age(shared) < self.soft_ttl:
+                self._count('l2_hits')
+            return shared
+        return local
+
+    def _load(self, symbol, loader):
+        with self._lock:
+            event = self._inflight.get(symbol)
+            leader = event is None
+            if leader:
+                event = self._inflight[symbol] = threading.Event()
+
+        if not leader:
+            self._count('coalesced')
+            event.wait(self.lock_ttl)
+            entry = self._l1_get(symbol)
+            return entry['data'] if entry else None
+
+        try:
+            acquired = cache.add(self.lock_key(symbol), 1, self.lock_ttl)
+            if not acquired:
+                shared = self._wait_for_shared(symbol)
+                if shared is not None:
+                    return shared['data']
+            try:
+                data = loader(symbol)
+                self._count('loads')
+                if data is not None:
+                    self.set(symbol, data)
+                return data
+            finally:
+                if acquired:
+                    cache.delete(self.lock_key(symbol))
+        finally:
+            with self._lock:
+                self._inflight.pop(symbol, None)
+            event.set()
+
+    def _wait_for_shared(self, symbol):
+        # Another process holds the load lock; give it a moment to publish
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            # Read before the entry: the holder publishes, then unlocks
+            released = cache.get(self.lock_key(symbol)) is None
+            entry = cache.get(self.key(symbol))
+            if entry is not None and self._age(entry) < self.soft_ttl:
+                self._l1_put(symbol, entry)
+                self._count('lock_waits')
+                return entry
+            if released:
+                # Done without publishing (unknown symbol or a failed load)
+                return None
+        return None
+
+    async def _aload(self, symbol, loader):
+        inflight = self._ainflight.get()
+        future = inflight.get(symbol)
+        if future is not None:
+            self._count('coalesced')
+            return await asyncio.shield(future)
+
+        future = inflight[symbol] = asyncio.get_running_loop().create_future()
+        try:
+            acquired = await cache.aadd(self.lock_key(symbol), 1, self.lock_ttl)
+            data = None
+            if not acquired:
+                data = await self._await_shared(symbol)
+            if data is None:
+                try:
+                    data = await loader(symbol)
+                    self._count('loads')
+                    if data is not None:
+                        await self.aset(symbol, data)
+                finally:
+                    if acquired:
+                        await cache.adelete(self.lock_key(symbol))
+            future.set_result(data)
+            return data
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; don't warn about an unretrieved exception
+            future.exception()
+            raise
+        finally:
+            inflight.pop(symbol, None)
+
+    async def _await_shared(self, symbol):
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            released = await cache.aget(self.lock_key(symbol)) is None
+            entry = await cache.aget(self.key(symbol))
+            if entry is not None and self._age(entry) < self.soft_ttl:
+                self._l1_put(symbol, entry)
+                self._count('lock_waits')
+                return entry['data']
+            if released:
+                return None
+        return None
+
+    def _claim_refresh(self, symbol):
+        with self._lock:
+            if symbol in self._refreshing:
+                return False
+            self._refreshing.add(symbol)
+            return True
+
+    def _release_refresh(self, symbol):
+        with self._lock:
+            self._refreshing.discard(symbol)
+
+    def _refresh_in_background(self, symbol, loader):
+        if self._claim_refresh(symbol):
+            self._executor.submit(self._background_refresh, symbol, loader)
+
+    def _background_refresh(self, symbol, loader):
+        acquired = False
+        try:
+            acquired = cache.add(self.lock_key(symbol), 1, self.lock_ttl)
+            if acquired:
+                data = loader(symbol)
+                if data is not None:
+                    self.set(symbol, data)
+                self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            logger.warning("Background refresh of %s failed: %s", self.key(symbol), e)
+        finally:
+            if acquired:
+                cache.delete(self.lock_key(symbol))
+            self._release_refresh(symbol)
+            close_old_connections()
+
+    def _arefresh_in_background(self, symbol, loader):
+        if self._claim_refresh(symbol):
+            task = asyncio.create_task(self._abackground_refresh(symbol, loader))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _abackground_refresh(self, symbol, loader):
+        acquired = False
+        try:
+            acquired = await cache.aadd(self.lock_key(symbol), 1, self.lock_ttl)
+            if acquired:
+                data = await loader(symbol)
+                if data is not None:
+                    await self.aset(symbol, data)
+                self._count('refreshes')
+        except Exception as e:
+            self._count('refresh_errors')
+            logger.warning("Background refresh of %s failed: %s", self.key(symbol), e)
+        finally:
+            if acquired:
+                await cache.adelete(self.lock_key(symbol))
+            self._release_refresh(symbol)
+
+
+# Shared quote snapshots (see providers.fetch_quote for the shape)
+quote_cache = QuoteCache()
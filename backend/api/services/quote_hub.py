@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.cache import cache
+
+from .alert_engine import alert_engine
+from .providers import fetch_quote
+from .quote_cache import quote_cache
+from .rate_budget import background
+
+logger = logging.getLogger(__name__)
+
+WATCHED_KEY = 'quote_hub_watched'
+# Set by the ingest_prices worker while it is publishing every watched symbol
+INGEST_HEARTBEAT_KEY = 'market_ingest_heartbeat'
+
+
+def stock_group_name(symbol):
+    """Channel layer group that every socket watching ``symbol`` joins."""
+    return f"stock_group_{symbol}"
+
+
+def watched_symbols():
+    """Symbols some socket in any worker has subscribed to recently."""
+    now = time.time()
+    return [symbol for symbol, expires in (cache.get(WATCHED_KEY) or {}).items() if expires > now]
+
+
+async def amark_watched(symbol, ttl):
+    # Read-modify-write without a lock: a concurrent write can drop a symbol
+    # until its poller marks it again, which only delays ingest picking it up
+    now = time.time()
+    watched = {
+        watched_symbol: expires
+        for watched_symbol, expires in (await cache.aget(WATCHED_KEY) or {}).items()
+        if expires > now
+    }
+    watched[symbol] = now + ttl
+    await cache.aset(WATCHED_KEY, watched, None)
+
+
+class QuoteHub:
+    """
+    Shares one quote poller per symbol between all StockConsumer sockets.
+
+    Sockets reference-count a symbol through subscribe/unsubscribe; the first
+    subscriber starts the poller and the last one to leave stops it. Each
+    poll is published once to ``stock_group_<symbol>`` with group_send, so
+    the channel layer does the fan-out to every socket in the group,
+    written to the quote cache for everything else that needs the price and
+    run through the alert engine.
+
+    Across workers the pollers coordinate through a short cache lease: only
+    the lease holder talks to the upstream provider, the others keep their
+    poller idle and take over if the holder stops renewing it. Subscribed
+    symbols are registered in the cache so the ingest worker picks them up;
+    while it runs, pollers stop fetching and the ingest publishes instead.
+    """
+
+    def __init__(self, fetcher=fetch_quote, interval=None, channel_layer=None):
+        self.fetcher = fetcher
+        self.interval = interval or settings.QUOTE_HUB_POLL_INTERVAL
+        self.lease_ttl = self.interval * 3
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._channel_layer = channel_layer
+        self._subscribers = {}
+        self._pollers = {}
+        self.stats = {'polls': 0, 'publishes': 0, 'errors': 0, 'lease_skips': 0, 'ingest_skips': 0}
+
+    @property
+    def channel_layer(self):
+        if self._channel_layer is None:
+            self._channel_layer = get_channel_layer()
+        return self._channel_layer
+
+    async def subscribe(self, symbol):
+        """Register a socket for ``symbol`` and start its poller if needed."""
+        count = self._subscribers.get(symbol, 0) + 1
+        self._subscribers[symbol] = count
+        if symbol not in self._pollers:
+            # The task copies the context: polls give way to interactive
+            # requests for provider budget
+            with background():
+                self._pollers[symbol] = asyncio.create_task(self._poll(symbol))
+        return count
+
+    async def unsubscribe(self, symbol):
+        """Drop a socket for ``symbol``; stops the poller with the last one."""
+        count = self._subscribers.get(symbol, 0) - 1
+        if count > 0:
+            self._subscribers[symbol] = count
+            return count
+
+        self._subscribers.pop(symbol, None)
+        poller = self._pollers.pop(symbol, None)
+        if poller:
+            poller.cancel()
+        await self._release_lease(symbol)
+        return 0
+
+    def subscriber_count(self, symbol):
+        return self._subscribers.get(symbol, 0)
+
+    def metrics(self):
+        """Subscriber and poller counts for this worker."""
+        return {
+            'worker': self.worker_id,
+            'symbols': len(self._subscribers),
+            'subscribers': sum(self._subscribers.values()),
+            'pollers': len(self._pollers),
+            'per_symbol': dict(self._subscribers),
+            **self.stats,
+        }
+
+    async def _poll(self, symbol):
+        group = stock_group_name(symbol)
+        marked_at = 0
+        while True:
+            # Cache or channel layer errors skip this round; the poller must
+            # outlive them, or the symbol's sockets stop getting quotes
+            try:
+                marked_at = await self._poll_once(symbol, group, marked_at)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning("Quote poller for %s failed, retrying: %s", symbol, e)
+            await asyncio.sleep(self.interval)
+
+    async def _poll_once(self, symbol, group, marked_at):
+        """One poll round; returns when ``symbol`` was last marked watched."""
+        now = time.monotonic()
+        if now - marked_at >= self.lease_ttl:
+            await amark_watched(symbol, self.lease_ttl * 2)
+            marked_at = now
+
+        if await cache.aget(INGEST_HEARTBEAT_KEY):
+            # The ingest worker publishes this symbol's ticks to the group
+            self.stats['ingest_skips'] += 1
+        elif await self._acquire_lease(symbol):
+            try:
+                data = await sync_to_async(self.fetcher, thread_sensitive=False)(symbol)
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.warning("Quote poll failed for %s: %s", symbol, e)
+                await self.channel_layer.group_send(group, {
+                    'type': 'stock_error',
+                    'symbol': symbol,
+                    'message': str(e),
+                })
+            else:
+                self.stats['polls'] += 1
+                await quote_cache.aset(symbol, data)
+                await self.channel_layer.group_send(group, {
+                    'type': 'stock_update',
+                    'data': data,
+                })
+                self.stats['publishes'] += 1
+                await self._check_alerts(data)
+        else:
+            self.stats['lease_skips'] += 1
+        return marked_at
+
+    async def _check_alerts(self, data):
+        try:
+            await sync_to_async(alert_engine.process)([data])
+        except Exception as e:
+            logger.warning("Alert check failed for %s: %s", data.get('symbol'), e)
+
+    def _lease_key(self, symbol):
+        return f'quote_hub_lease_{symbol}'
+
+    async def _acquire_lease(self, symbol):
+        key = self._lease_key(symbol)
+        if await cache.aadd(key, self.worker_id, self.lease_ttl):
+            return True
+        if await cache.aget(key) == self.worker_id:
+            await cache.aset(key, self.worker_id, self.lease_ttl)
+            return True
+        return False
+
+    async def _release_lease(self, symbol):
+        key = self._lease_key(symbol)
+        if await cache.aget(key) == self.worker_id:
+            await cache.adelete(key)
+
+
+# Shared by every consumer running in this process
+quote_hub = QuoteHub()
@@ -0,0 +1,270 @@
+"""
+Outbound call budgets for rate-limited providers.
+
+Each provider (and API key) gets one token bucket shared by every web,
+Celery, ingest and websocket worker: in Redis when the default cache is
+django_redis, in process memory otherwise. Every call to the provider
+takes a token first, so the quota is spent deliberately instead of being
+discovered through 429s.
+
+Callers are either ``interactive`` (the default: someone is waiting on the
+answer) or ``background`` (pollers, ingest, Celery). Background callers
+must leave a reserve in the bucket, and stand down entirely while an
+interactive caller is short of a token, so user requests preempt
+refreshes.
+"""
+import asyncio
+import contextvars
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# An interactive caller short of a token holds background callers off for
+# this many times its wait, long enough for it to come back and take it
+DEMAND_HOLD = 2
+
+# KEYS: bucket, interactive demand marker
+# ARGV: capacity, refill per second, tokens the caller must leave behind,
+#       1 for interactive callers
+# Returns {granted, tokens left, seconds to wait} (numbers as strings, Lua
+# would truncate them to integers)
+TAKE_SCRIPT = """
+local DEMAND_HOLD = %(hold)s
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local reserve = tonumber(ARGV[3])
+local interactive = ARGV[4] == '1'
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or capacity
+local at = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - at) * rate)
+local wait = 0
+local demand = interactive and 0 or redis.call('PTTL', KEYS[2])
+if demand > 0 then
+    wait = demand / 1000
+elseif tokens - 1 >= reserve then
+    tokens = tokens - 1
+else
+    wait = (reserve + 1 - tokens) / rate
+    if interactive then
+        redis.call('SET', KEYS[2], '1', 'PX', math.max(1, math.ceil(wait * DEMAND_HOLD * 1000)))
+    end
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {wait == 0 and 1 or 0, tostring(tokens), tostring(wait)}
+""" % {'hold': DEMAND_HOLD}
+
+budget_requests = metrics.registry.register(metrics.Counter(
+    'provider_budget_requests', 'Provider call budget requests by outcome.', ('provider', 'priority', 'outcome'),
+))
+budget_wait = metrics.registry.register(metrics.Histogram(
+    'provider_budget_wait_seconds', 'Time callers waited for a provider call token.', ('provider', 'priority'),
+))
+budget_utilization = metrics.registry.register(metrics.Gauge(
+    'provider_budget_utilization', 'Share of the provider call budget in use (1 = empty bucket).', ('provider',),
+))
+
+
+class BudgetExhausted(Exception):
+    """Raised when no provider call token became available within the caller's wait limit."""
+
+
+def redis_script(source):
+    """``source`` registered on the default cache's Redis, or None when the cache is not Redis."""
+    if not settings.CACHES['default']['BACKEND'].startswith('django_redis'):
+        return None
+    from django_redis import get_redis_connection
+    return get_redis_connection('default').register_script(source)
+
+
+def parse_rate(rate):
+    """``'5/minute'`` -> ``(5, 60)`` (requests, period in seconds)."""
+    count, period = rate.split('/')
+    return int(count), PERIODS[period.strip()[0].lower()]
+
+
+_priority = contextvars.ContextVar('provider_budget_priority', default=INTERACTIVE)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def set_priority(value):
+    """Sets the current priority; returns a token for ``reset_priority``."""
+    if value not in PRIORITIES:
+        raise ValueError(f"Unknown priority {value!r}; expected one of {PRIORITIES}")
+    return _priority.set(value)
+
+
+def reset_priority(token):
+    _priority.reset(token)
+
+
+@contextmanager
+def priority(value):
+    """Runs provider calls made inside the block (and its threads/tasks) at ``value``."""
+    token = set_priority(value)
+    try:
+        yield
+    finally:
+        reset_priority(token)
+
+
+def background():
+    return priority(BACKGROUND)
+
+
+class CallBudget:
+    """Per-provider token buckets; ``limits`` maps provider name -> ``'N/period'``."""
+
+    def __init__(self, limits=None, reserve=None, max_wait=None, key_prefix='provider_budget'):
+        limits = settings.PROVIDER_RATE_LIMITS if limits is None else limits
+        self.limits = {provider: parse_rate(rate) for provider, rate in limits.items() if rate}
+        self.reserve = settings.PROVIDER_BUDGET_BACKGROUND_RESERVE if reserve is None else reserve
+        self.max_wait = {**settings.PROVIDER_BUDGET_MAX_WAIT, **(max_wait or {})}
+        self.key_prefix = key_prefix
+        self.stats = {}
+        self._buckets = {}
+        self._demand = {}
+        self._lock = threading.Lock()
+        self._script = None
+
+    # Buckets
+
+    def limited(self, provider):
+        return provider in self.limits
+
+    def bucket_key(self, provider, api_key=''):
+        # Keys are hashed so they never show up in Redis
+        owner = hashlib.sha1(api_key.encode()).hexdigest()[:12] if api_key else 'default'
+        return f'{self.key_prefix}:{provider}:{owner}'
+
+    def _redis_script(self):
+        if self._script is None:
+            self._script = redis_script(TAKE_SCRIPT) or False
+        return self._script
+
+    def _take(self, provider, key, priority):
+        """One attempt at a token: ``(granted, tokens left, seconds to wait)``."""
+        requests, period = self.limits[provider]
+        capacity, rate = float(requests), requests / period
+        # A bucket too small to split still lets background callers drain it
+        reserve = self.reserve * capacity if priority == BACKGROUND and capacity > 1 else 0.0
+        interactive = priority == INTERACTIVE
+
+        script = self._redis_script()
+        if script:
+            try:
+                granted, tokens, wait = script(
+                    keys=[key, f'{key}:demand'], args=[capacity, rate, reserve, int(interactive)],
+                )
+                return bool(granted), float(tokens), float(wait)
+            except Exception as e:
+                # Fail open: a Redis outage should not take the providers down with it
+                logger.warning("Provider budget unavailable for %s, allowing the call: %s", provider, e)
+                return True, capacity, 0.0
+
+        with self._lock:
+            now = time.monotonic()
+            tokens, at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - at) * rate)
+            demand = 0.0 if interactive else self._demand.get(key, 0.0) - now
+            wait = 0.0
+            if demand > 0:
+                wait = demand
+            elif tokens - 1 >= reserve:
+                tokens -= 1
+            else:
+                wait = (reserve + 1 - tokens) / rate
+                if interactive:
+                    self._demand[key] = now + wait * DEMAND_HOLD
+            self._buckets[key] = (tokens, now)
+        return wait == 0, tokens, wait
+
+    # Acquiring
+
+    def _settle(self, provider, priority, outcome, tokens, waited):
+        requests, _ = self.limits[provider]
+        counts = self.stats.setdefault(provider, {'granted': 0, 'denied': 0, 'tokens': float(requests)})
+        counts[outcome] += 1
+        counts['tokens'] = round(tokens, 3)
+        budget_requests.inc(provider=provider, priority=priority, outcome=outcome)
+        budget_wait.observe(waited, provider=provider, priority=priority)
+        budget_utilization.set(round(1 - tokens / requests, 3), provider=provider)
+
+    def _deadline(self, priority, max_wait):
+        return time.monotonic() + (self.max_wait[priority] if max_wait is None else max_wait)
+
+    def acquire(self, provider, api_key='', priority=None, max_wait=None):
+        """
+        Takes a call token for ``provider``, sleeping up to ``max_wait``
+        seconds (per-priority default) for one. Raises BudgetExhausted.
+        """
+        if not self.limited(provider):
+            return
+        priority = priority or current_priority()
+        key = self.bucket_key(provider, api_key)
+        started = time.monotonic()
+        deadline = self._deadline(priority, max_wait)
+        while True:
+            granted, tokens, wait = self._take(provider, key, priority)
+            if granted:
+                self._settle(provider, priority, 'granted', tokens, time.monotonic() - started)
+                return
+            if time.monotonic() + wait > deadline:
+                self._settle(provider, priority, 'denied', tokens, time.monotonic() - started)
+                raise BudgetExhausted(f"{provider} call budget exhausted ({priority})")
+            time.sleep(wait)
+
+    async def aacquire(self, provider, api_key='', priority=None, max_wait=None):
+        """Async ``acquire``; Redis round trips run off the event loop."""
+        if not self.limited(provider):
+            return
+        priority = priority or current_priority()
+        key = self.bucket_key(provider, api_key)
+        started = time.monotonic()
+        deadline = self._deadline(priority, max_wait)
+        while True:
+            if self._redis_script():
+                granted, tokens, wait = await sync_to_async(self._take, thread_sensitive=False)(provider, key, priority)
+            else:
+                granted, tokens, wait = self._take(provider, key, priority)
+            if granted:
+                self._settle(provider, priority, 'granted', tokens, time.monotonic() - started)
+                return
+            if time.monotonic() + wait > deadline:
+                self._settle(provider, priority, 'denied', tokens, time.monotonic() - started)
+                raise BudgetExhausted(f"{provider} call budget exhausted ({priority})")
+            await asyncio.sleep(wait)
+
+    def snapshot(self):
+        """Limits and this worker's grant/deny counts per provider."""
+        return {
+            provider: {
+                'limit': f'{requests}/{period}s',
+                **self.stats.get(provider, {'granted': 0, 'denied': 0, 'tokens': float(requests)}),
+            }
+            for provider, (requests, period) in self.limits.items()
+        }
+
+
+call_budget = CallBudget()
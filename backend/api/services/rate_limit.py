@@ -0,0 +1,142 @@
+"""
+Request rate limiting with GCRA (the generic cell rate algorithm).
+
+A client's whole state is one number, its theoretical arrival time (TAT):
+with ``limit`` requests per ``period`` every request pushes the TAT
+``period / limit`` further out, and a request is allowed while the TAT is
+less than a period ahead of now. This is a sliding window without a log of
+timestamps, so a check is one Redis call running one Lua script
+(``check``) instead of DRF's get/compute/set round trips.
+
+Denials also carry the exact time until the next request can succeed, and
+since no other worker can bring that time forward, each worker remembers
+it and rejects the client locally until then without asking Redis.
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+
+from . import metrics
+from .rate_budget import parse_rate, redis_script
+
+logger = logging.getLogger(__name__)
+
+# KEYS: client key
+# ARGV: emission interval (ms), burst tolerance (ms)
+# Returns {allowed, ms until allowed} (as a string, Lua would truncate it)
+GCRA_SCRIPT = """
+local interval = tonumber(ARGV[1])
+local tolerance = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) * 1000 + tonumber(clock[2]) / 1000
+local tat = math.max(tonumber(redis.call('GET', KEYS[1])) or now, now)
+local allow_at = tat - tolerance
+if now < allow_at then
+    return {0, tostring(allow_at - now)}
+end
+tat = tat + interval
+redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil(tat - now))
+return {1, '0'}
+"""
+
+Decision = namedtuple('Decision', ['allowed', 'retry_after'])
+ALLOWED = Decision(True, 0.0)
+
+rate_limit_decisions = metrics.registry.register(metrics.Counter(
+    'rate_limit_decisions', 'Rate limit checks by outcome and where they were decided.', ('outcome', 'source'),
+))
+
+
+class RateLimiter:
+    """GCRA limiter over the default cache's Redis, or process memory without one."""
+
+    def __init__(self, key_prefix='rate_limit', max_blocked=10000):
+        self.key_prefix = key_prefix
+        self.max_blocked = max_blocked
+        self._script = None
+        self._blocked = {}
+        self._tats = {}
+        self._lock = threading.Lock()
+
+    def _redis_script(self):
+        if self._script is None:
+            self._script = redis_script(GCRA_SCRIPT) or False
+        return self._script
+
+    def check(self, key, limit, period):
+        """Counts a request for ``key`` against ``limit`` per ``period`` seconds."""
+        now = time.monotonic()
+        blocked_until = self._blocked.get(key)
+        if blocked_until is not None:
+            if now < blocked_until:
+                rate_limit_decisions.inc(outcome='denied', source='fast')
+                return Decision(False, blocked_until - now)
+            self._blocked.pop(key, None)
+
+        interval = period / limit
+        tolerance = period - interval
+        script = self._redis_script()
+        if script:
+            try:
+                allowed, retry_ms = script(
+                    keys=[f'{self.key_prefix}:{key}'], args=[interval * 1000, tolerance * 1000],
+                )
+            except Exception as e:
+                # Fail open: a Redis outage should not turn into an outage of the API
+                logger.warning("Rate limiter unavailable, allowing the request: %s", e)
+                return ALLOWED
+            decision = Decision(bool(allowed), float(retry_ms) / 1000)
+            source = 'redis'
+        else:
+            decision = self._check_local(key, interval, tolerance, now)
+            source = 'local'
+
+        if decision.allowed:
+            rate_limit_decisions.inc(outcome='allowed', source=source)
+            return ALLOWED
+        rate_limit_decisions.inc(outcome='denied', source=source)
+        self._block(key, now + decision.retry_after)
+        return decision
+
+    def check_rate(self, key, rate):
+        """``check`` with a ``'N/period'`` rate string."""
+        return self.check(key, *parse_rate(rate))
+
+    async def acheck_rate(self, key, rate):
+        """``check_rate`` for async views; the Redis round trip runs off the event loop."""
+        if self._redis_script():
+            return await sync_to_async(self.check_rate, thread_sensitive=False)(key, rate)
+        return self.check_rate(key, rate)
+
+    def _check_local(self, key, interval, tolerance, now):
+        with self._lock:
+            tat = max(self._tats.get(key, now), now)
+            if now < tat - tolerance:
+                return Decision(False, tat - tolerance - now)
+            self._tats[key] = tat + interval
+            if len(self._tats) > self.max_blocked:
+                self._tats = {k: v for k, v in self._tats.items() if v > now}
+        return ALLOWED
+
+    def _block(self, key, until):
+        if len(self._blocked) >= self.max_blocked:
+            now = time.monotonic()
+            self._blocked = {k: v for k, v in self._blocked.items() if v > now}
+            if len(self._blocked) >= self.max_blocked:
+                self._blocked.clear()
+        self._blocked[key] = until
+
+    def reset(self, key=None):
+        """Forgets local state for ``key`` (or everything); Redis keys expire on their own."""
+        if key is None:
+            self._blocked.clear()
+            self._tats.clear()
+        else:
+            self._blocked.pop(key, None)
+            self._tats.pop(key, None)
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import math
+import random
+import time
+from functools import lru_cache
+from datetime import datetime, timezone as dt_timezone
+from statistics import NormalDist
+
+from django.conf import settings
+
+from .metrics import track_provider_call
+
+EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc).timestamp()
+DAY = 86400
+# Daily levels follow a Brownian bridge pinned to the base price every
+# 2**DAY_LEVELS days, which keeps simulated prices within a realistic band
+DAY_LEVELS = 12
+# Each day's path is cached at 2**COARSE_LEVELS nodes; prices in between
+# are refined from the two surrounding nodes
+COARSE_LEVELS = 6
+PATH_CACHE_SIZE = 50000
+
+UNIVERSE = [
+    ('AAPL', 'Apple Inc'), ('MSFT', 'Microsoft Corporation'), ('GOOGL', 'Alphabet Inc Class A'),
+    ('AMZN', 'Amazon.com Inc'), ('META', 'Meta Platforms Inc'), ('NVDA', 'NVIDIA Corporation'),
+    ('TSLA', 'Tesla Inc'), ('JPM', 'JPMorgan Chase & Co'), ('V', 'Visa Inc'),
+    ('JNJ', 'Johnson & Johnson'), ('WMT', 'Walmart Inc'), ('PG', 'Procter & Gamble Co'),
+    ('XOM', 'Exxon Mobil Corporation'), ('KO', 'Coca-Cola Co'), ('DIS', 'Walt Disney Co'),
+    ('NFLX', 'Netflix Inc'), ('INTC', 'Intel Corporation'), ('AMD', 'Advanced Micro Devices Inc'),
+    ('ORCL', 'Oracle Corporation'), ('IBM', 'International Business Machines Corp'),
+    ('RELIANCE.NS', 'Reliance Industries Ltd'), ('TCS.NS', 'Tata Consultancy Services Ltd'),
+    ('INFY.NS', 'Infosys Ltd'), ('HDFCBANK.NS', 'HDFC Bank Ltd'),
+]
+
+_normal = NormalDist()
+
+
+class SimulatedOutage(Exception):
+    """Injected provider failure."""
+
+
+class MarketSimulator:
+    """
+    Deterministic offline market data.
+
+    Log prices follow a Brownian motion evaluated by midpoint displacement:
+    day-level closes come from a bridge over 2**DAY_LEVELS days and each
+    day is a bridge between its open (the previous close) and its close,
+    resolved down to ``tick_seconds``. Every displacement is a hash of
+    (seed, symbol, node), so any process computes the same price for the
+    same instant in O(log n); only each day's coarse nodes are cached.
+
+    ``latency_ms``/``jitter_ms`` delay every call and ``error_rate`` makes
+    that fraction of calls raise SimulatedOutage, to exercise the timeout,
+    hedging and fallback paths.
+    """
+
+    def __init__(self, seed=None, volatility=None, tick_seconds=None, latency_ms=None,
+                 jitter_ms=None, error_rate=None, universe_size=None):
+        self.seed = settings.MARKET_SIMULATOR_SEED if seed is None else seed
+        self.volatility = volatility or settings.MARKET_SIMULATOR_VOLATILITY
+        tick_seconds = tick_seconds or settings.MARKET_SIMULATOR_TICK_SECONDS
+        self.intraday_levels = max(1, math.ceil(math.log2(DAY / tick_seconds)))
+        self.latency_ms = settings.MARKET_SIMULATOR_LATENCY_MS if latency_ms is None else latency_ms
+        self.jitter_ms = settings.MARKET_SIMULATOR_JITTER_MS if jitter_ms is None else jitter_ms
+        self.error_rate = settings.MARKET_SIMULATOR_ERROR_RATE if error_rate is None else error_rate
+        universe_size = universe_size or settings.MARKET_SIMULATOR_SYMBOLS
+        self.universe = UNIVERSE + [
+            (f'SIM{i:04d}', f'Simulated Holdings {i:04d} Inc')
+            for i in range(max(0, universe_size - len(UNIVERSE)))
+        ]
+        self._random = random.Random(self.seed)
+        self._paths = lru_cache(maxsize=PATH_CACHE_SIZE)(self._day_path)
+        self.stats = {'calls': 0, 'errors': 0}
+
+    # Deterministic prices
+
+    def _uniform(self, *key):
+        digest = hashlib.blake2b(repr((self.seed, *key)).encode(), digest_size=8).digest()
+        return (int.from_bytes(digest, 'big') + 0.5) / 2 ** 64
+
+    def _gaussian(self, *key):
+        return _normal.inv_cdf(self._uniform(*key))
+
+    def base_price(self, symbol):
+        """Log-uniform between 5 and 800."""
+        return math.exp(math.log(5) + self._uniform(symbol, 'base') * math.log(160))
+
+    def _bridge(self, key, levels, target, start_value, end_value, scale):
+        """Value at integer position ``target`` of a bridge over [0, 2**levels]."""
+        low, high = 0, 2 ** levels
+        low_value, high_value = start_value, end_value
+        while high - low > 1:
+            mid = (low + high) // 2
+            mid_value = (low_value + high_value) / 2 + scale * math.sqrt(high - low) / 2 * self._gaussian(key, low, high)
+            if target == mid:
+                return mid_value
+            if target < mid:
+                high, high_value = mid, mid_value
+            else:
+                low, low_value = mid, mid_value
+        return low_value if target == low else high_value
+
+    def _day_level(self, symbol, day):
+        """Log offset from the base price at the close of ``day - 1`` (= open of ``day``)."""
+        span = 2 ** DAY_LEVELS
+        return self._bridge((symbol, 'day'), DAY_LEVELS, day % span, 0.0, 0.0, self.volatility)
+
+    def _day_path(self, symbol, day):
+        """Log levels at the 2**COARSE_LEVELS + 1 coarse nodes of ``day``."""
+        key = (symbol, 'intraday', day)
+        scale = self.volatility / math.sqrt(2 ** self.intraday_levels)
+        stride = 2 ** (self.intraday_levels - COARSE_LEVELS)
+        nodes = 2 ** COARSE_LEVELS
+        path = [0.0] * (nodes + 1)
+        path[0] = self._day_level(symbol, day)
+        path[nodes] = self._day_level(symbol, day + 1)
+        # Same displacements as _bridge, filled breadth-first
+        width = nodes
+        while width > 1:
+            for low in range(0, nodes, width):
+                high = low + width
+                path[low + width // 2] = (path[low] + path[high]) / 2 + scale * math.sqrt(width * stride) / 2 * \
+                    self._gaussian(key, low * stride, high * stride)
+            width //= 2
+        return path
+
+    def _locate(self, moment):
+        seconds = moment - EPOCH
+        day = int(seconds // DAY)
+        step = int((seconds - day * DAY) / DAY * 2 ** self.intraday_levels)
+        return day, step
+
+    def _log_price(self, symbol, moment):
+        day, step = self._locate(moment)
+        path = self._paths(symbol, day)
+        fine_levels = self.intraday_levels - COARSE_LEVELS
+        node, offset = divmod(step, 2 ** fine_levels)
+        if not offset:
+            return path[node]
+        scale = self.volatility / math.sqrt(2 ** self.intraday_levels)
+        return self._bridge((symbol, 'intraday', day, node), fine_levels, offset,
+                            path[node], path[node + 1], scale)
+
+    def price(self, symbol, moment=None):
+        moment = time.time() if moment is None else moment
+        return round(self.base_price(symbol) * math.exp(self._log_price(symbol, moment)), 2)
+
+    def _range(self, symbol, start, end):
+        """High and low over [start, end]: the endpoints plus the coarse nodes in between."""
+        node_seconds = DAY / 2 ** COARSE_LEVELS
+        first = math.ceil((start - EPOCH) / node_seconds)
+        last = math.floor((end - EPOCH) / node_seconds)
+        moments = [start, end] + [EPOCH + node * node_seconds for node in range(first, last + 1)]
+        points = [self.price(symbol, moment) for moment in moments]
+        return max(points), min(points)
+
+    def snapshot(self, symbol, moment=None):
+        """Quote in the ``fetch_quote`` shape."""
+        moment = time.time() if moment is None else moment
+        day_start = EPOCH + (moment - EPOCH) // DAY * DAY
+        price = self.price(symbol, moment)
+        previous_close = self.price(symbol, day_start)
+        high, low = self._range(symbol, day_start, moment)
+        daily_volume = 1e5 + self._uniform(symbol, 'volume') * 5e7
+        return {
+            'symbol': symbol,
+            'price': price,
+            'change': round(price - previous_close, 2),
+            'previous_close': previous_close,
+            'volume': int(daily_volume * (moment - day_start) / DAY),
+            'high': high,
+            'low': low,
+            'source': 'Simulator',
+        }
+
+    def history(self, symbol, start, end, interval=DAY):
+        """OHLCV bars of ``interval`` seconds covering [start, end) (epoch seconds)."""
+        bars = []
+        bar_start = start - (start - EPOCH) % interval
+        daily_volume = 1e5 + self._uniform(symbol, 'volume') * 5e7
+        while bar_start < end:
+            bar_end = bar_start + interval
+            high, low = self._range(symbol, bar_start, bar_end)
+            bars.append({
+                'start': bar_start,
+                'open': self.price(symbol, bar_start),
+                'high': high,
+                'low': low,
+                'close': self.price(symbol, bar_end),
+                'volume': int(daily_volume * interval / DAY),
+            })
+            bar_start = bar_end
+        return bars
+
+    def search(self, query):
+        """``(symbol, name)`` matches on ticker prefix or name substring."""
+        query = query.strip().lower()
+        if not query:
+            return []
+        exact = [item for item in self.universe if item[0].lower() == query]
+        prefix = [item for item in self.universe if item[0].lower().startswith(query) and item not in exact]
+        named = [item for item in self.universe if query in item[1].lower() and item not in exact + prefix]
+        return (exact + prefix + named)[:10]
+
+    # Calls with injected latency and errors
+
+    def _delay(self):
+        self.stats['calls'] += 1
+        delay = (self.latency_ms + self._random.uniform(0, self.jitter_ms)) / 1000
+        failed = self._random.random() < self.error_rate
+        return delay, failed
+
+    def _fail(self):
+        self.stats['errors'] += 1
+        raise SimulatedOutage('Injected simulator failure')
+
+    def fetch_quote(self, symbol):
+        with track_provider_call('simulator'):
+            delay, failed = self._delay()
+            time.sleep(delay)
+            if failed:
+                self._fail()
+            return self.snapshot(symbol)
+
+    def fetch_quotes(self, symbols):
+        """One simulated round trip for the whole batch."""
+        with track_provider_call('simulator'):
+            delay, failed = self._delay()
+            time.sleep(delay)
+            if failed:
+                self._fail()
+            now = time.time()
+            return {symbol: self.snapshot(symbol, now) for symbol in dict.fromkeys(symbols)}
+
+    async def afetch_quote(self, symbol):
+        with track_provider_call('simulator'):
+            delay, failed = self._delay()
+            await asyncio.sleep(delay)
+            if failed:
+                self._fail()
+            return self.snapshot(symbol)
+
+    async def asearch(self, query):
+        with track_provider_call('simulator'):
+            delay, failed = self._delay()
+            await asyncio.sleep(delay)
+            if failed:
+                self._fail()
+            return self.search(query)
+
+
+def simulated():
+    """True when settings select the simulator instead of live providers."""
+    return settings.MARKET_DATA_BACKEND == 'simulated'
+
+
+simulator = MarketSimulator()
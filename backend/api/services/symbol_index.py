@@ -0,0 +1,217 @@
+import bisect
+import csv
+import difflib
+import logging
+import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from ..models import StockSymbol, SymbolAlias
+from ..utils import clean_query
+
+logger = logging.getLogger(__name__)
+
+NON_ALPHANUMERIC = re.compile(r'[^a-z0-9 ]+')
+VERSION_KEY = 'symbol_index_version'
+
+# Header names used by the listing files we load (Alpha Vantage LISTING_STATUS,
+# NASDAQ Trader symbol directories)
+SYMBOL_COLUMNS = ('symbol', 'act symbol', 'nasdaq symbol')
+NAME_COLUMNS = ('name', 'security name', 'company name')
+
+
+def normalize_name(name):
+    """Normalizes a company name or query the same way for indexing and lookup."""
+    cleaned = clean_query(name).lower()
+    return ' '.join(NON_ALPHANUMERIC.sub(' ', cleaned).split())
+
+
+class SymbolIndex:
+    """
+    In-process view of the StockSymbol/SymbolAlias tables for resolving
+    free-text queries without a remote search.
+
+    Lookups try, in order: an exact ticker, a known alias, a prefix match on
+    the normalized company name (via bisect over the sorted names) and a
+    fuzzy match among names sharing the first letter. The tables are loaded
+    lazily and reloaded when another process bumps the cache version after
+    writing to them.
+    """
+
+    def __init__(self, fuzzy_cutoff=0.85, prefix_candidates=50, version_check_interval=30):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.prefix_candidates = prefix_candidates
+        self.version_check_interval = version_check_interval
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0
+        self._names = []
+        self._by_symbol = {}
+        self._aliases = {}
+        self._by_initial = {}
+
+    def lookup(self, query):
+        """Returns ``(symbol, company)`` for the best local match, or ``(None, None)``."""
+        key = normalize_name(query)
+        if not key:
+            return None, None
+        self._ensure_loaded()
+
+        ticker = key.upper()
+        if ticker in self._by_symbol:
+            return ticker, self._by_symbol[ticker]
+
+        if key in self._aliases:
+            symbol = self._aliases[key]
+            return symbol, self._by_symbol.get(symbol)
+
+        symbol = self._prefix_match(key) or self._fuzzy_match(key)
+        if symbol:
+            return symbol, self._by_symbol[symbol]
+        return None, None
+
+    async def alookup(self, query):
+        return await sync_to_async(self.lookup)(query)
+
+    def add(self, symbol, name, source, alias=None):
+        """Writes a remotely resolved symbol (and the query that found it) back into the index."""
+        normalized = normalize_name(name)
+        stock, _ = StockSymbol.objects.update_or_create(
+            symbol=symbol,
+            defaults={'name': name, 'normalized_name': normalized, 'source': source},
+        )
+        alias = normalize_name(alias) if alias else None
+        if alias and alias != normalized:
+            SymbolAlias.objects.update_or_create(alias=alias, defaults={'stock': stock})
+
+        with self._lock:
+            self._insert(symbol, name, normalized)
+            if alias:
+                self._aliases[alias] = symbol
+            self._bump_version()
+
+    async def aadd(self, symbol, name, source, alias=None):
+        await sync_to_async(self.add)(symbol, name, source, alias)
+
+    def load_listing(self, listing_file, source='listing', batch_size=1000):
+        """
+        Bulk-loads a CSV listing file (symbol and name columns, optional
+        exchange/status) into StockSymbol. Returns the number of rows loaded.
+        """
+        reader = csv.DictReader(listing_file)
+        columns = {column.strip().lower(): column for column in reader.fieldnames or ()}
+        symbol_column = next((columns[c] for c in SYMBOL_COLUMNS if c in columns), None)
+        name_column = next((columns[c] for c in NAME_COLUMNS if c in columns), None)
+        if not symbol_column or not name_column:
+            raise ValueError(f"Listing file needs symbol and name columns, got {reader.fieldnames}")
+        exchange_column = columns.get('exchange')
+        status_column = columns.get('status')
+
+        loaded = 0
+        batch = []
+        for row in reader:
+            if status_column and row[status_column].strip().lower() not in ('', 'active'):
+                continue
+            symbol = row[symbol_column].strip().upper()
+            name = row[name_column].strip()
+            if not symbol or not name or len(symbol) > 20:
+                continue
+            batch.append(StockSymbol(
+                symbol=symbol,
+                name=name[:255],
+                normalized_name=normalize_name(name)[:255],
+                exchange=(row[exchange_column].strip() if exchange_column else '')[:20],
+                source=source,
+            ))
+            if len(batch) >= batch_size:
+                loaded += self._upsert(batch)
+                batch = []
+        if batch:
+            loaded += self._upsert(batch)
+
+        with self._lock:
+            self._bump_version()
+            self._version = None
+        return loaded
+
+    def stats(self):
+        self._ensure_loaded()
+        return {'symbols': len(self._by_symbol), 'aliases': len(self._aliases), 'version': self._version}
+
+    def _upsert(self, batch):
+        StockSymbol.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['symbol'],
+            update_fields=['name', 'normalized_name', 'exchange', 'source', 'updated_at'],
+        )
+        return len(batch)
+
+    def _ensure_loaded(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < self.version_check_interval:
+            return
+        version = cache.get(VERSION_KEY, 0)
+        self._checked_at = now
+        if version == self._version:
+            return
+
+        with self._lock:
+            # Lookups don't take the lock: build aside, then swap the whole index in
+            names, by_symbol, by_initial = [], {}, {}
+            rows = StockSymbol.objects.values_list('symbol', 'name', 'normalized_name')
+            for symbol, name, normalized in rows.iterator(chunk_size=5000):
+                by_symbol[symbol] = name
+                names.append((normalized, symbol))
+                by_initial.setdefault(normalized[:1], []).append(normalized)
+            names.sort()
+            aliases = dict(SymbolAlias.objects.values_list('alias', 'stock__symbol'))
+            self._names, self._by_symbol, self._by_initial, self._aliases = names, by_symbol, by_initial, aliases
+            self._version = version
+
+    def _insert(self, symbol, name, normalized):
+        if symbol in self._by_symbol:
+            old = next((n for n, s in self._names if s == symbol), None)
+            if old is not None:
+                self._names.remove((old, symbol))
+                self._by_initial.get(old[:1], []).remove(old)
+        self._by_symbol[symbol] = name
+        bisect.insort(self._names, (normalized, symbol))
+        self._by_initial.setdefault(normalized[:1], []).append(normalized)
+
+    def _bump_version(self):
+        if cache.add(VERSION_KEY, 1, None):
+            version = 1
+        else:
+            version = cache.incr(VERSION_KEY)
+        # Our own write doesn't need a full reload
+        if self._version == version - 1:
+            self._version = version
+
+    def _prefix_match(self, key):
+        start = bisect.bisect_left(self._names, (key, ''))
+        best = fallback = None
+        for normalized, symbol in self._names[start:start + self.prefix_candidates]:
+            if not normalized.startswith(key):
+                break
+            candidate = (len(normalized), symbol)
+            # Prefer whole-word matches: "apple" -> "apple inc" over "applebee s"
+            if len(normalized) == len(key) or normalized[len(key)] == ' ':
+                best = min(best, candidate) if best else candidate
+            else:
+                fallback = min(fallback, candidate) if fallback else candidate
+        match = best or fallback
+        return match[1] if match else None
+
+    def _fuzzy_match(self, key):
+        matches = difflib.get_close_matches(key, self._by_initial.get(key[:1], []), n=1, cutoff=self.fuzzy_cutoff)
+        if not matches:
+            return None
+        start = bisect.bisect_left(self._names, (matches[0], ''))
+        return self._names[start][1]
+
+
+symbol_index = SymbolIndex()
@@ -0,0 +1,114 @@
+"""
+Cached user lookups for token authentication.
+
+Resolving a token's user used to cost a query on every request and every
+websocket connect. ``user_cache`` keeps each User, with its UserProfile
+attached (so ``user.userprofile`` costs nothing either), in process memory
+for ``AUTH_USER_CACHE_LOCAL_TTL`` seconds and in the shared cache for
+``AUTH_USER_CACHE_TTL`` seconds.
+
+Saving or deleting a User or its UserProfile (password, activation and
+profile changes included) invalidates both tiers here; other processes
+drop their in-memory copy within the local TTL. Entries are stored
+pickled and every lookup gets its own instance, so one request changing
+its ``request.user`` never leaks into another.
+"""
+import pickle
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from . import metrics
+
+user_lookups = metrics.registry.register(metrics.Counter(
+    'auth_user_lookups', 'Token user lookups by the tier that answered them.', ('source',),
+))
+
+
+class UserCache:
+    def __init__(self, namespace='auth_user', ttl=None, local_ttl=None, max_entries=None):
+        self.namespace = namespace
+        self.ttl = ttl if ttl is not None else settings.AUTH_USER_CACHE_TTL
+        self.local_ttl = local_ttl if local_ttl is not None else settings.AUTH_USER_CACHE_LOCAL_TTL
+        self.max_entries = max_entries or settings.AUTH_USER_CACHE_MAX_ENTRIES
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def key(self, user_id):
+        return f'{self.namespace}:{user_id}'
+
+    def get(self, user_id):
+        """The active-or-not User with pk ``user_id`` (None if there is none)."""
+        blob = self._local_get(user_id)
+        if blob is not None:
+            user_lookups.inc(source='local')
+            return pickle.loads(blob)
+
+        blob = cache.get(self.key(user_id))
+        if blob is not None:
+            user_lookups.inc(source='shared')
+        else:
+            user = self._load(user_id)
+            if user is None:
+                return None
+            blob = pickle.dumps(user)
+            cache.set(self.key(user_id), blob, self.ttl)
+        self._local_put(user_id, blob)
+        return pickle.loads(blob)
+
+    async def aget(self, user_id):
+        blob = self._local_get(user_id)
+        if blob is not None:
+            user_lookups.inc(source='local')
+            return pickle.loads(blob)
+
+        blob = await cache.aget(self.key(user_id))
+        if blob is None:
+            return await sync_to_async(self.get)(user_id)
+        user_lookups.inc(source='shared')
+        self._local_put(user_id, blob)
+        return pickle.loads(blob)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._local.pop(user_id, None)
+        cache.delete(self.key(user_id))
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+
+    def _load(self, user_id):
+        user_lookups.inc(source='database')
+        model = get_user_model()
+        try:
+            return model.objects.select_related('userprofile').get(pk=user_id)
+        except (model.DoesNotExist, ValueError):
+            return None
+
+    def _local_get(self, user_id):
+        entry = self._local.get(user_id)
+        if entry is None:
+            return None
+        expires, blob = entry
+        if expires < time.monotonic():
+            with self._lock:
+                self._local.pop(user_id, None)
+            return None
+        return blob
+
+    def _local_put(self, user_id, blob):
+        with self._lock:
+            if len(self._local) >= self.max_entries:
+                now = time.monotonic()
+                self._local = {key: entry for key, entry in self._local.items() if entry[0] >= now}
+                if len(self._local) >= self.max_entries:
+                    self._local.clear()
+            self._local[user_id] = (time.monotonic() + self.local_ttl, blob)
+
+
+user_cache = UserCache()
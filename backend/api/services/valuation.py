@@ -0,0 +1,148 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+import pandas as pd
+
+from ..models import Portfolio
+from .market_prices import current_quotes
+
+CENT = Decimal('0.01')
+
+HOLDING_FIELDS = ('id', 'user_id', 'stock_symbol', 'quantity', 'purchase_price')
+
+
+def to_decimal(value):
+    """Rounds a float to a cent-exact Decimal (None for missing values)."""
+    if value is None or np.isnan(value):
+        return None
+    return to_cents(Decimal(repr(float(value))))
+
+
+def to_cents(value):
+    """Quantizes a Decimal to whole cents."""
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class Holdings:
+    """
+    Columnar view of holdings: one numpy array per field.
+
+    Symbols and users are dictionary-encoded (``symbol_codes`` index into
+    ``symbols``, ``user_codes`` into ``users``) so prices and per-user totals
+    can be gathered and scattered with plain array indexing. Purchase prices
+    are kept in integer cents so cost basis stays exact.
+    """
+
+    def __init__(self, ids, user_ids, symbols, quantity, price_cents):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.symbol_codes, self.symbols = pd.factorize(np.asarray(symbols, dtype=object))
+        self.user_codes, users = pd.factorize(np.asarray(user_ids, dtype=np.int64))
+        self.users = pd.Index(users)
+        self.quantity = np.asarray(quantity, dtype=np.float64)
+        self.price_cents = np.asarray(price_cents, dtype=np.int64)
+        self.cost_cents = self.price_cents * np.asarray(quantity, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds holdings from ``HOLDING_FIELDS`` tuples (e.g. a values_list)."""
+        rows = list(rows)
+        if not rows:
+            return cls([], [], [], [], [])
+        ids, user_ids, symbols, quantity, purchase_price = zip(*rows)
+        price_cents = [int(price * 100) for price in purchase_price]
+        return cls(ids, user_ids, symbols, quantity, price_cents)
+
+    @classmethod
+    def from_queryset(cls, queryset):
+        return cls.from_rows(queryset.values_list(*HOLDING_FIELDS).iterator(chunk_size=10000))
+
+
+class Valuation:
+    """
+    Values, P&L and portfolio weights for a set of holdings.
+
+    Everything is float64 arrays aligned with the holdings; holdings with no
+    price are NaN and left out of the per-user totals. ``records`` and
+    ``totals`` convert to cent-rounded Decimals for callers that need them.
+    """
+
+    def __init__(self, holdings, price_by_symbol):
+        self.holdings = holdings
+        self.symbol_price = price_by_symbol
+        self.price = price_by_symbol[holdings.symbol_codes]
+        self.priced = ~np.isnan(self.price)
+        self.value = self.price * holdings.quantity
+        self.cost = holdings.cost_cents / 100
+        self.pnl = self.value - self.cost
+
+        users = len(holdings.users)
+        priced_value = np.where(self.priced, self.value, 0.0)
+        self.user_value = np.bincount(holdings.user_codes, weights=priced_value, minlength=users)
+        self.user_cost = np.bincount(holdings.user_codes, weights=np.where(self.priced, self.cost, 0.0), minlength=users)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.weight = np.nan_to_num(priced_value / self.user_value[holdings.user_codes])
+
+    def per_user(self):
+        """DataFrame of total value, cost and P&L per user id."""
+        return pd.DataFrame({
+            'total_value': self.user_value,
+            'total_cost': self.user_cost,
+            'gain_loss': self.user_value - self.user_cost,
+        }, index=pd.Index(self.holdings.users, name='user_id'))
+
+    def totals(self, user_id=None):
+        """Decimal totals for one user (or the only user when omitted)."""
+        if not len(self.holdings.users):
+            return {'total_value': Decimal('0.00'), 'total_cost': Decimal('0.00'), 'gain_loss': Decimal('0.00')}
+        code = 0 if user_id is None else self.holdings.users.get_loc(user_id)
+        return {
+            'total_value': to_decimal(self.user_value[code]),
+            'total_cost': to_decimal(self.user_cost[code]),
+            'gain_loss': to_decimal(self.user_value[code] - self.user_cost[code]),
+        }
+
+    def records(self):
+        """One dict of cent-rounded Decimals per holding, in holdings order."""
+        holdings = self.holdings
+        return [
+            {
+                'id': int(holdings.ids[i]),
+                'symbol': holdings.symbols[holdings.symbol_codes[i]],
+                'quantity': int(holdings.quantity[i]),
+                'purchase_price': Decimal(int(holdings.price_cents[i])).scaleb(-2),
+                'current_price': to_decimal(self.price[i]),
+                'value': to_decimal(self.value[i]),
+                'cost': to_decimal(self.cost[i]),
+                'gain_loss': to_decimal(self.pnl[i]),
+                'weight': round(float(self.weight[i]), 6) if self.priced[i] else None,
+            }
+            for i in range(len(holdings))
+        ]
+
+
+def value_holdings(holdings, prices):
+    """Values ``holdings`` against a ``{symbol: price}`` mapping (missing prices become NaN)."""
+    price_by_symbol = np.array(
+        [prices.get(symbol, np.nan) for symbol in holdings.symbols],
+        dtype=np.float64,
+    )
+    return Valuation(holdings, price_by_symbol)
+
+
+def current_prices(symbols):
+    """Current price per symbol (quote cache, LatestQuote, then one bulk load for the misses)."""
+    quotes = current_quotes(symbols)
+    return {
+        symbol: float(quote['price'])
+        for symbol, quote in quotes.items()
+        if quote.get('price') is not None
+    }
+
+
+def value_user_holdings(user_id):
+    """Loads and values every holding of one user at current prices."""
+    holdings = Holdings.from_queryset(Portfolio.objects.filter(user_id=user_id).order_by('stock_symbol'))
+    return value_holdings(holdings, current_prices(holdings.symbols))
@@ -0,0 +1,42 @@
+"""
+Websocket frame encodings: JSON text frames, or MessagePack binary frames
+for clients that ask for them with ``?format=msgpack``.
+
+MessagePack is optional; without the ``msgpack`` package only JSON is
+offered. Decimals and datetimes are sent as strings in both encodings,
+the way DjangoJSONEncoder writes them.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'json'
+MSGPACK = 'msgpack'
+
+_to_primitive = DjangoJSONEncoder().default
+
+
+def formats():
+    """Encodings this process can speak."""
+    return (JSON, MSGPACK) if msgpack is not None else (JSON,)
+
+
+def encode(message, format=JSON):
+    """``str`` for JSON, ``bytes`` for MessagePack."""
+    if format == MSGPACK:
+        return msgpack.packb(message, default=_to_primitive)
+    return json.dumps(message, cls=DjangoJSONEncoder)
+
+
+def decode(text_data=None, bytes_data=None):
+    """A client frame as a Python object; binary frames are MessagePack."""
+    if bytes_data is not None:
+        if msgpack is None:
+            raise ValueError('Binary frames need MessagePack support')
+        return msgpack.unpackb(bytes_data)
+    return json.loads(text_data)
@@ -0,0 +1,40 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import StockAlert, UserProfile
+from .services.alert_engine import alert_engine
+from .services.user_cache import user_cache
+
+
+@receiver(post_save, sender=StockAlert)
+def index_stock_alert(sender, instance, **kwargs):
+    """Keeps the alert engine in step with saved alerts, here and in other processes."""
+    if instance.is_active and not instance.triggered:
+        alert_engine.add(instance.id, instance.stock_symbol, instance.alert_type, instance.target_value)
+    else:
+        alert_engine.remove(instance.id)
+    transaction.on_commit(alert_engine.invalidate)
+
+
+@receiver(post_delete, sender=StockAlert)
+def unindex_stock_alert(sender, instance, **kwargs):
+    alert_engine.remove(instance.id)
+    transaction.on_commit(alert_engine.invalidate)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Password, activation and profile changes reach token authentication right away."""
+    user_cache.invalidate(instance.pk)
+    # And again once committed, in case a request cached the old row in between
+    transaction.on_commit(lambda: user_cache.invalidate(instance.pk))
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    user_cache.invalidate(instance.user_id)
+    transaction.on_commit(lambda: user_cache.invalidate(instance.user_id))
@@ -2,86 +2,64 @@ from celery import shared_task
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
-from .models import StockAlert, Portfolio, Investment
-import yfinance as yf
-from decimal import Decimal
+from .models import StockAlert, Portfolio
+from .services.alert_engine import alert_engine
+from .services.market_history import market_history
+from .services.market_prices import current_quotes
+from .services.notifications import notification_queue
+from .services.rate_budget import call_budget
+from .services.symbol_index import symbol_index
+from .services.valuation import Holdings, current_prices, to_decimal, value_holdings, value_user_holdings
+import requests
+import io
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
 
 @shared_task
 def check_stock_alerts():
     """
-    Check all active stock alerts and trigger notifications if conditions are met
-    """
-    active_alerts = StockAlert.objects.filter(is_active=True, triggered=False)
-    
-    for alert in active_alerts:
-        try:
-            ticker = yf.Ticker(alert.stock_symbol)
-            current_price = Decimal(str(ticker.info.get('currentPrice', 0)))
-            current_volume = ticker.info.get('volume', 0)
-            
-            should_trigger = False
-            message = ""
-            
-            if alert.alert_type == 'price_above' and current_price > alert.target_value:
-                should_trigger = True
-                message = f"{alert.stock_symbol} price is above {alert.target_value}"
-            
-            elif alert.alert_type == 'price_below' and current_price < alert.target_value:
-                should_trigger = True
-                message = f"{alert.stock_symbol} price is below {alert.target_value}"
-            
-            elif alert.alert_type == 'percent_change':
-                prev_close = Decimal(str(ticker.info.get('previousClose', 0)))
-                if prev_close > 0:
-                    change = ((current_price - prev_close) / prev_close) * 100
-                    if abs(change) > alert.target_value:
-                        should_trigger = True
-                        message = f"{alert.stock_symbol} price changed by {change:.2f}%"
-            
-            elif alert.alert_type == 'volume_above' and current_volume > alert.target_value:
-                should_trigger = True
-                message = f"{alert.stock_symbol} volume is above {alert.target_value}"
-            
-            if should_trigger:
-                # Send email notification
-                send_mail(
-                    subject=f"Stock Alert: {alert.stock_symbol}",
-                    message=message,
-                    from_email=settings.DEFAULT_FROM_EMAIL,
-                    recipient_list=[alert.notification_email],
-                )
-                
-                # Update alert status
-                alert.triggered = True
-                alert.last_triggered_at = timezone.now()
-                alert.save()
-                
-        except Exception as e:
-            print(f"Error processing alert for {alert.stock_symbol}: {str(e)}")
+    Sweep every alerted symbol through the alert engine.
+    Streamed quotes trigger alerts as they arrive; this catches symbols
+    nobody is streaming and re-syncs the index with the database.
+    """
+    alert_engine.reload()
+    quotes = current_quotes(alert_engine.symbols())
+    fired = alert_engine.process(quotes.values())
+    return len(fired)
 
 @shared_task
-def update_portfolio_values():
-    """
-    Update the total value of all portfolios
-    """
-    portfolios = Portfolio.objects.all()
-    
-    for portfolio in portfolios:
-        try:
-            total_value = Decimal('0')
-            investments = Investment.objects.filter(portfolio=portfolio)
-            
-            for investment in investments:
-                ticker = yf.Ticker(investment.stock_symbol)
-                current_price = Decimal(str(ticker.info.get('currentPrice', 0)))
-                value = current_price * investment.shares
-                total_value += value
-            
-            portfolio.total_value = total_value
-            portfolio.save()
-            
-        except Exception as e:
-            print(f"Error updating portfolio {portfolio.id}: {str(e)}")
+def send_alert_notifications(notifications):
+    """
+    Email digests for fired alerts (queued by the alert engine)
+    """
+    return notification_queue.dispatch(notifications)
+
+@shared_task
+def update_portfolio_values(chunk_size=2000):
+    """
+    Update the total value of every holding from one bulk quote fetch.
+    Prices are fetched once per distinct symbol and applied to all holdings
+    at once by the valuation engine.
+    """
+    holdings = Holdings.from_queryset(Portfolio.objects.all())
+    if not len(holdings):
+        return
+
+    valuation = value_holdings(holdings, current_prices(holdings.symbols))
+    missing = list(holdings.symbols[np.isnan(valuation.symbol_price)])
+    if missing:
+        logger.warning("No price for %d symbols, keeping their last value: %s", len(missing), sorted(missing)[:10])
+
+    now = timezone.now()
+    priced = np.flatnonzero(valuation.priced)
+    for offset in range(0, len(priced), chunk_size):
+        batch = [
+            Portfolio(id=int(holdings.ids[i]), total_value=to_decimal(valuation.value[i]), last_updated=now)
+            for i in priced[offset:offset + chunk_size]
+        ]
+        Portfolio.objects.bulk_update(batch, ['total_value', 'last_updated'])
 
 @shared_task
 def generate_portfolio_report(portfolio_id):
@@ -89,34 +67,31 @@ def generate_portfolio_report(portfolio_id):
     Generate and email a portfolio performance report
     """
     try:
-        portfolio = Portfolio.objects.get(id=portfolio_id)
-        investments = Investment.objects.filter(portfolio=portfolio)
+        portfolio = Portfolio.objects.select_related('user').get(id=portfolio_id)
+        valuation = value_user_holdings(portfolio.user_id)
+        totals = valuation.totals()
         
         report_lines = [
-            f"Portfolio Report: {portfolio.name}",
+            f"Portfolio Report: {portfolio.user.username}",
             f"Generated on: {timezone.now().strftime('%Y-%m-%d %H:%M:%S')}",
-            f"Total Value: ${portfolio.total_value}",
+            f"Total Value: ${totals['total_value']}",
+            f"Gain/Loss: ${totals['gain_loss']}",
             "\nInvestments:",
         ]
         
-        for investment in investments:
-            ticker = yf.Ticker(investment.stock_symbol)
-            current_price = Decimal(str(ticker.info.get('currentPrice', 0)))
-            value = current_price * investment.shares
-            gain_loss = value - (investment.purchase_price * investment.shares)
-            
+        for holding in valuation.records():
             report_lines.extend([
-                f"\n{investment.stock_symbol}:",
-                f"Shares: {investment.shares}",
-                f"Current Price: ${current_price}",
-                f"Total Value: ${value}",
-                f"Gain/Loss: ${gain_loss}",
+                f"\n{holding['symbol']}:",
+                f"Shares: {holding['quantity']}",
+                f"Current Price: ${holding['current_price']}",
+                f"Total Value: ${holding['value']}",
+                f"Gain/Loss: ${holding['gain_loss']}",
             ])
         
         report = "\n".join(report_lines)
         
         send_mail(
-            subject=f"Portfolio Report: {portfolio.name}",
+            subject=f"Portfolio Report: {portfolio.user.username}",
             message=report,
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[portfolio.user.email],
@@ -136,3 +111,38 @@ def cleanup_old_alerts():
         triggered=True,
         last_triggered_at__lt=thirty_days_ago
     ).delete()
+
+
+@shared_task
+def rollup_market_data():
+    """
+    Fold recent MarketData ticks into 1-minute, 1-hour and 1-day OHLCV bars
+    """
+    return market_history.rollup_recent()
+
+@shared_task
+def maintain_market_history():
+    """
+    Create upcoming MarketData partitions and drop history past retention
+    """
+    market_history.ensure_partitions()
+    return market_history.prune()
+
+
+@shared_task
+def refresh_symbol_index():
+    """
+    Reload the local symbol index from the bulk listing file
+    """
+    try:
+        call_budget.acquire('alpha_vantage', settings.ALPHA_VANTAGE_API_KEY)
+        response = requests.get(
+            settings.SYMBOL_LISTING_URL,
+            params={'function': 'LISTING_STATUS', 'apikey': settings.ALPHA_VANTAGE_API_KEY},
+            timeout=60,
+        )
+        response.raise_for_status()
+        loaded = symbol_index.load_listing(io.StringIO(response.text))
+        logger.info("Loaded %d symbols into the symbol index", loaded)
+    except Exception:
+        logger.exception("Error refreshing symbol index")
@@ -0,0 +1,150 @@
+from decimal import Decimal
+import pytest
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.db import DatabaseError
+from api.models import StockAlert
+from api.services.alert_engine import VERSION_KEY, AlertEngine, ThresholdBook, alert_engine
+from api.services.quote_cache import quote_cache
+from api.tasks import check_stock_alerts, send_alert_notifications
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(monkeypatch):
+    # Deliver notifications inline instead of through the Celery queue
+    monkeypatch.setattr(send_alert_notifications, 'delay', send_alert_notifications)
+    cache.clear()
+    quote_cache.clear()
+    alert_engine.reload()
+    yield
+    quote_cache.clear()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username='alerter', password='testpass123')
+
+
+def make_alert(user, symbol, alert_type, target):
+    return StockAlert.objects.create(
+        user=user, stock_symbol=symbol, alert_type=alert_type,
+        target_value=Decimal(target), notification_email='alerter@example.com',
+    )
+
+
+def test_threshold_book_slices():
+    book = ThresholdBook()
+    for alert_id, target in enumerate((100.0, 105.0, 110.0, 110.0, 120.0)):
+        book.add(target, alert_id)
+
+    assert [alert_id for _, alert_id in book.below(110.0)] == [0, 1]
+    assert [alert_id for _, alert_id in book.above(110.0)] == [4]
+    book.remove(110.0, 2)
+    assert len(book) == 4
+
+
+@pytest.mark.django_db
+class TestAlertEngine:
+    def test_matches_by_type(self, user):
+        above = make_alert(user, 'AAPL', 'price_above', '150')
+        below = make_alert(user, 'AAPL', 'price_below', '100')
+        change = make_alert(user, 'AAPL', 'percent_change', '5')
+        volume = make_alert(user, 'AAPL', 'volume_above', '1000000')
+        make_alert(user, 'MSFT', 'price_above', '1')
+        engine = AlertEngine()
+
+        assert engine.match({'symbol': 'AAPL', 'price': 120.0, 'previous_close': 118.0, 'volume': 10}) == []
+        matched = engine.match({'symbol': 'AAPL', 'price': 151.0, 'previous_close': 140.0, 'volume': 2000000})
+
+        assert {alert_id for alert_id, _ in matched} == {above.id, change.id, volume.id}
+        assert engine.match({'symbol': 'AAPL', 'price': 99.0})[0][0] == below.id
+        # Matched alerts leave the index
+        assert engine.stats()['alerts'] == 1
+
+    def test_process_fires_once(self, user):
+        alert = make_alert(user, 'AAPL', 'price_above', '150')
+        engine, other = AlertEngine(), AlertEngine()
+        other.symbols()
+
+        fired = engine.process([{'symbol': 'AAPL', 'price': 151.0}])
+        assert [a.id for a in fired] == [alert.id]
+        # A second worker that saw the same tick cannot fire it again
+        assert other.process([{'symbol': 'AAPL', 'price': 152.0}]) == []
+
+        alert.refresh_from_db()
+        assert alert.triggered and alert.last_triggered_at
+        assert len(mail.outbox) == 1
+        assert mail.outbox[0].body == 'AAPL price is above 150.00'
+
+    def test_nothing_claimed_queues_nothing(self, user, monkeypatch):
+        make_alert(user, 'AAPL', 'price_above', '150')
+        engine, other = AlertEngine(), AlertEngine()
+        other.symbols()
+        engine.process([{'symbol': 'AAPL', 'price': 151.0}])
+        queued = []
+        monkeypatch.setattr('api.services.alert_engine.notification_queue.enqueue', queued.append)
+
+        assert other.process([{'symbol': 'AAPL', 'price': 152.0}]) == []
+        assert queued == []
+
+    def test_failed_fire_keeps_the_alerts(self, user, monkeypatch):
+        alert = make_alert(user, 'AAPL', 'price_above', '150')
+        engine = AlertEngine()
+
+        def lock_timeout(*args, **kwargs):
+            raise DatabaseError('lock timeout')
+
+        with monkeypatch.context() as patch:
+            patch.setattr(StockAlert.objects, 'bulk_update', lock_timeout)
+            with pytest.raises(DatabaseError):
+                engine.process([{'symbol': 'AAPL', 'price': 151.0}])
+
+        assert [a.id for a in engine.process([{'symbol': 'AAPL', 'price': 152.0}])] == [alert.id]
+
+    def test_saved_alerts_are_indexed(self, user):
+        assert alert_engine.symbols() == []
+        alert = make_alert(user, 'TSLA', 'price_below', '200')
+        assert alert_engine.symbols() == ['TSLA']
+
+        alert.is_active = False
+        alert.save()
+        assert alert_engine.match({'symbol': 'TSLA', 'price': 100.0}) == []
+
+    def test_matches_during_a_reload_see_the_old_index(self, user, monkeypatch):
+        make_alert(user, 'AAPL', 'price_below', '100')
+        engine = AlertEngine()
+        assert engine.symbols() == ['AAPL']
+        seen = []
+
+        class Rows:
+            def __init__(self, rows):
+                self.rows = rows
+
+            def values_list(self, *fields):
+                return Rows(self.rows.values_list(*fields))
+
+            def iterator(self, chunk_size):
+                # A match from another thread, before any row has been read
+                seen.append(engine.symbols())
+                yield from self.rows.iterator(chunk_size)
+
+        class Alerts:
+            class objects:
+                @staticmethod
+                def filter(**filters):
+                    return Rows(StockAlert.objects.filter(**filters))
+
+        monkeypatch.setattr('api.services.alert_engine.StockAlert', Alerts)
+        engine._checked_at = 0
+        cache.set(VERSION_KEY, 1, None)
+
+        assert engine.symbols() == ['AAPL']
+        assert seen == [['AAPL']]
+
+    def test_sweep_task_uses_cached_quotes(self, user):
+        make_alert(user, 'AAPL', 'price_below', '100')
+        quote_cache.set('AAPL', {'symbol': 'AAPL', 'price': 90.0})
+
+        assert check_stock_alerts() == 1
+        assert StockAlert.objects.get().triggered
@@ -0,0 +1,109 @@
+import pytest
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+from api.authentication import CachedJWTAuthentication, JWTAuthMiddleware
+from api.benchmarks.websocket import Socket
+from api.models import Portfolio, UserProfile
+from api.routing import websocket_urlpatterns
+from api.services.quote_hub import INGEST_HEARTBEAT_KEY
+from api.services.user_cache import user_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    user_cache.clear()
+    yield
+    cache.clear()
+    user_cache.clear()
+
+
+@pytest.fixture
+def user(db):
+    user = User.objects.create_user('tokenholder', password='password')
+    UserProfile.objects.create(user=user, name='Token Holder', risk_tolerance=5, investment_horizon=3)
+    return user
+
+
+def authenticate(token):
+    request = APIRequestFactory().get('/api/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    return CachedJWTAuthentication().authenticate(request)
+
+
+@pytest.mark.django_db
+class TestCachedJWTAuthentication:
+    def test_resolves_the_user_once(self, user, django_assert_num_queries):
+        token = AccessToken.for_user(user)
+        with django_assert_num_queries(1):
+            first, _ = authenticate(token)
+        with django_assert_num_queries(0):
+            again, _ = authenticate(token)
+            assert again.userprofile.name == 'Token Holder'
+
+        assert first == again == user
+        # Each lookup gets its own instance
+        assert first is not again
+
+    def test_profile_changes_invalidate(self, user):
+        token = AccessToken.for_user(user)
+        authenticate(token)
+        user.userprofile.name = 'Renamed'
+        user.userprofile.save()
+
+        assert authenticate(token)[0].userprofile.name == 'Renamed'
+
+    def test_deactivated_users_are_rejected(self, user):
+        token = AccessToken.for_user(user)
+        authenticate(token)
+        user.is_active = False
+        user.save()
+
+        with pytest.raises(AuthenticationFailed):
+            authenticate(token)
+
+    def test_async_path(self, user):
+        token = AccessToken.for_user(user)
+        request = APIRequestFactory().get('/api/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        authenticated, _ = async_to_sync(CachedJWTAuthentication().aauthenticate)(request)
+        assert authenticated == user
+
+
+@pytest.mark.django_db(transaction=True)
+class TestJWTAuthMiddleware:
+    @pytest.fixture
+    def holding(self, user):
+        cache.set(INGEST_HEARTBEAT_KEY, 'test', None)
+        layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        with override_settings(CHANNEL_LAYERS=layers):
+            yield Portfolio.objects.create(user=user, stock_symbol='AAPL', quantity=1, purchase_price=100)
+
+    def connect(self, holding, query='', headers=()):
+        application = JWTAuthMiddleware(URLRouter(websocket_urlpatterns))
+        socket = Socket(application, f'/ws/portfolio/{holding.id}/', query, headers=list(headers))
+
+        async def scenario():
+            connected = await socket.connect(1)
+            if connected:
+                await socket.receive_json(1)
+                await socket.disconnect()
+            return connected
+
+        return async_to_sync(scenario)()
+
+    def test_query_string_token(self, holding):
+        assert self.connect(holding, f'token={AccessToken.for_user(holding.user)}')
+
+    def test_authorization_header(self, holding):
+        header = f'Bearer {AccessToken.for_user(holding.user)}'.encode()
+        assert self.connect(holding, headers=[(b'authorization', header)])
+
+    def test_bad_or_missing_token_is_anonymous(self, holding):
+        assert not self.connect(holding, 'token=not-a-token')
+        assert not self.connect(holding)
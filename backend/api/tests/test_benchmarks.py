@@ -0,0 +1,87 @@
+import pytest
+from django.core.cache import cache
+from api.benchmarks import BENCHMARKS, capacity, fixtures, rest, tasks, throttle, websocket
+from api.models import Portfolio, StockAlert, UserProfile
+from api.services.quote_cache import quote_cache
+
+SIZES = {'users': 5, 'holdings_per_user': 3, 'alerts': 20, 'symbols': 30}
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    cache.clear()
+    quote_cache.clear()
+    fixtures._loaded.clear()
+    yield
+    fixtures._loaded.clear()
+
+
+@pytest.mark.django_db
+class TestFixtures:
+    def test_fixture_is_reproducible(self):
+        summary = fixtures.load_fixture(**SIZES)
+        first = list(Portfolio.objects.order_by('user__username', 'stock_symbol').values_list('stock_symbol', 'quantity'))
+
+        fixtures._loaded.clear()
+        fixtures.load_fixture(**SIZES)
+        second = list(Portfolio.objects.order_by('user__username', 'stock_symbol').values_list('stock_symbol', 'quantity'))
+
+        assert summary == {**SIZES, 'holdings': 15, 'symbols': 30, 'seed': 0}
+        assert first == second
+        assert UserProfile.objects.count() == 5
+        assert StockAlert.objects.count() == 20
+
+
+@pytest.mark.django_db
+class TestBenchmarks:
+    def test_portfolio_list(self):
+        result = rest.portfolio_list(repeat=1, **SIZES)
+
+        assert result['statuses'] == {200: 5}
+        assert result['queries_per_request']['max'] <= 3
+
+    def test_advisory(self):
+        result = rest.advisory(requests=10, concurrency=4, **SIZES)
+
+        assert result['cold']['requests'] == 30
+        assert result['warm']['statuses'] == {200: 10}
+
+    def test_fanout(self):
+        result = websocket.fanout(subscribers=5, messages=3)
+
+        assert result['deliveries']['count'] == 15
+        assert result['fanout']['count'] == 3
+
+    def test_capacity_steps_up_and_reports_saturation(self):
+        result = capacity.run(levels='3,6', symbols=2, messages=2, soak_seconds=0.2, rate=20)
+
+        assert [step['connections'] for step in result['steps']] == [3, 6]
+        assert result['steps'][1]['deliveries']['count'] + result['steps'][1]['superseded'] == 12
+        assert result['max_healthy_connections'] == 6
+        assert result['saturation'] is None
+        assert result['soak']['connections'] == 6
+
+    def test_capacity_saturates_past_the_latency_budget(self):
+        result = capacity.run(levels='2,4', symbols=2, messages=1, latency_budget_ms=0)
+
+        assert result['saturation'] == {'connections': 2, 'reason': result['saturation']['reason']}
+        assert 'budget' in result['saturation']['reason']
+        assert result['max_healthy_connections'] is None
+
+    def test_tasks(self):
+        result = tasks.run(repeat=2, **SIZES)
+
+        assert result['update_portfolio_values']['runs'] == 2
+        assert result['check_stock_alerts']['fired'] == result['check_stock_alerts']['triggered'] > 0
+        assert Portfolio.objects.filter(total_value=0).count() == 0
+
+    def test_throttle_overhead_is_sub_millisecond(self):
+        result = throttle.run(requests=2000, users=20)
+
+        assert result['gcra_allowed']['allowed'] == 2000
+        assert result['gcra_rejected']['allowed'] == 20
+        assert result['gcra_allowed']['p50_ms'] < 1
+        assert result['gcra_rejected']['p50_ms'] < 1
+
+    def test_registry(self):
+        assert {'valuation', 'portfolio_list', 'advisory', 'fanout', 'tasks', 'throttle', 'capacity'} <= set(BENCHMARKS)
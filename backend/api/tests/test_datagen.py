@@ -0,0 +1,72 @@
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from api.benchmarks.datagen import SyntheticDataset
+from api.models import LatestQuote, MarketData, Portfolio, StockAlert, UserProfile
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+def dataset(**options):
+    return SyntheticDataset(**{'users': 6, 'holdings': 4, 'alerts': 10, 'ticks': 5, 'symbols': 20,
+                               'chunk_size': 4, **options})
+
+
+@pytest.mark.django_db
+class TestSyntheticDataset:
+    def test_generates_every_table(self):
+        summary = dataset().generate()
+
+        assert {table: counts['rows'] for table, counts in summary.items()} == {
+            'users': 6, 'profiles': 6, 'holdings': 24, 'alerts': 10, 'ticks': 100,
+        }
+        assert UserProfile.objects.count() == 6
+        assert LatestQuote.objects.count() == 20
+        pairs = list(Portfolio.objects.values_list('user_id', 'stock_symbol'))
+        assert len(set(pairs)) == len(pairs)
+        assert StockAlert.objects.filter(notification_email__startswith='synthetic-').count() == 10
+
+    def test_ticks_end_at_the_latest_quote(self):
+        dataset(ticks=3, tick_interval=3600).generate()
+
+        quote = LatestQuote.objects.get(symbol='AAPL')
+        ticks = list(MarketData.objects.filter(symbol='AAPL').order_by('timestamp'))
+        assert len(ticks) == 3
+        assert ticks[-1].current_price == quote.current_price
+        assert ticks[-1].timestamp - ticks[0].timestamp == timedelta(hours=2)
+
+    def test_rows_are_reproducible(self):
+        first = dataset()
+        first.generate()
+        holdings = list(Portfolio.objects.order_by('id').values_list('stock_symbol', 'quantity', 'purchase_price'))
+
+        first.clear()
+        dataset().generate()
+        again = list(Portfolio.objects.order_by('id').values_list('stock_symbol', 'quantity', 'purchase_price'))
+
+        assert holdings == again
+
+    def test_users_share_one_password_hash_and_ids_continue(self):
+        dataset().generate()
+
+        user = User.objects.get(username='synthetic-0000003')
+        assert user.check_password('password')
+        assert User.objects.values('password').distinct().count() == 1
+        assert User.objects.create_user('after', password='x').id > user.id
+
+
+@pytest.mark.django_db
+class TestGenerateSyntheticDataCommand:
+    def test_refuses_to_duplicate_prefix_without_clear(self):
+        call_command('generate_synthetic_data', users=2, holdings=1, alerts=1, symbols=5)
+        with pytest.raises(CommandError):
+            call_command('generate_synthetic_data', users=2, holdings=1, alerts=1, symbols=5)
+
+        call_command('generate_synthetic_data', users=3, holdings=1, alerts=1, symbols=5, clear=True)
+        assert User.objects.filter(username__startswith='synthetic-').count() == 3
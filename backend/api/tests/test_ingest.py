@@ -0,0 +1,82 @@
+from decimal import Decimal
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from api.models import LatestQuote, MarketData, Portfolio, StockAlert
+from api.services.alert_engine import alert_engine
+from api.services.ingest import PriceIngestor, normalize_quote
+from api.services.quote_cache import quote_cache
+from api.services.quote_hub import INGEST_HEARTBEAT_KEY, amark_watched
+from api.tasks import send_alert_notifications
+
+
+class FakeChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+@pytest.fixture(autouse=True)
+def clear_cache(monkeypatch):
+    monkeypatch.setattr(send_alert_notifications, 'delay', send_alert_notifications)
+    cache.clear()
+    quote_cache.clear()
+    alert_engine.reload()
+    yield
+    quote_cache.clear()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username='ingester', password='testpass123')
+
+
+def fetcher(calls):
+    def fetch(symbols):
+        calls.append(list(symbols))
+        return {
+            symbol: {'symbol': symbol, 'price': 99.5, 'change': -0.5, 'previous_close': 100.0, 'volume': 1000}
+            for symbol in symbols if symbol != 'GONE'
+        }
+    return fetch
+
+
+def test_normalize_quote_drops_unusable_prices():
+    assert normalize_quote('aapl', {'price': '150.123', 'volume': None})['price'] == 150.12
+    assert normalize_quote('AAPL', {'price': None}) is None
+    assert normalize_quote('AAPL', {'price': 0}) is None
+
+
+@pytest.mark.django_db
+class TestPriceIngestor:
+    def test_cycle_covers_watched_held_and_alerted(self, user):
+        Portfolio.objects.create(user=user, stock_symbol='AAPL', purchase_price=Decimal('100'), quantity=1)
+        StockAlert.objects.create(user=user, stock_symbol='MSFT', alert_type='price_below',
+                                  target_value=Decimal('100'), notification_email='i@example.com')
+        async_to_sync(amark_watched)('TSLA', 60)
+
+        calls, layer = [], FakeChannelLayer()
+        ingestor = PriceIngestor(interval=1, fetcher=fetcher(calls), channel_layer=layer, extra_symbols=['gone'])
+        stats = ingestor.run_once()
+
+        assert calls == [['AAPL', 'GONE', 'MSFT', 'TSLA']]
+        assert stats['ticks'] == 3
+        assert stats['alerts_fired'] == 1
+        assert MarketData.objects.count() == 3
+        assert LatestQuote.objects.get(pk='AAPL').current_price == Decimal('99.50')
+        assert quote_cache.peek('TSLA')['price'] == 99.5
+        assert sorted(group for group, _ in layer.sent) == ['stock_group_AAPL', 'stock_group_MSFT', 'stock_group_TSLA']
+        assert cache.get(INGEST_HEARTBEAT_KEY)
+
+    def test_run_clears_heartbeat(self):
+        calls = []
+        ingestor = PriceIngestor(interval=0.01, fetcher=fetcher(calls), channel_layer=FakeChannelLayer(),
+                                 extra_symbols=['AAPL'])
+        seen = []
+        ingestor.run(cycles=2, on_cycle=seen.append)
+
+        assert len(seen) == 2
+        assert cache.get(INGEST_HEARTBEAT_KEY) is None
@@ -0,0 +1,236 @@
+import asyncio
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import AsyncClient
+from api.benchmarks.fixtures import simulated_market
+from api.models import UserProfile
+from api.services import llm_gateway as gateway_module
+from api.services.llm_gateway import LLMGateway, band_price, fingerprint, price_band
+from api.services.providers import GeminiProvider, ProviderError, http_client
+from api.services.quote_cache import quote_cache
+from api.services.rate_limit import RateLimiter
+
+
+class FakeLLM:
+    def __init__(self, chunks=('Buy ', 'and ', 'hold.'), delay=0.01, error=False):
+        self.chunks = chunks
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt, max_tokens=150):
+        return ''.join([chunk async for chunk in self.stream(prompt, max_tokens)])
+
+    async def stream(self, prompt, max_tokens=150):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            for chunk in self.chunks:
+                await asyncio.sleep(self.delay)
+                if self.error:
+                    raise ProviderError('LLM down')
+                yield chunk
+        finally:
+            self.active -= 1
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    quote_cache.clear()
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+class TestFingerprint:
+    def test_ignores_whitespace_and_case(self):
+        assert fingerprint('Buy  AAPL?\n') == fingerprint('buy aapl?')
+        assert fingerprint('Buy AAPL?') != fingerprint('Buy MSFT?')
+
+    def test_prices_within_a_band_share_it(self):
+        low = band_price(100.0, 0.02)
+        assert low <= 100.0
+        assert price_band(low * 1.001, 0.02) == price_band(low * 1.015, 0.02)
+        assert price_band(low * 1.001, 0.02) != price_band(low * 1.03, 0.02)
+
+    def test_prices_without_a_band(self):
+        assert price_band(0, 0.02) is None
+        assert band_price(0, 0.02) == band_price(-1.5, 0.02) == 0
+
+
+class TestGeminiStream:
+    def test_parses_server_sent_events(self):
+        class Client:
+            async def stream_lines(self, method, url, **kwargs):
+                for text in ('Buy ', 'now.'):
+                    yield 'data: ' + json.dumps({'candidates': [{'content': {'parts': [{'text': text}]}}]})
+                    yield ''
+
+        chunks = async_to_sync(collect)(GeminiProvider(Client()).stream('Should I buy AAPL?'))
+
+        assert chunks == ['Buy ', 'now.']
+
+    def test_generate_and_stream_use_the_same_model(self):
+        urls = []
+
+        class Client:
+            async def post_json(self, url, body, **kwargs):
+                urls.append(url)
+                return {'candidates': [{'content': {'parts': [{'text': 'Buy.'}]}}]}
+
+            async def stream_lines(self, method, url, **kwargs):
+                urls.append(url)
+                yield 'data: ' + json.dumps({'candidates': [{'content': {'parts': [{'text': 'Buy.'}]}}]})
+
+        provider = GeminiProvider(Client())
+        assert async_to_sync(provider.generate)('Should I buy AAPL?') == 'Buy.'
+        async_to_sync(collect)(provider.stream('Should I buy AAPL?'))
+
+        assert [url.rsplit(':', 1)[0] for url in urls] == [f'{provider.base_url}/{provider.model}'] * 2
+
+
+class TestLLMGateway:
+    def test_caches_responses(self):
+        llm = FakeLLM()
+        gateway = LLMGateway(provider=llm, max_concurrency=2, cache_ttl=60)
+
+        first = async_to_sync(gateway.generate)('Should I buy AAPL?')
+        second = async_to_sync(gateway.generate)('should i  buy AAPL?')
+
+        assert first == second == 'Buy and hold.'
+        assert llm.calls == 1
+
+    def test_token_cap_is_part_of_the_key(self):
+        llm = FakeLLM()
+        gateway = LLMGateway(provider=llm, max_concurrency=2, cache_ttl=60)
+
+        async_to_sync(gateway.generate)('Should I buy AAPL?', max_tokens=150)
+        async_to_sync(gateway.generate)('Should I buy AAPL?', max_tokens=20)
+
+        assert llm.calls == 2
+        assert gateway.key('Should I buy AAPL?', 150) != gateway.key('Should I buy AAPL?', 20)
+
+    def test_identical_inflight_prompts_share_one_call(self):
+        llm = FakeLLM()
+        gateway = LLMGateway(provider=llm, max_concurrency=4, cache_ttl=60)
+
+        async def burst():
+            return await asyncio.gather(*[gateway.generate('Should I buy AAPL?') for _ in range(5)])
+
+        assert async_to_sync(burst)() == ['Buy and hold.'] * 5
+        assert llm.calls == 1
+
+    def test_sync_callers_use_and_close_a_session_of_their_own(self):
+        sessions = []
+
+        class SessionLLM(FakeLLM):
+            async def generate(self, prompt, max_tokens=150):
+                sessions.append(http_client.session())
+                return await super().generate(prompt, max_tokens)
+
+        gateway = LLMGateway(provider=SessionLLM(), max_concurrency=2, cache_ttl=0)
+        opened = len(http_client._sessions)
+
+        for _ in range(3):
+            assert gateway.generate_sync('Should I buy AAPL?') == 'Buy and hold.'
+
+        assert len(sessions) == 3 and all(session.closed for session in sessions)
+        assert len(http_client._sessions) == opened
+
+    def test_caps_concurrent_provider_calls(self):
+        llm = FakeLLM()
+        gateway = LLMGateway(provider=llm, max_concurrency=2, cache_ttl=60)
+
+        async def burst():
+            return await asyncio.gather(*[gateway.generate(f'Should I buy {n}?') for n in range(6)])
+
+        async_to_sync(burst)()
+        assert llm.calls == 6
+        assert llm.peak == 2
+
+    def test_streams_chunks_then_serves_them_cached(self):
+        llm = FakeLLM()
+        gateway = LLMGateway(provider=llm, max_concurrency=2, cache_ttl=60)
+
+        async def both():
+            streamed = await collect(gateway.stream('Should I buy AAPL?'))
+            return streamed, await collect(gateway.stream('Should I buy AAPL?'))
+
+        streamed, cached = async_to_sync(both)()
+        assert streamed == ['Buy ', 'and ', 'hold.']
+        assert cached == ['Buy and hold.']
+        assert llm.calls == 1
+
+    def test_errors_reach_followers_and_are_not_cached(self):
+        llm = FakeLLM(error=True)
+        gateway = LLMGateway(provider=llm, max_concurrency=2, cache_ttl=60)
+
+        async def burst():
+            return await asyncio.gather(*[gateway.generate('Should I buy AAPL?') for _ in range(3)],
+                                        return_exceptions=True)
+
+        results = async_to_sync(burst)()
+        assert all(isinstance(result, ProviderError) for result in results)
+        assert llm.calls == 1
+        assert cache.get(gateway.key('Should I buy AAPL?')) is None
+
+
+@pytest.mark.django_db
+class TestRecommendationView:
+    @pytest.fixture
+    def llm(self, monkeypatch):
+        llm = FakeLLM(delay=0)
+        monkeypatch.setattr(gateway_module.llm_gateway, 'provider', llm)
+        user = User.objects.create_user('advice', password='password')
+        UserProfile.objects.create(user=user, name='Advice', risk_tolerance=8, investment_horizon=5)
+        self.client = AsyncClient()
+        async_to_sync(self.client.aforce_login)(user)
+        with simulated_market():
+            yield llm
+
+    def get(self, **params):
+        async def fetch():
+            response = await self.client.get('/api/ai-recommendation/', params)
+            if response.streaming:
+                return response, b''.join([chunk async for chunk in response.streaming_content])
+            return response, response.content
+        return async_to_sync(fetch)()
+
+    def test_returns_and_caches_the_recommendation(self, llm):
+        response, _ = self.get(symbol='AAPL')
+        again, _ = self.get(symbol='AAPL')
+
+        assert response.status_code == 200
+        assert response.json()['recommendation'] == again.json()['recommendation'] == 'Buy and hold.'
+        assert llm.calls == 1
+
+    def test_streams_the_recommendation(self, llm):
+        response, body = self.get(symbol='AAPL', stream='1')
+
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain')
+        assert body == b'Buy and hold.'
+
+    def test_requires_a_user(self, llm):
+        async_to_sync(self.client.alogout)()
+        response, _ = self.get(symbol='AAPL')
+
+        assert response.status_code == 401
+
+    def test_keeps_the_user_throttle_rate(self, llm, settings, monkeypatch):
+        monkeypatch.setattr('api.views.rate_limiter', RateLimiter())
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'user': '2/minute'}}
+
+        codes = [self.get(symbol=symbol)[0].status_code for symbol in ('AAPL', 'MSFT', 'TSLA')]
+
+        assert codes == [200, 200, 429]
+        assert llm.calls == 2
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+import pytest
+from django.contrib.auth.models import User
+from rest_framework.test import APIRequestFactory, force_authenticate
+from api.models import MarketData, PriceBar
+from api.services.market_history import MarketHistory
+from api.views import stock_history_view
+
+NOW = datetime(2026, 3, 2, 15, 30, 20, tzinfo=dt_timezone.utc)
+
+
+def add_tick(symbol, price, volume, at):
+    row = MarketData.objects.create(symbol=symbol, current_price=Decimal(price), daily_change=0, volume=volume)
+    MarketData.objects.filter(pk=row.pk).update(timestamp=at)
+
+
+@pytest.fixture
+def history():
+    return MarketHistory(tick_retention_days=7, bar_retention_days={'1m': 30, '1h': 730, '1d': None})
+
+
+@pytest.mark.django_db
+class TestMarketHistory:
+    def test_minute_bars_from_ticks(self, history):
+        minute = NOW.replace(second=0) - timedelta(minutes=2)
+        for offset, price, volume in ((0, '10.00', 100), (10, '12.00', 150), (20, '9.50', 175), (50, '11.00', 200)):
+            add_tick('AAPL', price, volume, minute + timedelta(seconds=offset))
+        add_tick('AAPL', '11.50', 260, minute + timedelta(minutes=1, seconds=5))
+
+        assert history.rollup('1m', NOW - timedelta(minutes=5), NOW) == 2
+
+        first = PriceBar.objects.get(symbol='AAPL', interval='1m', start=minute)
+        assert (first.open, first.high, first.low, first.close) == (
+            Decimal('10.00'), Decimal('12.00'), Decimal('9.50'), Decimal('11.00'))
+        assert first.ticks == 4
+        assert first.volume == 100
+        assert PriceBar.objects.get(start=minute + timedelta(minutes=1)).volume == 60
+
+    def test_sliding_window_keeps_the_oldest_bars_volume(self, history):
+        minute = NOW.replace(second=0) - timedelta(minutes=3)
+        add_tick('AAPL', '10.00', 100, minute - timedelta(seconds=10))
+        add_tick('AAPL', '10.50', 160, minute + timedelta(seconds=5))
+        add_tick('AAPL', '11.00', 190, minute + timedelta(minutes=1, seconds=5))
+
+        history.rollup('1m', minute - timedelta(minutes=1), NOW)
+        # The window slides on: the bar is now the oldest one recomputed
+        history.rollup('1m', minute, NOW)
+
+        assert PriceBar.objects.get(symbol='AAPL', interval='1m', start=minute).volume == 60
+        assert PriceBar.objects.get(symbol='AAPL', interval='1m', start=minute + timedelta(minutes=1)).volume == 30
+
+    def test_rollup_is_idempotent_and_cascades(self, history):
+        start = NOW.replace(minute=0, second=0) - timedelta(hours=1)
+        for minute, price in enumerate(('10.00', '14.00', '8.00', '12.00')):
+            add_tick('MSFT', price, 10 * (minute + 1), start + timedelta(minutes=50 + minute))
+
+        history.rollup_recent(now=start + timedelta(hours=1))
+        history.rollup_recent(now=start + timedelta(hours=1))
+
+        assert PriceBar.objects.filter(interval='1m').count() == 4
+        hour = PriceBar.objects.get(interval='1h')
+        assert (hour.open, hour.high, hour.low, hour.close) == (
+            Decimal('10.00'), Decimal('14.00'), Decimal('8.00'), Decimal('12.00'))
+        assert hour.ticks == 4
+        # Only completed bars are written
+        assert not PriceBar.objects.filter(interval='1d').exists()
+        history.rollup('1d', start, start + timedelta(days=1))
+        assert PriceBar.objects.get(interval='1d').close == Decimal('12.00')
+
+    def test_prune_applies_retention(self, history):
+        add_tick('AAPL', '10.00', 1, NOW - timedelta(days=8))
+        add_tick('AAPL', '11.00', 2, NOW - timedelta(days=1))
+        for interval, age in (('1m', 31), ('1m', 1), ('1d', 3000)):
+            PriceBar.objects.create(symbol='AAPL', interval=interval, start=NOW - timedelta(days=age),
+                                    open=1, high=1, low=1, close=1)
+
+        result = history.prune(now=NOW)
+
+        assert result['ticks'] == 1
+        assert result['bars'] == 1
+        assert MarketData.objects.count() == 1
+        assert PriceBar.objects.count() == 2
+
+    def test_pick_interval(self, history):
+        assert history.pick_interval(NOW - timedelta(hours=6), NOW, now=NOW) == '1m'
+        assert history.pick_interval(NOW - timedelta(days=30), NOW, now=NOW) == '1h'
+        assert history.pick_interval(NOW - timedelta(days=365), NOW, now=NOW) == '1d'
+        # 1-minute bars past their retention are gone; fall back to hourly
+        assert history.pick_interval(NOW - timedelta(days=40), NOW - timedelta(days=39), now=NOW) == '1h'
+
+
+@pytest.mark.django_db
+def test_history_view_serves_bars():
+    user = User.objects.create_user(username='charts', password='testpass123')
+    for day in range(3):
+        PriceBar.objects.create(symbol='AAPL', interval='1d', start=NOW - timedelta(days=100 + day),
+                                open=1, high=2, low=1, close=2)
+
+    request = APIRequestFactory().get('/api/stock-history/aapl/', {'days': 365})
+    force_authenticate(request, user=user)
+    response = stock_history_view(request, symbol='aapl')
+
+    assert response.status_code == 200
+    assert response.data['interval'] == '1d'
+    assert len(response.data['bars']) == 3
+
+    request = APIRequestFactory().get('/api/stock-history/aapl/', {'interval': '5m'})
+    force_authenticate(request, user=user)
+    assert stock_history_view(request, symbol='aapl').status_code == 400
+
+    for days in ('inf', '1e12', 'nan'):
+        request = APIRequestFactory().get('/api/stock-history/aapl/', {'days': days})
+        force_authenticate(request, user=user)
+        assert stock_history_view(request, symbol='aapl').status_code == 400
@@ -0,0 +1,99 @@
+import logging
+
+import pytest
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.test import APIClient
+from api.services import metrics
+from api.services.metrics import Histogram, track_provider_call
+
+
+class TestHistogram:
+    def test_renders_cumulative_buckets(self):
+        histogram = Histogram('test_seconds', 'Test.', ('view',), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5):
+            histogram.observe(value, view='a')
+
+        lines = list(histogram.samples())
+
+        assert lines == [
+            'test_seconds_bucket{view="a",le="0.1"} 1',
+            'test_seconds_bucket{view="a",le="1.0"} 2',
+            'test_seconds_bucket{view="a",le="+Inf"} 3',
+            'test_seconds_sum{view="a"} 5.55',
+            'test_seconds_count{view="a"} 3',
+        ]
+
+
+class TestProviderCalls:
+    def test_counted_against_the_current_request(self):
+        stats, token = metrics.start_request()
+        try:
+            with track_provider_call('example.com'):
+                pass
+            with pytest.raises(ValueError):
+                with track_provider_call('example.com'):
+                    raise ValueError
+        finally:
+            metrics.end_request(token)
+
+        assert stats.provider_calls == 2
+        assert stats.providers['example.com'][0] == 2
+        assert metrics.provider_call_duration.count(provider='example.com', outcome='error') >= 1
+
+    def test_outside_a_request_only_feeds_the_histogram(self):
+        before = metrics.provider_call_duration.count(provider='background', outcome='ok')
+        with track_provider_call('background'):
+            pass
+
+        assert metrics.current_stats() is None
+        assert metrics.provider_call_duration.count(provider='background', outcome='ok') == before + 1
+
+
+@pytest.mark.django_db
+class TestPerformanceMiddleware:
+    VIEW = 'api/stock-history/<str:symbol>/'
+
+    @pytest.fixture
+    def client(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('metrics-user', password='password'))
+        return client
+
+    def test_records_view_and_database_work(self, client):
+        before = metrics.db_queries_per_request.count(view=self.VIEW)
+
+        response = client.get('/api/stock-history/AAPL/?days=1')
+
+        assert response.status_code == 200
+        assert metrics.http_requests.value(view=self.VIEW, method='GET', status=200) >= 1
+        assert metrics.db_queries_per_request.count(view=self.VIEW) == before + 1
+        assert metrics.db_queries_per_request._series[(self.VIEW,)]['sum'] > 0
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_logs_slow_requests_with_breakdown(self, client, caplog):
+        with caplog.at_level(logging.WARNING, logger='api.performance'):
+            client.get('/api/stock-history/AAPL/?days=1')
+
+        assert 'Slow request GET /api/stock-history/AAPL/' in caplog.text
+        assert 'queries' in caplog.text
+
+
+@pytest.mark.django_db
+class TestMetricsEndpoint:
+    def test_exposes_prometheus_text(self, client):
+        client.get('/metrics')
+        response = client.get('/metrics')
+
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        body = response.content.decode()
+        assert '# TYPE http_request_duration_seconds histogram' in body
+        assert 'http_requests_total{view="metrics",method="GET",status="200"}' in body
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_token_when_configured(self, client):
+        assert client.get('/metrics').status_code == 401
+        response = client.get('/metrics', HTTP_AUTHORIZATION='Bearer secret')
+        assert response.status_code == 200
+        assert '# TYPE provider_call_duration_seconds histogram' in response.content.decode()
@@ -0,0 +1,161 @@
+from decimal import Decimal
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.test.utils import override_settings
+from api.benchmarks.websocket import Socket
+from api.models import Portfolio
+from api.routing import websocket_urlpatterns
+from api.services import wire
+from api.services.quote_cache import quote_cache
+from api.services.quote_hub import INGEST_HEARTBEAT_KEY, quote_hub, stock_group_name
+
+
+@pytest.fixture(autouse=True)
+def market(settings):
+    settings.MULTIPLEX_TICK_MS = 20
+    settings.PORTFOLIO_PUSH_WINDOW_MS = 20
+    cache.clear()
+    quote_cache.clear()
+    # Ticks come from the tests, so the quote hub pollers stand down
+    cache.set(INGEST_HEARTBEAT_KEY, 'test', None)
+    layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+    with override_settings(CHANNEL_LAYERS=layers):
+        yield
+    cache.clear()
+    quote_cache.clear()
+
+
+def connect(user=None, query=''):
+    return Socket(URLRouter(websocket_urlpatterns), '/ws/stream/', query, user=user or AnonymousUser())
+
+
+async def tick(symbol, price):
+    await get_channel_layer().group_send(stock_group_name(symbol), {
+        'type': 'stock_update', 'data': {'symbol': symbol, 'price': price},
+    })
+
+
+class TestWire:
+    def test_round_trips_both_encodings(self):
+        message = {'type': 'batch', 'quotes': [{'symbol': 'AAPL', 'price': Decimal('1.50')}]}
+
+        assert wire.decode(text_data=wire.encode(message))['quotes'][0]['price'] == '1.50'
+        if wire.MSGPACK in wire.formats():
+            assert wire.decode(bytes_data=wire.encode(message, wire.MSGPACK))['quotes'][0]['price'] == '1.50'
+
+
+@pytest.mark.django_db
+class TestMultiplexConsumer:
+    def test_batches_updates_for_many_symbols_into_one_frame(self):
+        async def scenario():
+            socket = connect()
+            assert await socket.connect(1)
+            await socket.send_json({'action': 'subscribe', 'symbols': ['AAPL', 'msft', 'TSLA', '123']})
+            ack = await socket.receive_json(1)
+            subscribers = quote_hub.subscriber_count('AAPL')
+
+            for price in (150.0, 151.0):
+                await tick('AAPL', price)
+            await tick('MSFT', 300.0)
+            await tick('GOOG', 100.0)
+            frame = await socket.receive_json(1)
+            quiet = await socket.receive_nothing(0.05)
+
+            await socket.send_json({'action': 'unsubscribe', 'symbols': ['AAPL']})
+            await socket.receive_json(1)
+            await tick('AAPL', 152.0)
+            after = await socket.receive_nothing(0.05)
+            await socket.disconnect()
+            return ack, subscribers, frame, quiet, after
+
+        ack, subscribers, frame, quiet, after = async_to_sync(scenario)()
+
+        assert ack['symbols'] == ['AAPL', 'MSFT', 'TSLA']
+        assert ack['rejected']['symbols'] == ['123']
+        assert subscribers == 1
+        assert frame['type'] == 'batch'
+        assert frame['quotes'] == [{'symbol': 'AAPL', 'price': 151.0}, {'symbol': 'MSFT', 'price': 300.0}]
+        assert quiet and after
+        assert quote_hub.subscriber_count('MSFT') == 0
+
+    def test_msgpack_frames(self):
+        msgpack = pytest.importorskip('msgpack')
+
+        async def scenario():
+            socket = connect(query='format=msgpack')
+            assert await socket.connect(1)
+            await socket.send_input({
+                'type': 'websocket.receive', 'bytes': msgpack.packb({'action': 'subscribe', 'symbols': ['AAPL']}),
+            })
+            ack = await socket.receive_output(1)
+            await tick('AAPL', 150.0)
+            frame = await socket.receive_output(1)
+            await socket.disconnect()
+            return ack, frame
+
+        ack, frame = async_to_sync(scenario)()
+
+        assert msgpack.unpackb(ack['bytes'])['symbols'] == ['AAPL']
+        assert msgpack.unpackb(frame['bytes'])['quotes'] == [{'symbol': 'AAPL', 'price': 150.0}]
+
+    def test_invalid_requests_get_an_error(self):
+        async def scenario():
+            socket = connect()
+            assert await socket.connect(1)
+            await socket.send_json({'action': 'dance'})
+            reply = await socket.receive_json(1)
+            await socket.disconnect()
+            return reply
+
+        assert async_to_sync(scenario)()['type'] == 'error'
+
+
+@pytest.mark.django_db(transaction=True)
+class TestMultiplexedPortfolios:
+    @pytest.fixture
+    def holding(self):
+        user = User.objects.create_user('multiplexer', password='password')
+        quote_cache.set('AAPL', {'symbol': 'AAPL', 'price': 160.0})
+        return Portfolio.objects.create(user=user, stock_symbol='AAPL', quantity=10, purchase_price=Decimal('150.00'))
+
+    def test_portfolio_snapshot_and_deltas_share_frames_with_quotes(self, holding):
+        async def scenario():
+            socket = connect(holding.user)
+            assert await socket.connect(1)
+            await socket.send_json({'action': 'subscribe', 'symbols': ['AAPL'], 'portfolios': [holding.id]})
+            ack = await socket.receive_json(1)
+            first = await socket.receive_json(1)
+            await tick('AAPL', 161.0)
+            second = await socket.receive_json(1)
+            await socket.disconnect()
+            return ack, first, second
+
+        ack, first, second = async_to_sync(scenario)()
+
+        assert ack['portfolios'] == [holding.id]
+        assert first['quotes'] == [{'symbol': 'AAPL', 'price': 160.0}]
+        assert first['portfolios'][0]['type'] == 'portfolio_snapshot'
+        assert first['portfolios'][0]['portfolio'] == holding.id
+        assert second['quotes'] == [{'symbol': 'AAPL', 'price': 161.0}]
+        delta = second['portfolios'][0]
+        assert delta['type'] == 'portfolio_delta'
+        assert delta['seq'] == first['portfolios'][0]['seq'] + 1
+        assert delta['data']['total_value'] == '1610.00'
+
+    def test_portfolios_need_their_owner(self, holding):
+        async def scenario():
+            socket = connect()
+            assert await socket.connect(1)
+            await socket.send_json({'action': 'subscribe', 'portfolios': [holding.id]})
+            ack = await socket.receive_json(1)
+            await socket.disconnect()
+            return ack
+
+        ack = async_to_sync(scenario)()
+        assert ack['portfolios'] == []
+        assert ack['rejected']['portfolios'] == [holding.id]
@@ -0,0 +1,61 @@
+import time
+import pytest
+from django.core import mail
+from django.core.cache import cache
+from api.services import notifications
+from api.services.notifications import NotificationQueue, STATS_KEY
+
+
+def notification(recipient, symbol, message):
+    return {'alert_id': 1, 'recipient': recipient, 'symbol': symbol, 'message': message, 'triggered_at': time.time()}
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    opened = []
+    real_get_connection = notifications.get_connection
+
+    def counting_get_connection(**kwargs):
+        connection = real_get_connection(**kwargs)
+        opened.append(connection)
+        return connection
+
+    monkeypatch.setattr(notifications, 'get_connection', counting_get_connection)
+    return opened
+
+
+class TestNotificationQueue:
+    def test_digest_per_recipient_over_one_connection(self, connections):
+        queue = NotificationQueue(batch_size=2)
+        sent = queue.dispatch([
+            notification('a@example.com', 'AAPL', 'AAPL price is above 150.00'),
+            notification('a@example.com', 'MSFT', 'MSFT volume is above 1000'),
+            notification('b@example.com', 'AAPL', 'AAPL price is above 150.00'),
+            notification('c@example.com', 'TSLA', 'TSLA price is below 200.00'),
+        ])
+
+        assert sent == 3
+        assert len(connections) == 1
+        digest = next(message for message in mail.outbox if message.to == ['a@example.com'])
+        assert digest.subject == 'Stock Alerts: 2 triggered (AAPL, MSFT)'
+        assert digest.body.splitlines() == ['AAPL price is above 150.00', 'MSFT volume is above 1000']
+
+        stats = queue.snapshot()
+        assert stats['batches'] == 2
+        assert stats['latency']['batch']['count'] == 2
+        assert stats['latency']['delivery']['count'] == 4
+        assert cache.get(STATS_KEY)['emails'] == 3
+
+    def test_nothing_to_send_opens_no_connection(self, connections):
+        assert NotificationQueue().dispatch([]) == 0
+        assert connections == []
+
+    def test_failed_batch_is_counted(self, monkeypatch):
+        def broken(self, messages):
+            raise OSError('SMTP down')
+
+        monkeypatch.setattr('django.core.mail.backends.locmem.EmailBackend.send_messages', broken)
+        queue = NotificationQueue(batch_size=10)
+
+        assert queue.dispatch([notification('a@example.com', 'AAPL', 'up')]) == 0
+        assert queue.snapshot()['failed'] == 1
@@ -0,0 +1,146 @@
+import asyncio
+
+from asgiref.sync import async_to_sync
+from api.services.outbox import TRY_AGAIN_LATER, Outbox, connection_stats, outbox_messages, slow_disconnects
+
+
+class Client:
+    """Records sends; ``stall`` blocks every send until released."""
+
+    def __init__(self, stall=False):
+        self.sent = []
+        self.closed = []
+        self.released = asyncio.Event()
+        if not stall:
+            self.released.set()
+
+    async def send(self, message):
+        await self.released.wait()
+        self.sent.append(message)
+
+    async def close(self, code=None):
+        self.closed.append(code)
+
+
+def make_outbox(client, **options):
+    return Outbox(client.send, client.close, 'test', 'test-connection', **{'max_size': 3, 'send_timeout': 1, **options})
+
+
+class TestOutbox:
+    def test_sends_in_order(self):
+        async def scenario():
+            client = Client()
+            outbox = make_outbox(client)
+            outbox.start()
+            for n in range(3):
+                outbox.put({'n': n})
+            await asyncio.sleep(0.01)
+            outbox.stop()
+            return client.sent
+
+        assert async_to_sync(scenario)() == [{'n': 0}, {'n': 1}, {'n': 2}]
+
+    def test_latest_value_wins_per_key(self):
+        async def scenario():
+            client = Client(stall=True)
+            outbox = make_outbox(client)
+            outbox.start()
+            outbox.put({'price': 1}, key='quote')
+            await asyncio.sleep(0.01)
+            # The first is being sent; these wait and replace each other
+            for price in (2, 3, 4):
+                outbox.put({'price': price}, key='quote')
+            stats = outbox.stats()
+            client.released.set()
+            await asyncio.sleep(0.01)
+            outbox.stop()
+            return client.sent, stats
+
+        sent, stats = async_to_sync(scenario)()
+        assert sent == [{'price': 1}, {'price': 4}]
+        assert stats['depth'] == 1
+        assert stats['superseded'] == 2
+
+    def test_lazy_messages_are_built_when_sent(self):
+        async def scenario():
+            client = Client()
+            outbox = make_outbox(client)
+            built = []
+
+            async def build():
+                built.append(len(built))
+                return {'built': built[-1]} if built[-1] == 0 else None
+
+            outbox.put(build, key='delta')
+            outbox.put(build, key='delta')
+            assert built == []
+            outbox.start()
+            await asyncio.sleep(0.01)
+            outbox.put(build, key='delta')
+            await asyncio.sleep(0.01)
+            outbox.stop()
+            return client.sent
+
+        # The second build had nothing to send
+        assert async_to_sync(scenario)() == [{'built': 0}]
+
+    def test_overflow_drops_then_closes_a_chronically_slow_client(self):
+        async def scenario():
+            client = Client(stall=True)
+            outbox = make_outbox(client, slow_grace=0.05)
+            before = slow_disconnects.value(consumer='test', reason='overflow')
+            for n in range(4):
+                outbox.put({'n': n})
+            dropped, first_closes = outbox.counts['overflow'], list(client.closed)
+            await asyncio.sleep(0.06)
+            outbox.put({'n': 5})
+            await asyncio.sleep(0.01)
+            return dropped, first_closes, client.closed, slow_disconnects.value(consumer='test', reason='overflow') - before
+
+        dropped, first_closes, closed, disconnects = async_to_sync(scenario)()
+        assert dropped == 1
+        assert first_closes == []
+        assert closed == [TRY_AGAIN_LATER]
+        assert disconnects == 1
+
+    def test_strict_outbox_closes_on_first_overflow(self):
+        async def scenario():
+            client = Client(stall=True)
+            outbox = make_outbox(client, strict=True)
+            for n in range(4):
+                outbox.put({'n': n})
+            await asyncio.sleep(0.01)
+            return client.closed, outbox.put({'n': 5})
+
+        closed, accepted = async_to_sync(scenario)()
+        assert closed == [TRY_AGAIN_LATER]
+        assert not accepted
+
+    def test_blocked_send_times_out(self):
+        async def scenario():
+            client = Client(stall=True)
+            outbox = make_outbox(client, send_timeout=0.02)
+            outbox.start()
+            outbox.put({'n': 0})
+            await asyncio.sleep(0.05)
+            return client.closed, outbox.closed
+
+        assert async_to_sync(scenario)() == ([TRY_AGAIN_LATER], True)
+
+    def test_exports_per_connection_stats(self):
+        async def scenario():
+            client = Client(stall=True)
+            outbox = make_outbox(client)
+            outbox.put({'n': 0})
+            stats = [stats for stats in connection_stats() if stats['connection'] == 'test-connection']
+            outbox.stop()
+            return stats, [stats for stats in connection_stats() if stats['connection'] == 'test-connection']
+
+        before = outbox_messages.value(consumer='test', outcome='sent')
+        open_stats, closed_stats = async_to_sync(scenario)()
+        assert open_stats == [{
+            'consumer': 'test', 'connection': 'test-connection', 'depth': 1, 'peak_depth': 1,
+            'sent': 0, 'superseded': 0, 'overflow': 0,
+        }]
+        assert closed_stats == []
+        assert outbox_messages.value(consumer='test', outcome='sent') == before
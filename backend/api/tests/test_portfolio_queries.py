@@ -0,0 +1,116 @@
+from datetime import timedelta
+from decimal import Decimal
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory, force_authenticate
+from api.models import LatestQuote, MarketData, Portfolio
+from api.services.market_prices import current_quotes, latest_prices, record_ticks, stored_quotes
+from api.services.quote_cache import quote_cache
+from api.views import PortfolioViewSet
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    quote_cache.clear()
+    yield
+    quote_cache.clear()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username='holder', password='testpass123')
+
+
+def add_holdings(user, count):
+    Portfolio.objects.bulk_create([
+        Portfolio(user=user, stock_symbol=f'S{i:04d}', purchase_price=Decimal('10.00'), quantity=2)
+        for i in range(count)
+    ])
+    for price in ('11.00', '12.50'):
+        record_ticks([{'symbol': f'S{i:04d}', 'price': price} for i in range(count)])
+
+
+def list_portfolio(user):
+    request = APIRequestFactory().get('/api/portfolio/')
+    force_authenticate(request, user=user)
+    with CaptureQueriesContext(connection) as queries:
+        response = PortfolioViewSet.as_view({'get': 'list'})(request)
+        response.render()
+    return response, len(queries)
+
+
+@pytest.mark.django_db
+class TestPortfolioListQueries:
+    @pytest.mark.parametrize('holdings', [1, 20, 200])
+    def test_query_count_is_constant(self, user, holdings):
+        add_holdings(user, holdings)
+        response, queries = list_portfolio(user)
+
+        assert len(response.data) == holdings
+        # The holdings themselves plus one latest-price query
+        assert queries == 2
+
+    def test_latest_price_is_used(self, user):
+        add_holdings(user, 1)
+        response, _ = list_portfolio(user)
+
+        assert response.data[0]['current_price'] == '12.50'
+        assert response.data[0]['profit_loss'] == '5.00'
+
+    def test_quote_cache_preferred_over_stored_rows(self, user):
+        add_holdings(user, 1)
+        quote_cache.set('S0000', {'symbol': 'S0000', 'price': 13.0})
+
+        response, queries = list_portfolio(user)
+
+        assert response.data[0]['current_price'] == '13.00'
+        assert queries == 1
+
+    def test_cached_prices_are_rendered_in_cents(self, user):
+        add_holdings(user, 1)
+        quote_cache.set('S0000', {'symbol': 'S0000', 'price': 13.456})
+
+        response, _ = list_portfolio(user)
+
+        assert response.data[0]['current_price'] == '13.46'
+        assert response.data[0]['profit_loss'] == '6.92'
+
+    def test_unpriced_holding_falls_back_to_purchase_price(self, user):
+        Portfolio.objects.create(user=user, stock_symbol='NONE', purchase_price=Decimal('10.00'), quantity=1)
+        response, _ = list_portfolio(user)
+
+        assert response.data[0]['current_price'] == '10.00'
+        assert response.data[0]['profit_loss'] == '0.00'
+
+
+@pytest.mark.django_db
+class TestLatestQuote:
+    def test_ticks_upsert_one_row_per_symbol(self):
+        record_ticks([{'symbol': 'AAPL', 'price': 1.0}, {'symbol': 'MSFT', 'price': 2.0, 'volume': 10}])
+        record_ticks([{'symbol': 'AAPL', 'price': 3.0, 'change': 2.0}])
+
+        assert MarketData.objects.count() == 3
+        assert LatestQuote.objects.count() == 2
+        quote = LatestQuote.objects.get(pk='AAPL').as_quote()
+        assert quote['price'] == 3.0
+        assert quote['previous_close'] == 1.0
+        assert latest_prices(['AAPL', 'MSFT', 'NONE']) == {'AAPL': Decimal('3.00'), 'MSFT': Decimal('2.00')}
+
+    def test_stale_rows_are_not_current(self):
+        record_ticks([{'symbol': 'AAPL', 'price': 1.0}])
+        LatestQuote.objects.update(timestamp=timezone.now() - timedelta(hours=1))
+
+        assert stored_quotes(['AAPL'], max_age=60) == {}
+        assert 'AAPL' in stored_quotes(['AAPL'])
+
+    def test_current_quotes_prefer_stored_rows_over_providers(self):
+        record_ticks([{'symbol': 'AAPL', 'price': 5.0}])
+
+        quotes = current_quotes(['AAPL'])
+        assert quotes['AAPL']['price'] == 5.0
+        assert quote_cache.peek('AAPL')['price'] == 5.0
@@ -0,0 +1,177 @@
+from decimal import Decimal
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test.utils import override_settings
+from api.benchmarks.websocket import Socket
+from api.models import Portfolio
+from api.routing import websocket_urlpatterns
+from api.services.portfolio_stream import PortfolioStream, diff_documents
+from api.services.quote_cache import quote_cache
+from api.services.quote_hub import INGEST_HEARTBEAT_KEY, stock_group_name
+from api.services.valuation import Holdings
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    quote_cache.clear()
+    yield
+    cache.clear()
+    quote_cache.clear()
+
+
+def make_stream(prices=None):
+    holdings = Holdings.from_rows([
+        (1, 10, 'AAPL', 10, Decimal('150.00')),
+        (2, 10, 'MSFT', 5, Decimal('300.00')),
+    ])
+    return PortfolioStream(10, holdings, prices or {'AAPL': 160.0, 'MSFT': 310.0})
+
+
+class TestDiff:
+    def test_only_changed_fields(self):
+        stream = make_stream()
+        old = stream.snapshot()
+        stream.reprice('AAPL', 161.0)
+
+        delta = diff_documents(old, stream.current())
+
+        assert delta['total_value'] == Decimal('3160.00')
+        assert 'total_cost' not in delta
+        # The other holding's weight moves with the total
+        assert delta['investments'] == [
+            {'id': 1, 'current_price': Decimal('161.00'), 'value': Decimal('1610.00'),
+             'gain_loss': Decimal('110.00'), 'weight': pytest.approx(1610 / 3160, abs=1e-6)},
+            {'id': 2, 'weight': pytest.approx(1550 / 3160, abs=1e-6)},
+        ]
+
+    def test_added_and_removed_holdings(self):
+        old = make_stream().current()
+        new = {**old, 'investments': old['investments'][:1] + [{'id': 3, 'symbol': 'TSLA'}]}
+
+        delta = diff_documents(old, new)
+
+        assert delta == {'investments': [{'id': 3, 'symbol': 'TSLA'}], 'removed': [2]}
+
+
+class TestPortfolioStream:
+    def test_unchanged_prices_produce_no_delta(self):
+        stream = make_stream()
+        stream.snapshot()
+
+        assert not stream.reprice('AAPL', 160.0)
+        assert not stream.reprice('TSLA', 99.0)
+        assert stream.advance() is None
+        assert stream.seq == 1
+
+    def test_resume_replays_missed_deltas(self, settings):
+        settings.PORTFOLIO_RESUME_LOG = 2
+        stream = make_stream()
+        stream.snapshot()
+        for price in (161.0, 162.0, 163.0):
+            stream.reprice('AAPL', price)
+            stream.advance()
+        async_to_sync(stream.asave)()
+
+        def resume(stream_id, since, user_id=10):
+            resumed = make_stream()
+            resumed.user_id = user_id
+            return async_to_sync(resumed.aresume)(stream_id, since)
+
+        assert [seq for seq, _ in resume(stream.id, 2)] == [3, 4]
+        assert resume(stream.id, 4) == []
+        # Older than the log, unknown, or another user's stream
+        assert resume(stream.id, 1) is None
+        assert resume('unknown', 2) is None
+        assert resume(stream.id, 2, user_id=11) is None
+
+
+@pytest.mark.django_db(transaction=True)
+class TestPortfolioConsumer:
+    @pytest.fixture
+    def portfolio(self, settings):
+        settings.PORTFOLIO_PUSH_WINDOW_MS = 20
+        user = User.objects.create_user('streamer', password='password')
+        holding = Portfolio.objects.create(user=user, stock_symbol='AAPL', quantity=10, purchase_price=Decimal('150.00'))
+        Portfolio.objects.create(user=user, stock_symbol='MSFT', quantity=5, purchase_price=Decimal('300.00'))
+        quote_cache.set('AAPL', {'symbol': 'AAPL', 'price': 160.0})
+        quote_cache.set('MSFT', {'symbol': 'MSFT', 'price': 310.0})
+        # Ticks come from the test, so the quote hub pollers stand down
+        cache.set(INGEST_HEARTBEAT_KEY, 'test', None)
+        layers = {'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}}
+        with override_settings(CHANNEL_LAYERS=layers):
+            yield user, holding
+
+    def connect(self, user, holding, query=''):
+        return Socket(URLRouter(websocket_urlpatterns), f'/ws/portfolio/{holding.id}/', query, user=user)
+
+    async def tick(self, symbol, price):
+        await get_channel_layer().group_send(stock_group_name(symbol), {
+            'type': 'stock_update', 'data': {'symbol': symbol, 'price': price},
+        })
+
+    def test_snapshot_then_coalesced_deltas(self, portfolio):
+        async def scenario():
+            socket = self.connect(*portfolio)
+            assert await socket.connect(1)
+            snapshot = await socket.receive_json(1)
+
+            for price in (161.0, 162.0, 163.0):
+                await self.tick('AAPL', price)
+            await self.tick('MSFT', 310.0)
+            delta = await socket.receive_json(1)
+            quiet = await socket.receive_nothing(0.1)
+            await socket.disconnect()
+            return snapshot, delta, quiet
+
+        snapshot, delta, quiet = async_to_sync(scenario)()
+
+        assert snapshot['type'] == 'portfolio_snapshot'
+        assert snapshot['data']['total_value'] == '3150.00'
+        assert len(snapshot['data']['investments']) == 2
+        assert delta['type'] == 'portfolio_delta'
+        assert delta['seq'] == snapshot['seq'] + 1
+        assert delta['stream'] == snapshot['stream']
+        assert delta['data']['total_value'] == '3180.00'
+        assert [record.get('current_price') for record in delta['data']['investments']] == ['163.00', None]
+        assert quiet
+
+    def test_reconnect_resumes_the_stream(self, portfolio):
+        async def scenario():
+            socket = self.connect(*portfolio)
+            assert await socket.connect(1)
+            snapshot = await socket.receive_json(1)
+            await self.tick('AAPL', 161.0)
+            first = await socket.receive_json(1)
+            await self.tick('AAPL', 162.0)
+            await socket.receive_json(1)
+            await socket.disconnect()
+
+            # Missed the last delta; the price moved again while away
+            quote_cache.set('AAPL', {'symbol': 'AAPL', 'price': 170.0})
+            resumed = self.connect(*portfolio, query=f"stream={snapshot['stream']}&since={first['seq']}")
+            assert await resumed.connect(1)
+            replayed = [await resumed.receive_json(1), await resumed.receive_json(1)]
+            await resumed.disconnect()
+            return first, replayed
+
+        first, replayed = async_to_sync(scenario)()
+
+        assert [message['type'] for message in replayed] == ['portfolio_delta', 'portfolio_delta']
+        assert [message['seq'] for message in replayed] == [first['seq'] + 1, first['seq'] + 2]
+        assert replayed[0]['data']['investments'][0]['current_price'] == '162.00'
+        assert replayed[1]['data']['investments'][0]['current_price'] == '170.00'
+
+    def test_rejects_other_users_portfolio(self, portfolio):
+        _, holding = portfolio
+        stranger = User.objects.create_user('stranger', password='password')
+
+        async def scenario():
+            return await self.connect(stranger, holding).connect(1)
+
+        assert not async_to_sync(scenario)()
@@ -0,0 +1,183 @@
+import asyncio
+import pandas as pd
+import pytest
+from asgiref.sync import async_to_sync
+from unittest.mock import patch
+from api.services.providers import HttpClient, ProviderChain, ProviderError, MarketDataProvider, fetch_quotes_bulk
+
+
+class FakeProvider(MarketDataProvider):
+    def __init__(self, label, price=None, results=None, error=False, delay=0):
+        super().__init__(client=object())
+        self.name = label.lower().replace(' ', '_')
+        self.label = label
+        self.price = price
+        self.results = results or []
+        self.error = error
+        self.delay = delay
+        self.calls = 0
+
+    async def get_quote(self, symbol):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise ProviderError(f"{self.label} down")
+        return self.price
+
+    async def search(self, query):
+        if self.error:
+            raise ProviderError(f"{self.label} down")
+        return self.results
+
+
+class TestHttpClient:
+    def test_one_session_per_loop_and_none_for_closed_loops(self):
+        client = HttpClient()
+
+        async def sessions():
+            return client.session(), client.session()
+
+        first, again = async_to_sync(sessions)()
+        for _ in range(5):
+            async_to_sync(sessions)()
+
+        assert first is again
+        # Every async_to_sync call above ran on a loop that is closed now
+        assert len(client._sessions) == 1
+
+
+class TestProviderChain:
+    def test_first_provider_wins(self):
+        primary = FakeProvider('Finnhub', price=101.5)
+        secondary = FakeProvider('Alpha Vantage', price=99.0)
+        chain = ProviderChain([primary, secondary], [])
+
+        assert asyncio.run(chain.get_price('AAPL')) == (101.5, 'Finnhub')
+        assert secondary.calls == 0
+
+    def test_falls_back_on_empty_quote_and_errors(self):
+        chain = ProviderChain([
+            FakeProvider('Finnhub', price=0),
+            FakeProvider('Twelve Data', error=True),
+            FakeProvider('Alpha Vantage', price=99.0),
+        ], [])
+
+        assert asyncio.run(chain.get_price('AAPL')) == (99.0, 'Alpha Vantage')
+
+    def test_all_providers_miss(self):
+        chain = ProviderChain([FakeProvider('Finnhub'), FakeProvider('Alpha Vantage')], [])
+
+        assert asyncio.run(chain.get_price('ZZZZ')) == (None, 'Alpha Vantage')
+
+    def test_search_falls_back(self):
+        chain = ProviderChain([], [
+            FakeProvider('Finnhub', error=True),
+            FakeProvider('Alpha Vantage', results=[('AAPL', 'Apple Inc.')]),
+        ])
+
+        assert asyncio.run(chain.search_symbol('apple')) == ('AAPL', 'Apple Inc.')
+
+
+class TestHedgedQuotes:
+    def test_hedge_fires_after_delay_and_cancels_loser(self):
+        slow = FakeProvider('Finnhub', price=101.5, delay=1)
+        fast = FakeProvider('Alpha Vantage', price=99.0)
+        chain = ProviderChain([slow, fast], [], mode='hedged', hedge_delay=0.01)
+
+        assert asyncio.run(chain.get_price('AAPL')) == (99.0, 'Alpha Vantage')
+        assert chain.latency.wins == {'alpha_vantage': 1}
+        # The cancelled primary is not counted as a latency sample
+        assert chain.latency.count('finnhub') == 0
+
+    def test_hedge_not_needed_when_primary_is_fast(self):
+        primary = FakeProvider('Finnhub', price=101.5)
+        secondary = FakeProvider('Alpha Vantage', price=99.0)
+        chain = ProviderChain([primary, secondary], [], mode='hedged', hedge_delay=0.5)
+
+        assert asyncio.run(chain.get_price('AAPL')) == (101.5, 'Finnhub')
+        assert secondary.calls == 0
+
+    def test_empty_primary_starts_secondary_immediately(self):
+        chain = ProviderChain([
+            FakeProvider('Finnhub', price=0),
+            FakeProvider('Alpha Vantage', price=99.0),
+        ], [], mode='hedged', hedge_delay=5)
+
+        assert asyncio.run(asyncio.wait_for(chain.get_price('AAPL'), 1)) == (99.0, 'Alpha Vantage')
+
+    def test_malformed_quote_is_a_miss(self):
+        class Malformed(FakeProvider):
+            async def get_quote(self, symbol):
+                return float({'c': 'N/A'}['c'])
+
+        for mode in ('race', 'hedged', 'sequential'):
+            chain = ProviderChain([Malformed('Finnhub'), FakeProvider('Alpha Vantage', price=99.0, delay=0.01)], [],
+                                  mode=mode, hedge_delay=5)
+
+            assert asyncio.run(chain.get_price('AAPL')) == (99.0, 'Alpha Vantage')
+
+    def test_race_starts_all_providers(self):
+        providers = [
+            FakeProvider('Finnhub', price=101.5, delay=0.05),
+            FakeProvider('Twelve Data', error=True),
+            FakeProvider('Alpha Vantage', price=99.0, delay=0.01),
+        ]
+        chain = ProviderChain(providers, [], mode='race')
+
+        assert asyncio.run(chain.get_price('AAPL')) == (99.0, 'Alpha Vantage')
+        assert all(provider.calls == 1 for provider in providers)
+
+    def test_hedge_delay_tracks_p95(self):
+        chain = ProviderChain([FakeProvider('Finnhub')], [], mode='hedged',
+                              hedge_delay=0.3, min_hedge_delay=0.05, max_hedge_delay=2.0)
+        provider = chain.quote_providers[0]
+        assert chain.hedge_delay(provider) == 0.3
+
+        for i in range(100):
+            chain.latency.record('finnhub', (i + 1) / 100)
+        assert chain.hedge_delay(provider) == pytest.approx(0.95, abs=0.01)
+
+
+def make_download(symbols):
+    """Multi-ticker frame shaped like yf.download(..., group_by='ticker')."""
+    index = pd.to_datetime(['2025-02-20', '2025-02-21'])
+    frames = {}
+    for i, symbol in enumerate(symbols):
+        base = 100.0 + i
+        frames[symbol] = pd.DataFrame({
+            'Open': [base, base + 1], 'High': [base + 2, base + 3], 'Low': [base - 1, base],
+            'Close': [base, base + 2], 'Adj Close': [base, base + 2], 'Volume': [1000, 2000],
+        }, index=index)
+    return pd.concat(frames, axis=1)
+
+
+class TestBulkQuotes:
+    @patch('api.services.providers.yf.download')
+    def test_one_download_per_batch(self, mock_download, settings):
+        settings.FINNHUB_API_KEY = None
+        mock_download.side_effect = lambda symbols, **kwargs: make_download(symbols)
+        symbols = [f'S{i}' for i in range(250)]
+
+        quotes = fetch_quotes_bulk(symbols + symbols[:10], batch_size=100)
+
+        assert mock_download.call_count == 3
+        assert len(quotes) == 250
+        assert quotes['S1'] == {
+            'symbol': 'S1', 'price': 103.0, 'change': 2.0, 'previous_close': 101.0,
+            'volume': 2000, 'high': 104.0, 'low': 101.0, 'source': 'Yahoo Finance',
+        }
+
+    @patch('api.services.providers._finnhub_snapshots')
+    @patch('api.services.providers.yf.download')
+    def test_gaps_fall_back_to_finnhub(self, mock_download, mock_finnhub, settings):
+        settings.FINNHUB_API_KEY = 'key'
+        mock_download.return_value = make_download(['AAPL', 'MSFT'])
+
+        async def finnhub(symbols):
+            return {symbol: {'symbol': symbol, 'price': 1.0} for symbol in symbols}
+        mock_finnhub.side_effect = finnhub
+
+        quotes = fetch_quotes_bulk(['AAPL', 'MSFT', 'BRKB'])
+
+        assert set(quotes) == {'AAPL', 'MSFT', 'BRKB'}
+        assert mock_finnhub.call_args[0][0] == ['BRKB']
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+import pytest
+from django.core.cache import cache
+from api.services.quote_cache import QuoteCache
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+class CountingLoader:
+    def __init__(self, delay=0):
+        self.calls = 0
+        self.delay = delay
+        self.lock = threading.Lock()
+
+    def __call__(self, symbol):
+        with self.lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return {'symbol': symbol, 'price': 100.0 + self.calls}
+
+
+class TestQuoteCache:
+    def test_l1_then_l2_hits(self):
+        loader = CountingLoader()
+        quotes = QuoteCache(loader=loader, soft_ttl=60, hard_ttl=300)
+
+        assert quotes.get('AAPL')['price'] == 101.0
+        assert quotes.get('AAPL')['price'] == 101.0
+        assert loader.calls == 1
+
+        # A second process shares the Redis tier
+        other = QuoteCache(loader=loader, soft_ttl=60, hard_ttl=300)
+        assert other.get('AAPL')['price'] == 101.0
+        assert loader.calls == 1
+        assert quotes.stats()['l1_hits'] == 1
+        assert other.stats()['l2_hits'] == 1
+
+    def test_lru_is_bounded(self):
+        quotes = QuoteCache(loader=CountingLoader(), max_entries=2)
+        for symbol in ('AAPL', 'MSFT', 'TSLA'):
+            quotes.get(symbol)
+        assert quotes.stats()['entries'] == 2
+
+    def test_stale_served_while_one_refresh_runs(self):
+        loader = CountingLoader(delay=0.05)
+        quotes = QuoteCache(loader=loader, soft_ttl=0, hard_ttl=300)
+        quotes.get('AAPL')
+
+        results = [quotes.get('AAPL') for _ in range(20)]
+        assert all(result['price'] == 101.0 for result in results)
+        time.sleep(0.2)
+
+        assert loader.calls == 2
+        assert quotes.stats()['stale_served'] == 20
+        assert quotes.stats()['refreshes'] == 1
+        assert quotes.peek('AAPL')['price'] == 102.0
+
+    def test_single_flight_on_miss(self):
+        loader = CountingLoader(delay=0.1)
+        quotes = QuoteCache(loader=loader, soft_ttl=60, hard_ttl=300)
+
+        threads = [threading.Thread(target=quotes.get, args=('AAPL',)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert loader.calls == 1
+        assert quotes.stats()['coalesced'] == 9
+
+    def test_async_single_flight(self):
+        calls = []
+
+        async def loader(symbol):
+            calls.append(symbol)
+            await asyncio.sleep(0.05)
+            return {'symbol': symbol, 'price': 99.0}
+
+        quotes = QuoteCache(soft_ttl=60, hard_ttl=300)
+
+        async def scenario():
+            return await asyncio.gather(*[quotes.aget('MSFT', loader) for _ in range(10)])
+
+        results = asyncio.run(scenario())
+        assert all(result['price'] == 99.0 for result in results)
+        assert calls == ['MSFT']
+
+    def test_async_loads_on_separate_loops(self):
+        # As under WSGI/runserver, where each async view runs on a loop of its own
+        async def loader(symbol):
+            await asyncio.sleep(0.1)
+            return {'symbol': symbol, 'price': 99.0}
+
+        quotes = QuoteCache(soft_ttl=60, hard_ttl=300)
+        results, errors = [], []
+
+        def request():
+            try:
+                results.append(asyncio.run(quotes.aget('MSFT', loader)))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=request) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        assert [result['price'] for result in results] == [99.0, 99.0]
+
+    def test_failed_load_is_not_cached(self):
+        quotes = QuoteCache(loader=lambda symbol: None)
+        assert quotes.get('ZZZZ') is None
+        assert quotes.peek('ZZZZ') is None
+
+    def test_other_processes_stop_waiting_on_a_failed_load(self):
+        loader = CountingLoader(delay=0.1)
+        unknown = lambda symbol: loader(symbol) and None
+        first = QuoteCache(loader=unknown, lock_ttl=5)
+        second = QuoteCache(loader=unknown, lock_ttl=5)
+
+        holder = threading.Thread(target=first.get, args=('ZZZZ',))
+        holder.start()
+        time.sleep(0.02)
+        started = time.monotonic()
+        assert second.get('ZZZZ') is None
+        waited = time.monotonic() - started
+        holder.join()
+
+        # Loads itself once the holder lets go, instead of waiting out the lock
+        assert waited < 1
+        assert loader.calls == 2
+
+    def test_bulk_load_only_missing_symbols(self):
+        loaded = []
+
+        def bulk_loader(symbols):
+            loaded.append(list(symbols))
+            return {symbol: {'symbol': symbol, 'price': 10.0} for symbol in symbols if symbol != 'ZZZZ'}
+
+        quotes = QuoteCache(soft_ttl=60, hard_ttl=300)
+        quotes.set('AAPL', {'symbol': 'AAPL', 'price': 150.0})
+
+        result = quotes.get_or_load_many(['AAPL', 'MSFT', 'TSLA', 'MSFT', 'ZZZZ'], bulk_loader=bulk_loader)
+
+        assert loaded == [['MSFT', 'TSLA', 'ZZZZ']]
+        assert result['AAPL']['price'] == 150.0
+        assert set(result) == {'AAPL', 'MSFT', 'TSLA'}
+        assert quotes.get_or_load_many(['MSFT', 'TSLA'], bulk_loader=bulk_loader).keys() == {'MSFT', 'TSLA'}
+        assert len(loaded) == 1
@@ -0,0 +1,134 @@
+import asyncio
+import pytest
+from django.core.cache import cache
+from api.services.quote_hub import INGEST_HEARTBEAT_KEY, QuoteHub, watched_symbols
+
+
+class FakeChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def make_hub(calls, layer):
+    def fetcher(symbol):
+        calls.append(symbol)
+        return {'symbol': symbol, 'price': 150.0}
+    return QuoteHub(fetcher=fetcher, interval=0.01, channel_layer=layer)
+
+
+class TestQuoteHub:
+    def test_single_poller_per_symbol(self):
+        calls, layer = [], FakeChannelLayer()
+        hub = make_hub(calls, layer)
+
+        async def scenario():
+            for _ in range(50):
+                await hub.subscribe('AAPL')
+            await asyncio.sleep(0.05)
+            metrics = hub.metrics()
+            for _ in range(50):
+                await hub.unsubscribe('AAPL')
+            return metrics
+
+        metrics = asyncio.run(scenario())
+        assert metrics['subscribers'] == 50
+        assert metrics['pollers'] == 1
+        assert layer.sent
+        assert all(group == 'stock_group_AAPL' for group, _ in layer.sent)
+        assert layer.sent[0][1] == {'type': 'stock_update', 'data': {'symbol': 'AAPL', 'price': 150.0}}
+        # One fetch per interval, not one per subscriber
+        assert len(calls) < 50
+
+    def test_poller_stops_with_last_subscriber(self):
+        calls, layer = [], FakeChannelLayer()
+        hub = make_hub(calls, layer)
+
+        async def scenario():
+            await hub.subscribe('MSFT')
+            await hub.subscribe('MSFT')
+            await hub.unsubscribe('MSFT')
+            assert hub.metrics()['pollers'] == 1
+            await hub.unsubscribe('MSFT')
+            polls = len(calls)
+            await asyncio.sleep(0.05)
+            return polls
+
+        polls = asyncio.run(scenario())
+        assert hub.metrics()['pollers'] == 0
+        assert hub.subscriber_count('MSFT') == 0
+        assert len(calls) == polls
+        assert cache.get('quote_hub_lease_MSFT') is None
+
+    def test_only_lease_holder_fetches(self):
+        calls, layer = [], FakeChannelLayer()
+        leader = make_hub(calls, layer)
+        follower = make_hub(calls, layer)
+
+        async def scenario():
+            await leader.subscribe('TSLA')
+            await asyncio.sleep(0.005)
+            await follower.subscribe('TSLA')
+            await asyncio.sleep(0.05)
+            await follower.unsubscribe('TSLA')
+            await leader.unsubscribe('TSLA')
+
+        asyncio.run(scenario())
+        assert leader.stats['polls'] > 0
+        assert follower.stats['polls'] == 0
+        assert follower.stats['lease_skips'] > 0
+
+    def test_stands_down_while_ingest_runs(self):
+        calls, layer = [], FakeChannelLayer()
+        hub = make_hub(calls, layer)
+        cache.set(INGEST_HEARTBEAT_KEY, 'ingest-worker', 60)
+
+        async def scenario():
+            await hub.subscribe('NVDA')
+            await asyncio.sleep(0.03)
+            await hub.unsubscribe('NVDA')
+
+        asyncio.run(scenario())
+        assert calls == []
+        assert hub.stats['ingest_skips'] > 0
+        # Subscriptions are registered for the ingest worker to pick up
+        assert watched_symbols() == ['NVDA']
+
+    def test_polling_survives_a_cache_error(self, monkeypatch):
+        calls, layer = [], FakeChannelLayer()
+        hub = make_hub(calls, layer)
+
+        class FlakyCache:
+            failed = False
+
+            def __getattr__(self, name):
+                return getattr(cache, name)
+
+            async def aget(self, key, default=None):
+                if not self.failed:
+                    self.failed = True
+                    raise ConnectionError('Redis went away')
+                return await cache.aget(key, default)
+
+        monkeypatch.setattr('api.services.quote_hub.cache', FlakyCache())
+
+        async def scenario():
+            await hub.subscribe('AMD')
+            await asyncio.sleep(0.05)
+            poller = hub._pollers['AMD']
+            await hub.unsubscribe('AMD')
+            return poller
+
+        poller = asyncio.run(scenario())
+        assert hub.stats['errors'] == 1
+        assert hub.stats['polls'] > 0
+        assert calls and poller.cancelled()
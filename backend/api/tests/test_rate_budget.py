@@ -0,0 +1,103 @@
+import asyncio
+import time
+
+import pytest
+from unittest.mock import AsyncMock
+from api.services import rate_budget
+from api.services.providers import AlphaVantageProvider, ProviderError
+from api.services.rate_budget import BACKGROUND, INTERACTIVE, BudgetExhausted, CallBudget, parse_rate
+
+
+def budget(rate='3/minute', **options):
+    return CallBudget(limits={'alpha_vantage': rate}, reserve=options.pop('reserve', 0.4),
+                      max_wait={INTERACTIVE: 0, BACKGROUND: 0}, **options)
+
+
+class TestCallBudget:
+    def test_parse_rate(self):
+        assert parse_rate('5/minute') == (5, 60)
+        assert parse_rate('100/s') == (100, 1)
+        assert parse_rate('500/day') == (500, 86400)
+
+    def test_grants_up_to_the_limit(self):
+        calls = budget()
+        for _ in range(3):
+            calls.acquire('alpha_vantage')
+
+        with pytest.raises(BudgetExhausted):
+            calls.acquire('alpha_vantage')
+        assert calls.snapshot()['alpha_vantage'] == {'limit': '3/60s', 'granted': 3, 'denied': 1, 'tokens': 0.0}
+
+    def test_unlimited_providers_pass_through(self):
+        calls = budget()
+        for _ in range(10):
+            calls.acquire('yfinance')
+        assert 'yfinance' not in calls.snapshot()
+
+    def test_background_leaves_a_reserve(self):
+        calls = budget(rate='5/minute')
+        for _ in range(3):
+            calls.acquire('alpha_vantage', priority=BACKGROUND)
+        with pytest.raises(BudgetExhausted):
+            calls.acquire('alpha_vantage', priority=BACKGROUND)
+
+        # The reserve is still there for interactive callers
+        for _ in range(2):
+            calls.acquire('alpha_vantage', priority=INTERACTIVE)
+
+    def test_waiting_interactive_caller_preempts_background(self):
+        calls = budget(rate='20/second', reserve=0)
+        for _ in range(20):
+            calls.acquire('alpha_vantage')
+        with pytest.raises(BudgetExhausted):
+            calls.acquire('alpha_vantage')
+
+        time.sleep(0.06)
+        # Refilled, but an interactive caller was short first
+        with pytest.raises(BudgetExhausted):
+            calls.acquire('alpha_vantage', priority=BACKGROUND)
+        calls.acquire('alpha_vantage')
+
+    def test_waits_for_a_refill_within_max_wait(self):
+        calls = budget(rate='50/second')
+        for _ in range(50):
+            calls.acquire('alpha_vantage')
+
+        started = time.monotonic()
+        calls.acquire('alpha_vantage', max_wait=1)
+        assert 0.01 <= time.monotonic() - started < 0.5
+
+    def test_keys_get_separate_buckets(self):
+        calls = budget(rate='1/minute')
+        calls.acquire('alpha_vantage', 'key-a')
+        calls.acquire('alpha_vantage', 'key-b')
+        with pytest.raises(BudgetExhausted):
+            calls.acquire('alpha_vantage', 'key-a')
+
+    def test_priority_follows_the_context(self):
+        calls = budget(rate='5/minute')
+
+        async def refresh():
+            with rate_budget.background():
+                for _ in range(4):
+                    await calls.aacquire('alpha_vantage')
+
+        with pytest.raises(BudgetExhausted):
+            asyncio.run(refresh())
+        assert rate_budget.current_priority() == INTERACTIVE
+        assert rate_budget.budget_requests.value(
+            provider='alpha_vantage', priority=BACKGROUND, outcome='denied',
+        ) >= 1
+
+
+class TestProviderBudget:
+    def test_exhausted_budget_is_a_provider_error(self, monkeypatch):
+        monkeypatch.setattr('api.services.providers.call_budget', budget(rate='1/minute'))
+        client = AsyncMock()
+        client.get_json.return_value = {'Global Quote': {'05. price': '10.5'}}
+        provider = AlphaVantageProvider(client)
+
+        assert asyncio.run(provider.get_quote('AAPL')) == 10.5
+        with pytest.raises(ProviderError):
+            asyncio.run(provider.get_quote('AAPL'))
+        assert client.get_json.await_count == 1
@@ -0,0 +1,135 @@
+import time
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.test import AsyncClient
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from api.services import rate_limit
+from api.services.rate_limit import RateLimiter
+from api.throttling import ScopedGCRAThrottle, UserGCRAThrottle
+from api.utils import RateLimitMixin
+
+
+class TestRateLimiter:
+    def test_allows_a_burst_of_limit_then_denies(self):
+        limiter = RateLimiter()
+        decisions = [limiter.check('client', 3, 60) for _ in range(4)]
+
+        assert [d.allowed for d in decisions] == [True, True, True, False]
+        assert 19 < decisions[-1].retry_after <= 20
+
+    def test_requests_are_spaced_by_the_emission_interval(self):
+        limiter = RateLimiter()
+        for _ in range(20):
+            assert limiter.check('client', 20, 1).allowed
+        assert not limiter.check('client', 20, 1).allowed
+
+        time.sleep(0.06)
+        assert limiter.check('client', 20, 1).allowed
+        assert not limiter.check('client', 20, 1).allowed
+
+    def test_denied_clients_are_rejected_locally(self):
+        limiter = RateLimiter()
+        limiter.check_rate('client', '1/hour')
+        limiter.check_rate('client', '1/hour')
+        before = rate_limit.rate_limit_decisions.value(outcome='denied', source='fast')
+
+        decision = limiter.check_rate('client', '1/hour')
+
+        assert not decision.allowed
+        assert rate_limit.rate_limit_decisions.value(outcome='denied', source='fast') == before + 1
+
+    def test_clients_are_independent(self):
+        limiter = RateLimiter()
+        assert limiter.check_rate('a', '1/minute').allowed
+        assert limiter.check_rate('b', '1/minute').allowed
+        assert not limiter.check_rate('a', '1/minute').allowed
+
+
+class UserLimitedView(APIView):
+    throttle_classes = [UserGCRAThrottle]
+
+    def get(self, request):
+        return Response({'ok': True})
+
+
+class ScopedView(APIView):
+    throttle_classes = [ScopedGCRAThrottle]
+    throttle_scope = 'quotes'
+
+    def get(self, request):
+        return Response({'ok': True})
+
+
+class MixinView(RateLimitMixin, APIView):
+    rate_limit = '2/minute'
+
+    def get(self, request):
+        return Response({'ok': True})
+
+
+@pytest.fixture(autouse=True)
+def fresh_limiter(monkeypatch):
+    limiter = RateLimiter()
+    monkeypatch.setattr('api.throttling.GCRAThrottleMixin.limiter', limiter)
+    monkeypatch.setattr('api.utils.rate_limiter', limiter)
+    monkeypatch.setattr('api.views.rate_limiter', limiter)
+
+
+def statuses(view, count, user=None, ip='10.0.0.1'):
+    factory = APIRequestFactory()
+    results = []
+    for _ in range(count):
+        request = factory.get('/', REMOTE_ADDR=ip)
+        if user:
+            force_authenticate(request, user)
+        response = view(request)
+        results.append(response.status_code)
+    return results, response
+
+
+@pytest.mark.django_db
+class TestThrottles:
+    def test_user_throttle_returns_429_with_retry_after(self, monkeypatch):
+        monkeypatch.setattr(UserGCRAThrottle, 'THROTTLE_RATES', {'user': '2/minute'})
+        user = User.objects.create_user('throttled', password='password')
+
+        codes, response = statuses(UserLimitedView.as_view(), 3, user=user)
+
+        assert codes == [200, 200, 429]
+        assert 0 < int(response['Retry-After']) <= 30
+
+    def test_scoped_throttle(self, monkeypatch):
+        monkeypatch.setattr(ScopedGCRAThrottle, 'THROTTLE_RATES', {'quotes': '1/minute'})
+
+        codes, _ = statuses(ScopedView.as_view(), 2)
+
+        assert codes == [200, 429]
+
+    def test_mixin_limits_per_client_ip(self):
+        codes, _ = statuses(MixinView.as_view(), 3)
+        other, _ = statuses(MixinView.as_view(), 1, ip='10.0.0.2')
+
+        assert codes == [200, 200, 429]
+        assert other == [200]
+
+
+class TestAsyncViews:
+    def test_stock_advisory_keeps_the_anon_rate_per_client_ip(self, settings):
+        settings.REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'anon': '2/minute'}}
+
+        async def scenario():
+            client = AsyncClient()
+            # No query: throttled requests are refused before the 400
+            codes = [(await client.get('/api/stock-advisory/', headers={'x-forwarded-for': '10.0.0.1'})) for _ in range(3)]
+            other = await client.get('/api/stock-advisory/', headers={'x-forwarded-for': '10.0.0.2'})
+            return codes, other
+
+        responses, other = async_to_sync(scenario)()
+
+        assert [response.status_code for response in responses] == [400, 400, 429]
+        assert 0 < int(responses[-1]['Retry-After']) <= 30
+        assert other.status_code == 400
@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from api.services.providers import PROVIDERS, ProviderChain, ProviderError, SimulatedProvider, fetch_quote, fetch_quotes_bulk
+from api.services.simulator import DAY, EPOCH, MarketSimulator, SimulatedOutage, simulator
+
+MOMENT = EPOCH + 1000 * DAY + 12345
+
+
+class TestMarketSimulator:
+    def test_prices_are_deterministic_per_seed(self):
+        first = MarketSimulator(seed=7)
+        second = MarketSimulator(seed=7)
+        other = MarketSimulator(seed=8)
+
+        assert first.snapshot('AAPL', MOMENT) == second.snapshot('AAPL', MOMENT)
+        assert first.price('AAPL', MOMENT) != other.price('AAPL', MOMENT)
+        assert first.price('AAPL', MOMENT) != first.price('MSFT', MOMENT)
+
+    def test_days_chain_open_to_previous_close(self):
+        sim = MarketSimulator(seed=1)
+        day_start = EPOCH + 1001 * DAY
+
+        snapshot = sim.snapshot('AAPL', day_start + 60)
+        assert snapshot['previous_close'] == sim.price('AAPL', day_start)
+        assert snapshot['low'] <= snapshot['price'] <= snapshot['high']
+        assert snapshot['source'] == 'Simulator'
+
+    def test_random_walk_stays_in_a_realistic_band(self):
+        sim = MarketSimulator(seed=3)
+        base = sim.base_price('AAPL')
+        closes = [bar['close'] for bar in sim.history('AAPL', EPOCH, EPOCH + 400 * DAY)]
+
+        assert len(closes) == 400
+        assert all(base / 20 < close < base * 20 for close in closes)
+        assert len(set(closes)) > 300
+
+    def test_history_bars(self):
+        sim = MarketSimulator(seed=5)
+        bars = sim.history('MSFT', MOMENT, MOMENT + 3600 * 3, interval=3600)
+
+        assert len(bars) == 4
+        for bar, following in zip(bars, bars[1:]):
+            assert following['start'] - bar['start'] == 3600
+            assert bar['close'] == following['open']
+        for bar in bars:
+            assert bar['low'] <= min(bar['open'], bar['close'])
+            assert bar['high'] >= max(bar['open'], bar['close'])
+
+    def test_search(self):
+        sim = MarketSimulator(universe_size=100)
+
+        assert sim.search('AAPL')[0] == ('AAPL', 'Apple Inc')
+        assert ('MSFT', 'Microsoft Corporation') in sim.search('micro')
+        assert len(sim.search('SIM')) == 10
+        assert sim.search('') == []
+
+    def test_error_injection(self):
+        sim = MarketSimulator(error_rate=1.0)
+        with pytest.raises(SimulatedOutage):
+            sim.fetch_quote('AAPL')
+        with pytest.raises(SimulatedOutage):
+            asyncio.run(sim.afetch_quote('AAPL'))
+        assert sim.stats == {'calls': 2, 'errors': 2}
+
+        assert MarketSimulator(error_rate=0).fetch_quote('AAPL')['price'] > 0
+
+    def test_latency_injection(self):
+        sim = MarketSimulator(latency_ms=30)
+
+        async def timed():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await sim.afetch_quote('AAPL')
+            return loop.time() - started
+
+        assert asyncio.run(timed()) >= 0.03
+
+
+class TestSimulatedBackend:
+    def test_provider_wraps_outages(self, monkeypatch):
+        provider = SimulatedProvider()
+        assert asyncio.run(provider.get_quote('AAPL')) > 0
+        assert asyncio.run(provider.search('apple'))[0][0] == 'AAPL'
+
+        monkeypatch.setattr(simulator, 'error_rate', 1.0)
+        with pytest.raises(ProviderError):
+            asyncio.run(provider.get_quote('AAPL'))
+
+    def test_chain_from_settings(self, settings):
+        settings.MARKET_DATA_QUOTE_PROVIDERS = ['simulated']
+        settings.MARKET_DATA_SEARCH_PROVIDERS = ['simulated']
+        chain = ProviderChain.from_settings()
+
+        assert PROVIDERS['simulated'] is SimulatedProvider
+        price, source = asyncio.run(chain.get_price('AAPL'))
+        assert price > 0 and source == 'Simulator'
+
+    def test_blocking_fetchers_switch_backend(self, settings):
+        settings.MARKET_DATA_BACKEND = 'simulated'
+
+        assert fetch_quote('AAPL')['source'] == 'Simulator'
+        quotes = fetch_quotes_bulk(['AAPL', 'MSFT', 'AAPL'], batch_size=1)
+        assert set(quotes) == {'AAPL', 'MSFT'}
+        assert quotes['AAPL']['price'] > 0
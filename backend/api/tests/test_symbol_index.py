@@ -0,0 +1,84 @@
+import io
+import pytest
+from django.core.cache import cache
+from api.models import StockSymbol, SymbolAlias
+from api.services.symbol_index import VERSION_KEY, SymbolIndex, normalize_name
+
+LISTING = """symbol,name,exchange,assetType,ipoDate,delistingDate,status
+AAPL,Apple Inc,NASDAQ,Stock,1980-12-12,null,Active
+APLE,Apple Hospitality REIT Inc,NYSE,Stock,2015-05-18,null,Active
+APPF,AppFolio Inc - Class A,NASDAQ,Stock,2015-06-26,null,Active
+MSFT,Microsoft Corporation,NASDAQ,Stock,1986-03-13,null,Active
+TSLA,Tesla Inc,NASDAQ,Stock,2010-06-29,null,Active
+OLDC,Old Company Inc,NYSE,Stock,1990-01-01,2001-01-01,Delisted
+"""
+
+
+@pytest.fixture
+def index():
+    cache.clear()
+    index = SymbolIndex()
+    index.load_listing(io.StringIO(LISTING))
+    return index
+
+
+@pytest.mark.django_db
+class TestSymbolIndex:
+    def test_normalize_name_uses_clean_query(self):
+        assert normalize_name('Apple stock price') == 'apple'
+        assert normalize_name('AppFolio Inc - Class A') == 'appfolio inc class a'
+
+    def test_load_listing_skips_inactive(self, index):
+        assert StockSymbol.objects.count() == 5
+        assert not StockSymbol.objects.filter(symbol='OLDC').exists()
+
+    def test_exact_ticker(self, index):
+        assert index.lookup('msft') == ('MSFT', 'Microsoft Corporation')
+
+    def test_prefix_prefers_whole_word(self, index):
+        assert index.lookup('apple') == ('AAPL', 'Apple Inc')
+        assert index.lookup('micro') == ('MSFT', 'Microsoft Corporation')
+
+    def test_fuzzy_match(self, index):
+        assert index.lookup('tesla inc.') == ('TSLA', 'Tesla Inc')
+        assert index.lookup('microsoft corporatoin') == ('MSFT', 'Microsoft Corporation')
+
+    def test_no_match(self, index):
+        assert index.lookup('zzzz unknown') == (None, None)
+
+    def test_remote_results_written_back(self, index):
+        index.add('GOOGL', 'Alphabet Inc Class A', source='remote', alias='google')
+
+        assert SymbolAlias.objects.get(alias='google').stock.symbol == 'GOOGL'
+        assert index.lookup('google') == ('GOOGL', 'Alphabet Inc Class A')
+
+        # Another process picks the write-back up from the database
+        fresh = SymbolIndex()
+        assert fresh.lookup('google') == ('GOOGL', 'Alphabet Inc Class A')
+
+    def test_lookups_during_a_reload_see_the_old_index(self, index, monkeypatch):
+        assert index.lookup('tesla') == ('TSLA', 'Tesla Inc')
+        seen = []
+
+        class Rows:
+            def __init__(self, rows):
+                self.rows = rows
+
+            def iterator(self, chunk_size):
+                # A lookup from another thread, before any row has been read
+                seen.append(index.lookup('tesla'))
+                yield from self.rows.iterator(chunk_size)
+
+        class Symbols:
+            class objects:
+                @staticmethod
+                def values_list(*fields):
+                    return Rows(StockSymbol.objects.values_list(*fields))
+
+        monkeypatch.setattr('api.services.symbol_index.StockSymbol', Symbols)
+        # Due for a version check; other threads skip it while this one reloads
+        index._checked_at = 0
+        cache.incr(VERSION_KEY)
+
+        assert index.lookup('msft') == ('MSFT', 'Microsoft Corporation')
+        assert seen == [('TSLA', 'Tesla Inc')]
@@ -0,0 +1,81 @@
+from decimal import Decimal
+import pytest
+from django.contrib.auth.models import User
+from api.models import Portfolio
+from api.benchmarks.valuation import run, synthetic_holdings
+from api.services.quote_cache import quote_cache
+from api.services.valuation import Holdings, value_holdings, value_user_holdings
+
+
+@pytest.fixture
+def holdings():
+    return Holdings.from_rows([
+        (1, 10, 'AAPL', 10, Decimal('150.00')),
+        (2, 10, 'MSFT', 5, Decimal('300.10')),
+        (3, 20, 'AAPL', 2, Decimal('120.00')),
+        (4, 20, 'ZZZZ', 7, Decimal('10.00')),
+    ])
+
+
+class TestValuation:
+    def test_values_and_gain_loss(self, holdings):
+        valuation = value_holdings(holdings, {'AAPL': 170.25, 'MSFT': 310.0})
+        records = {record['id']: record for record in valuation.records()}
+
+        assert records[1]['value'] == Decimal('1702.50')
+        assert records[1]['gain_loss'] == Decimal('202.50')
+        assert records[2]['cost'] == Decimal('1500.50')
+        assert records[2]['purchase_price'] == Decimal('300.10')
+        assert records[4]['current_price'] is None
+        assert records[4]['weight'] is None
+
+    def test_per_user_totals_skip_unpriced(self, holdings):
+        valuation = value_holdings(holdings, {'AAPL': 170.25, 'MSFT': 310.0})
+
+        assert valuation.totals(10) == {
+            'total_value': Decimal('3252.50'),
+            'total_cost': Decimal('3000.50'),
+            'gain_loss': Decimal('252.00'),
+        }
+        assert valuation.totals(20)['total_value'] == Decimal('340.50')
+        assert list(valuation.per_user().index) == [10, 20]
+
+    def test_weights_sum_to_one_per_user(self, holdings):
+        valuation = value_holdings(holdings, {'AAPL': 170.25, 'MSFT': 310.0})
+        weights = [record['weight'] for record in valuation.records() if record['weight'] is not None]
+        assert sum(weights[:2]) == pytest.approx(1.0)
+
+    def test_empty(self):
+        valuation = value_holdings(Holdings.from_rows([]), {})
+        assert valuation.records() == []
+        assert valuation.totals()['total_value'] == Decimal('0.00')
+
+    def test_matches_loop_on_synthetic_data(self):
+        data, prices = synthetic_holdings(2000, 50, 30)
+        valuation = value_holdings(data, prices)
+
+        expected = {}
+        for i in range(len(data)):
+            user = data.users[data.user_codes[i]]
+            price = prices[data.symbols[data.symbol_codes[i]]]
+            expected[user] = expected.get(user, 0.0) + price * data.quantity[i]
+        for user, total in expected.items():
+            assert valuation.per_user().loc[user, 'total_value'] == pytest.approx(total)
+
+    def test_benchmark_reports_throughput(self):
+        result = run(holdings=10_000, users=100, symbols=50, repeat=2)
+        assert result['holdings'] == 10_000
+        assert result['runs'] == 2
+        assert result['holdings_per_sec'] > 0
+
+
+@pytest.mark.django_db
+def test_value_user_holdings_uses_cached_quotes():
+    user = User.objects.create_user(username='valuer', password='pass12345')
+    Portfolio.objects.create(user=user, stock_symbol='AAPL', purchase_price=Decimal('100.00'), quantity=3)
+    quote_cache.set('AAPL', {'symbol': 'AAPL', 'price': 110.0})
+
+    valuation = value_user_holdings(user.id)
+
+    assert valuation.totals()['total_value'] == Decimal('330.00')
+    assert valuation.totals()['gain_loss'] == Decimal('30.00')
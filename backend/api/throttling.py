@@ -0,0 +1,43 @@
+"""
+DRF throttles backed by the GCRA rate limiter (``services.rate_limit``):
+drop-in replacements for the stock anon/user/scoped throttles.
+"""
+from rest_framework.throttling import AnonRateThrottle, ScopedRateThrottle, UserRateThrottle
+
+from .services.rate_limit import rate_limiter
+
+
+class GCRAThrottleMixin:
+    """Replaces SimpleRateThrottle's cached request history with one limiter check."""
+    limiter = rate_limiter
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+        self.decision = self.limiter.check(self.key, self.num_requests, self.duration)
+        return self.decision.allowed
+
+    def wait(self):
+        return self.decision.retry_after
+
+
+class AnonGCRAThrottle(GCRAThrottleMixin, AnonRateThrottle):
+    pass
+
+
+class UserGCRAThrottle(GCRAThrottleMixin, UserRateThrottle):
+    pass
+
+
+class ScopedGCRAThrottle(GCRAThrottleMixin, ScopedRateThrottle):
+    def allow_request(self, request, view):
+        # As ScopedRateThrottle: the rate depends on the view's throttle_scope
+        self.scope = getattr(view, self.scope_attr, None)
+        if not self.scope:
+            return True
+        self.rate = self.get_rate()
+        self.num_requests, self.duration = self.parse_rate(self.rate)
+        return super().allow_request(request, view)
@@ -3,6 +3,14 @@ from .views import (
     register_user,
     login_user,
     save_profile_view,
+    quote_hub_metrics_view,
+    provider_metrics_view,
+    quote_cache_metrics_view,
+    alert_metrics_view,
+    websocket_metrics_view,
+    stock_advisory_view,
+    ai_recommendation_view,
+    stock_history_view,
     UserProfileViewSet,
 )
 
@@ -10,5 +18,13 @@ urlpatterns = [
     path('auth/register/', register_user, name='register'),
     path('auth/login/', login_user, name='login'),
     path('profile/save/', save_profile_view, name='profile-save'),  # Ensure this is correctly defined
+    path('stock-advisory/', stock_advisory_view, name='stock-advisory'),
+    path('ai-recommendation/', ai_recommendation_view, name='ai-recommendation'),
+    path('stock-history/<str:symbol>/', stock_history_view, name='stock-history'),
+    path('metrics/quote-hub/', quote_hub_metrics_view, name='quote-hub-metrics'),
+    path('metrics/providers/', provider_metrics_view, name='provider-metrics'),
+    path('metrics/quote-cache/', quote_cache_metrics_view, name='quote-cache-metrics'),
+    path('metrics/alerts/', alert_metrics_view, name='alert-metrics'),
+    path('metrics/websockets/', websocket_metrics_view, name='websocket-metrics'),
     # Add any other endpoints as needed
 ]
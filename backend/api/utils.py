@@ -5,6 +5,7 @@ from django.core.exceptions import ValidationError
 from django.db.utils import IntegrityError
 from requests.exceptions import RequestException
 import logging
+from .services.rate_limit import rate_limiter
 
 logger = logging.getLogger(__name__)
 
@@ -60,6 +61,9 @@ def get_client_ip(request):
 class RateLimitMixin:
     """
     Mixin to add rate limiting to views
+
+    Checked with the other DRF throttles; clients over ``rate_limit`` get a
+    429 with Retry-After. Set ``rate_limit = None`` to disable it.
     """
     rate_limit = '5/minute'
     rate_limit_key = None
@@ -69,6 +73,22 @@ class RateLimitMixin:
             return self.rate_limit_key
         return f"{get_client_ip(request)}_{self.__class__.__name__}"
 
+    def check_throttles(self, request):
+        super().check_throttles(request)
+        if self.rate_limit:
+            decision = rate_limiter.check_rate(f"mixin_{self.get_rate_limit_key(request)}", self.rate_limit)
+            if not decision.allowed:
+                self.throttled(request, decision.retry_after)
+
+# Extra words to clean user query
+EXTRA_WORDS = ["stock", "share", "price", "value", "company", "market", "buy", "sell", "should", "today", "best", "which", "one", "I"]
+
+def clean_query(query):
+    """Removes extra words from user input."""
+    words = query.lower().split()
+    cleaned = " ".join([word for word in words if word not in EXTRA_WORDS]).strip()
+    return cleaned if cleaned else query
+
 def validate_stock_symbol(symbol):
     """
     Validate stock symbol format
@@ -1,30 +1,41 @@
-import requests
 import logging
-from django.http import JsonResponse
+import math
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
 from rest_framework import status, viewsets
 from rest_framework.decorators import api_view, permission_classes, action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import AuthenticationFailed, Throttled
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from .authentication import CachedJWTAuthentication
 from .models import UserProfile, Portfolio, MarketData
 from .serializers import (
     RegisterSerializer, LoginSerializer, ForgotPasswordSerializer,
     UserProfileSerializer, PortfolioSerializer, MarketDataSerializer
 )
-
-# API Keys (Move to environment variables in production)
-ALPHA_VANTAGE_API_KEY = "ZRLEESP54OHIGBYP"
-FINNHUB_API_KEY = "cutneu1r01qv6ijjalo0cutneu1r01qv6ijjalog"
-GEMINI_API_KEY = "AizaSyAQpgRt9PyL3mNlh-ZuNxG2rwykw6UtpAQ"
-
-# Extra words to clean user query
-EXTRA_WORDS = ["stock", "share", "price", "value", "company", "market", "buy", "sell", "should", "today", "best", "which", "one", "I"]
-
-def clean_query(query):
-    """Removes extra words from user input."""
-    words = query.lower().split()
-    cleaned = " ".join([word for word in words if word not in EXTRA_WORDS]).strip()
-    return cleaned if cleaned else query
+from .services.alert_engine import alert_engine
+from .services.llm_gateway import band_price, llm_gateway, risk_bucket
+from .services.market_history import INTERVALS, market_history
+from .services.market_prices import astored_quote, latest_prices
+from .services.metrics import registry as metrics_registry
+from .services.notifications import STATS_KEY as NOTIFICATION_STATS_KEY
+from .services.outbox import connection_stats
+from .services.providers import ProviderError, market_data
+from .services.quote_cache import quote_cache
+from .services.quote_hub import quote_hub
+from .services.rate_budget import call_budget
+from .services.rate_limit import rate_limiter
+from .services.symbol_index import symbol_index
+from .utils import clean_query, get_client_ip
 
 def extract_stock_query(user_input):
     """Extracts stock-related keywords from a natural language query."""
@@ -36,44 +47,31 @@ def extract_stock_query(user_input):
 
     return action, stock_name.strip()
 
-def search_stock_symbol(query):
-    """Finds stock symbol using Finnhub and Alpha Vantage."""
+async def search_stock_symbol(query):
+    """Finds stock symbol using the local symbol index, then Finnhub and Alpha Vantage."""
     cleaned_query = clean_query(query)
 
-    # Finnhub API search
-    url = f"https://finnhub.io/api/v1/search?q={cleaned_query}&token={FINNHUB_API_KEY}"
-    response = requests.get(url).json()
-    results = response.get("result", [])
-
-    if results:
-        return results[0]["symbol"], results[0]["description"]
-
-    # Alpha Vantage search
-    url = f"https://www.alphavantage.co/query?function=SYMBOL_SEARCH&keywords={cleaned_query}&apikey={ALPHA_VANTAGE_API_KEY}"
-    response = requests.get(url).json()
-    results = response.get("bestMatches", [])
-
-    if results:
-        return results[0]["1. symbol"], results[0]["2. name"]
+    symbol, company = await symbol_index.alookup(cleaned_query)
+    if symbol:
+        return symbol, company
 
-    return None, None
+    symbol, company = await market_data.search_symbol(cleaned_query)
+    if symbol:
+        # Remember the answer so the next identical query stays local
+        await symbol_index.aadd(symbol, company, source='remote', alias=cleaned_query)
+    return symbol, company
 
-def get_stock_price(symbol):
-    """Fetches real-time stock price from Finnhub (fallback to Alpha Vantage)."""
-    # Try Finnhub first
-    url = f"https://finnhub.io/api/v1/quote?symbol={symbol}&token={FINNHUB_API_KEY}"
-    response = requests.get(url).json()
-    price = response.get("c")
+async def load_stock_quote(symbol):
+    """Recent LatestQuote row if ingest has one, otherwise a provider snapshot."""
+    quote = await astored_quote(symbol, max_age=settings.LATEST_QUOTE_MAX_AGE)
+    return quote or await market_data.get_snapshot(symbol)
 
-    if price:
-        return price, "Finnhub"
-
-    # Fallback to Alpha Vantage
-    url = f"https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={symbol}&apikey={ALPHA_VANTAGE_API_KEY}"
-    response = requests.get(url).json()
-    price = response.get("Global Quote", {}).get("05. price")
-
-    return float(price) if price else None, "Alpha Vantage"
+async def get_stock_price(symbol):
+    """Fetches real-time stock price from the quote cache, LatestQuote, Finnhub or Alpha Vantage."""
+    quote = await quote_cache.aget(symbol, load_stock_quote)
+    if not quote or quote.get('price') is None:
+        return None, None
+    return quote['price'], quote['source']
 
 def get_user_profile(user):
     """Fetches user profile details for personalized recommendations."""
@@ -89,19 +87,15 @@ def get_user_profile(user):
     except UserProfile.DoesNotExist:
         return None
 
-def send_to_gemini(user_data):
-    """Sends stock data + user profile to Gemini API for AI-generated recommendations."""
-    url = "https://generativelanguage.googleapis.com/v1/models/gemini-1:generateText"
-    
-    headers = {
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "prompt": f"""Analyze the following stock data and provide a personalized investment recommendation based on the user's profile:
+def recommendation_prompt(user_data):
+    """
+    Recommendation prompt for a user profile and quote. Risk and price are
+    bucketed so similar requests share one cached answer (see llm_gateway).
+    """
+    return f"""Analyze the following stock data and provide a personalized investment recommendation based on the user's profile:
         
         **User Profile:**
-        Risk Tolerance: {user_data["risk_tolerance"]}
+        Risk Tolerance: {risk_bucket(user_data["risk_tolerance"])}
         Investment Type: {user_data["investment_type"]}
         Investment Reason: {user_data["investment_reason"]}
         Income Range: {user_data["income_range"]}
@@ -110,39 +104,84 @@ def send_to_gemini(user_data):
         **Stock Data:**
         Company: {user_data["company"]}
         Stock Symbol: {user_data["symbol"]}
-        Current Price: {user_data["price"]} USD
-        Data Source: {user_data["source"]}
+        Current Price: about {band_price(user_data["price"])} USD
 
-        Provide a clear and concise recommendation (e.g., Buy, Hold, or Sell) and a short reasoning.""",
-        "max_tokens": 150
-    }
+        Provide a clear and concise recommendation (e.g., Buy, Hold, or Sell) and a short reasoning."""
 
-    response = requests.post(f"{url}?key={GEMINI_API_KEY}", json=payload, headers=headers)
+RECOMMENDATION_UNAVAILABLE = "Could not generate an AI-based recommendation at the moment."
 
-    if response.status_code == 200:
-        return response.json()["candidates"][0]["output"]
-    return "Could not generate an AI-based recommendation at the moment."
+async def send_to_gemini(user_data):
+    """Sends stock data + user profile to Gemini API for AI-generated recommendations."""
+    try:
+        return await llm_gateway.generate(recommendation_prompt(user_data), max_tokens=150)
+    except ProviderError:
+        return RECOMMENDATION_UNAVAILABLE
+
+async def stream_from_gemini(user_data):
+    """``send_to_gemini`` as text chunks, yielded as soon as the model produces them."""
+    try:
+        async for chunk in llm_gateway.stream(recommendation_prompt(user_data), max_tokens=150):
+            yield chunk
+    except ProviderError:
+        yield RECOMMENDATION_UNAVAILABLE
+
+async def request_user(request):
+    """JWT or session user for plain async views, or None."""
+    try:
+        authenticated = await CachedJWTAuthentication().aauthenticate(request)
+    except AuthenticationFailed:
+        return None
+    if authenticated:
+        return authenticated[0]
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+async def throttle(scope, ident):
+    """
+    The DRF throttle rate for ``scope`` applied to a plain async view (which
+    DRF's throttle classes never see): a 429 response with Retry-After once
+    ``ident`` is over it, otherwise None. Shares the throttles' keys, so a
+    client's budget covers both kinds of view.
+    """
+    rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope)
+    if not rate:
+        return None
+    decision = await rate_limiter.acheck_rate(f"throttle_{scope}_{ident}", rate)
+    if decision.allowed:
+        return None
+    wait = math.ceil(decision.retry_after)
+    response = JsonResponse({"detail": Throttled(wait).detail}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+    response["Retry-After"] = str(wait)
+    return response
+
+@require_GET
+async def stock_advisory_view(request):
+    """Provides stock advisory information based on user input.
+
+    Plain async Django view (DRF views are sync-only) so upstream calls are
+    awaited on the event loop instead of holding a worker thread. Anonymous,
+    so it keeps the ``anon`` throttle rate per client IP.
+    """
+    throttled = await throttle('anon', get_client_ip(request))
+    if throttled:
+        return throttled
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-def stock_advisory_view(request):
-    """Provides stock advisory information based on user input."""
     user_input = request.GET.get("query")
     if not user_input:
-        return Response({"error": "Query is required."}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({"error": "Query is required."}, status=status.HTTP_400_BAD_REQUEST)
 
     action, stock_name = extract_stock_query(user_input)
     if not stock_name:
-        return Response({"error": "No stock name found in the query."}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({"error": "No stock name found in the query."}, status=status.HTTP_400_BAD_REQUEST)
 
     # Fetch stock symbol and price using the stock_name
-    symbol, company = search_stock_symbol(stock_name)
+    symbol, company = await search_stock_symbol(stock_name)
     if not symbol:
-        return Response({"error": f"Could not find relevant stock for '{stock_name}'."}, status=status.HTTP_404_NOT_FOUND)
+        return JsonResponse({"error": f"Could not find relevant stock for '{stock_name}'."}, status=status.HTTP_404_NOT_FOUND)
 
-    price, source = get_stock_price(symbol)
+    price, source = await get_stock_price(symbol)
     if price is None:
-        return Response({"error": f"Failed to fetch stock price for '{symbol}'."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return JsonResponse({"error": f"Failed to fetch stock price for '{symbol}'."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     # Construct the response
     advisory_data = {
@@ -154,7 +193,113 @@ def stock_advisory_view(request):
         "advice": f"Consider {action}ing {company} stock." if action else "Here's the information you requested."
     }
 
-    return Response(advisory_data, status=status.HTTP_200_OK)
+    return JsonResponse(advisory_data, status=status.HTTP_200_OK)
+
+@require_GET
+async def ai_recommendation_view(request):
+    """Personalized recommendation for ?symbol= (streamed as plain text with ?stream=1)."""
+    user = await request_user(request)
+    if user is None:
+        return JsonResponse({"error": "Authentication required."}, status=status.HTTP_401_UNAUTHORIZED)
+    # Every prompt cache miss is a paid model call
+    throttled = await throttle('user', user.pk)
+    if throttled:
+        return throttled
+    query = request.GET.get("symbol")
+    if not query:
+        return JsonResponse({"error": "Symbol is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    profile = await sync_to_async(get_user_profile)(user)
+    if profile is None:
+        return JsonResponse({"error": "Complete your profile first."}, status=status.HTTP_404_NOT_FOUND)
+    symbol, company = await search_stock_symbol(query)
+    if not symbol:
+        return JsonResponse({"error": f"Could not find relevant stock for '{query}'."}, status=status.HTTP_404_NOT_FOUND)
+    price, source = await get_stock_price(symbol)
+    if price is None:
+        return JsonResponse({"error": f"Failed to fetch stock price for '{symbol}'."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    user_data = {**profile, "symbol": symbol, "company": company, "price": price, "source": source}
+    if request.GET.get("stream"):
+        response = StreamingHttpResponse(stream_from_gemini(user_data), content_type="text/plain; charset=utf-8")
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # Don't let nginx hold the chunks back
+        return response
+    return JsonResponse({
+        "symbol": symbol,
+        "company": company,
+        "price": price,
+        "source": source,
+        "recommendation": await send_to_gemini(user_data),
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def stock_history_view(request, symbol):
+    """OHLCV bars for a chart range (?days=N, or ?start=&end= ISO timestamps)."""
+    end = parse_datetime(request.GET['end']) if request.GET.get('end') else timezone.now()
+    if request.GET.get('start'):
+        start = parse_datetime(request.GET['start'])
+    else:
+        try:
+            start = end - timedelta(days=float(request.GET.get('days', 1)))
+        except (ValueError, OverflowError):
+            start = None
+    if start is None or end is None:
+        return Response({"error": "Invalid chart range."}, status=status.HTTP_400_BAD_REQUEST)
+    start, end = (moment if timezone.is_aware(moment) else timezone.make_aware(moment) for moment in (start, end))
+    interval = request.GET.get('interval')
+    if start >= end or (interval and interval not in INTERVALS):
+        return Response({"error": "Invalid chart range."}, status=status.HTTP_400_BAD_REQUEST)
+
+    interval, bars = market_history.bars(symbol.upper(), start, end, interval)
+    return Response({"symbol": symbol.upper(), "interval": interval, "bars": bars}, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def quote_hub_metrics_view(request):
+    """Subscriber and poller counts for this worker's quote hub."""
+    return Response(quote_hub.metrics(), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def websocket_metrics_view(request):
+    """Outbound queue depth and sent/superseded/overflow counts per open websocket in this worker."""
+    return Response({'connections': connection_stats()}, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def quote_cache_metrics_view(request):
+    """Hit/miss/refresh counters for this worker's quote cache."""
+    return Response(quote_cache.stats(), status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def provider_metrics_view(request):
+    """Quote latency percentiles, hedge win counts and call budget use per provider for this worker."""
+    return Response({
+        'mode': market_data.mode,
+        'providers': market_data.latency.snapshot(),
+        'budgets': call_budget.snapshot(),
+    }, status=status.HTTP_200_OK)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def alert_metrics_view(request):
+    """Alert index size for this worker and the latest notification worker stats."""
+    return Response({
+        'engine': alert_engine.stats(),
+        'notifications': cache.get(NOTIFICATION_STATS_KEY),
+    }, status=status.HTTP_200_OK)
+
+@require_GET
+def prometheus_metrics_view(request):
+    """Request, database and provider histograms for this worker, in Prometheus text format."""
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not constant_time_compare(request.headers.get('Authorization', ''), expected):
+            return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -241,6 +386,20 @@ class PortfolioViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         return Portfolio.objects.filter(user=self.request.user)
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        holdings = list(page if page is not None else queryset)
+
+        # One price lookup for the whole page instead of one per holding
+        context = self.get_serializer_context()
+        context['latest_prices'] = latest_prices(holding.stock_symbol for holding in holdings)
+        serializer = self.get_serializer_class()(holdings, many=True, context=context)
+
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
 class MarketDataViewSet(viewsets.ModelViewSet):
     """Handles stock market data."""
     queryset = MarketData.objects.all()
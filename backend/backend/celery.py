@@ -1,6 +1,7 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import task_postrun, task_prerun
 
 # Set the default Django settings module for the 'celery' program.
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
@@ -14,6 +15,24 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 # Load task modules from all registered Django app configs.
 app.autodiscover_tasks()
 
+# Tasks are background work for outbound provider budgets, so interactive
+# requests get the provider quota first
+_task_priorities = {}
+
+
+@task_prerun.connect
+def _enter_background_priority(task_id=None, **kwargs):
+    from api.services.rate_budget import BACKGROUND, set_priority
+    _task_priorities[task_id] = set_priority(BACKGROUND)
+
+
+@task_postrun.connect
+def _leave_background_priority(task_id=None, **kwargs):
+    from api.services.rate_budget import reset_priority
+    token = _task_priorities.pop(task_id, None)
+    if token is not None:
+        reset_priority(token)
+
 # Configure periodic tasks
 app.conf.beat_schedule = {
     'check-stock-alerts': {
@@ -28,4 +47,16 @@ app.conf.beat_schedule = {
         'task': 'api.tasks.cleanup_old_alerts',
         'schedule': crontab(hour=0, minute=0),  # Daily at midnight
     },
+    'rollup-market-data': {
+        'task': 'api.tasks.rollup_market_data',
+        'schedule': crontab(),  # Every minute
+    },
+    'maintain-market-history': {
+        'task': 'api.tasks.maintain_market_history',
+        'schedule': crontab(hour=0, minute=30),  # Daily, after midnight UTC
+    },
+    'refresh-symbol-index': {
+        'task': 'api.tasks.refresh_symbol_index',
+        'schedule': crontab(hour=5, minute=0),  # Daily, after US listings update
+    },
 }
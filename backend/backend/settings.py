@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 # Middleware
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.PerformanceMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -106,7 +107,7 @@ CORS_ALLOW_ALL_ORIGINS = True  # Only for development
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'api.authentication.CachedJWTAuthentication',
     ),
 }
 
@@ -122,10 +123,145 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Token users (with their profile) are cached in process memory for
+# AUTH_USER_CACHE_LOCAL_TTL seconds and in Redis for AUTH_USER_CACHE_TTL;
+# saving a user or profile invalidates them
+AUTH_USER_CACHE_TTL = int(os.getenv('AUTH_USER_CACHE_TTL', '300'))
+AUTH_USER_CACHE_LOCAL_TTL = float(os.getenv('AUTH_USER_CACHE_LOCAL_TTL', '5'))
+AUTH_USER_CACHE_MAX_ENTRIES = int(os.getenv('AUTH_USER_CACHE_MAX_ENTRIES', '10000'))
+
 # Alpha Vantage API settings
 ALPHA_VANTAGE_API_KEY = os.getenv('ALPHA_VANTAGE_API_KEY', 'your_api_key_here')
 
 # LLM API Keys
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
\ No newline at end of file
+ANTHROPIC_API_KEY = os.getenv('ANTHROPIC_API_KEY')
+
+# Real-time quote hub (seconds between upstream polls per symbol)
+QUOTE_HUB_POLL_INTERVAL = int(os.getenv('QUOTE_HUB_POLL_INTERVAL', '5'))
+
+# Market data providers. MARKET_DATA_BACKEND=simulated swaps every provider
+# (quotes, bulk quotes, search, stock data) for the offline simulator
+MARKET_DATA_BACKEND = os.getenv('MARKET_DATA_BACKEND', 'live')
+FINNHUB_API_KEY = os.getenv('FINNHUB_API_KEY')
+TWELVEDATA_API_KEY = os.getenv('TWELVE_DATA_API_KEY')
+_DEFAULT_PROVIDERS = 'simulated' if MARKET_DATA_BACKEND == 'simulated' else 'finnhub,alpha_vantage'
+MARKET_DATA_QUOTE_PROVIDERS = os.getenv('MARKET_DATA_QUOTE_PROVIDERS', _DEFAULT_PROVIDERS).split(',')
+MARKET_DATA_SEARCH_PROVIDERS = os.getenv('MARKET_DATA_SEARCH_PROVIDERS', _DEFAULT_PROVIDERS).split(',')
+
+# Simulated market: deterministic per seed; latency (ms) and error rate are
+# injected into every call
+MARKET_SIMULATOR_SEED = int(os.getenv('MARKET_SIMULATOR_SEED', '42'))
+MARKET_SIMULATOR_VOLATILITY = float(os.getenv('MARKET_SIMULATOR_VOLATILITY', '0.02'))  # Daily, log-price
+MARKET_SIMULATOR_TICK_SECONDS = float(os.getenv('MARKET_SIMULATOR_TICK_SECONDS', '1'))
+MARKET_SIMULATOR_LATENCY_MS = float(os.getenv('MARKET_SIMULATOR_LATENCY_MS', '0'))
+MARKET_SIMULATOR_JITTER_MS = float(os.getenv('MARKET_SIMULATOR_JITTER_MS', '0'))
+MARKET_SIMULATOR_ERROR_RATE = float(os.getenv('MARKET_SIMULATOR_ERROR_RATE', '0'))
+MARKET_SIMULATOR_SYMBOLS = int(os.getenv('MARKET_SIMULATOR_SYMBOLS', '500'))
+
+# Outbound HTTP pool used by the providers (connections, seconds)
+MARKET_DATA_HTTP_MAX_CONNECTIONS = int(os.getenv('MARKET_DATA_HTTP_MAX_CONNECTIONS', '200'))
+MARKET_DATA_HTTP_MAX_PER_HOST = int(os.getenv('MARKET_DATA_HTTP_MAX_PER_HOST', '50'))
+MARKET_DATA_HTTP_TIMEOUT = float(os.getenv('MARKET_DATA_HTTP_TIMEOUT', '10'))
+MARKET_DATA_HTTP_CONNECT_TIMEOUT = float(os.getenv('MARKET_DATA_HTTP_CONNECT_TIMEOUT', '3'))
+MARKET_DATA_HTTP_KEEPALIVE = float(os.getenv('MARKET_DATA_HTTP_KEEPALIVE', '30'))
+
+# Quote fallback mode: sequential, hedged (start the next provider after the
+# current one's p95 latency) or race (all providers at once)
+MARKET_DATA_QUOTE_MODE = os.getenv('MARKET_DATA_QUOTE_MODE', 'hedged')
+MARKET_DATA_HEDGE_DELAY_MS = int(os.getenv('MARKET_DATA_HEDGE_DELAY_MS', '300'))
+MARKET_DATA_HEDGE_MIN_DELAY_MS = int(os.getenv('MARKET_DATA_HEDGE_MIN_DELAY_MS', '50'))
+MARKET_DATA_HEDGE_MAX_DELAY_MS = int(os.getenv('MARKET_DATA_HEDGE_MAX_DELAY_MS', '2000'))
+
+# Bulk listing file for the local symbol index (Alpha Vantage LISTING_STATUS CSV)
+SYMBOL_LISTING_URL = os.getenv('SYMBOL_LISTING_URL', 'https://www.alphavantage.co/query')
+
+# Tiered quote cache (seconds): fresh until the soft TTL, served stale while
+# refreshing until the hard TTL
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv('QUOTE_CACHE_MAX_ENTRIES', '10000'))
+QUOTE_CACHE_SOFT_TTL = int(os.getenv('QUOTE_CACHE_SOFT_TTL', '15'))
+QUOTE_CACHE_HARD_TTL = int(os.getenv('QUOTE_CACHE_HARD_TTL', '300'))
+
+# Symbols per multi-ticker download in bulk quote fetches
+QUOTE_BATCH_SIZE = int(os.getenv('QUOTE_BATCH_SIZE', '100'))
+
+# Rows in the LatestQuote table younger than this (seconds) are served as
+# current quotes without asking an upstream provider
+LATEST_QUOTE_MAX_AGE = int(os.getenv('LATEST_QUOTE_MAX_AGE', '60'))
+
+# MarketData tick history: raw ticks are kept for MARKET_DATA_RETENTION_DAYS
+# (in daily partitions on Postgres), OHLCV rollups for the days below
+# (None keeps them forever)
+MARKET_DATA_RETENTION_DAYS = int(os.getenv('MARKET_DATA_RETENTION_DAYS', '7'))
+MARKET_DATA_PARTITION_DAYS_AHEAD = int(os.getenv('MARKET_DATA_PARTITION_DAYS_AHEAD', '3'))
+PRICE_BAR_RETENTION_DAYS = {
+    '1m': int(os.getenv('PRICE_BAR_1M_RETENTION_DAYS', '30')),
+    '1h': int(os.getenv('PRICE_BAR_1H_RETENTION_DAYS', '730')),
+    '1d': None,
+}
+
+# Alert emails are sent by a Celery task, as per-recipient digests over one
+# SMTP connection in batches of this many messages
+ALERT_NOTIFICATION_BATCH_SIZE = int(os.getenv('ALERT_NOTIFICATION_BATCH_SIZE', '50'))
+# Name a queue to keep them off the default one; something must consume it
+# (celery -A backend worker -Q celery,<queue>)
+ALERT_NOTIFICATION_QUEUE = os.getenv('ALERT_NOTIFICATION_QUEUE')
+CELERY_TASK_ROUTES = {
+    'api.tasks.send_alert_notifications': {'queue': ALERT_NOTIFICATION_QUEUE},
+} if ALERT_NOTIFICATION_QUEUE else {}
+
+# Seconds between ingest_prices cycles
+MARKET_DATA_INGEST_INTERVAL = float(os.getenv('MARKET_DATA_INGEST_INTERVAL', '5'))
+
+# Portfolio sockets fold price ticks arriving within this window (ms) into
+# one delta; a reconnecting client can resume its stream for
+# PORTFOLIO_RESUME_TTL seconds while it is at most PORTFOLIO_RESUME_LOG
+# deltas behind
+PORTFOLIO_PUSH_WINDOW_MS = float(os.getenv('PORTFOLIO_PUSH_WINDOW_MS', '250'))
+PORTFOLIO_RESUME_TTL = int(os.getenv('PORTFOLIO_RESUME_TTL', '300'))
+PORTFOLIO_RESUME_LOG = int(os.getenv('PORTFOLIO_RESUME_LOG', '100'))
+
+# The multiplexed socket (ws/stream/) sends everything due within
+# MULTIPLEX_TICK_MS in one frame, for up to MULTIPLEX_MAX_SYMBOLS quote
+# subscriptions per connection
+MULTIPLEX_TICK_MS = float(os.getenv('MULTIPLEX_TICK_MS', '100'))
+MULTIPLEX_MAX_SYMBOLS = int(os.getenv('MULTIPLEX_MAX_SYMBOLS', '100'))
+
+# Websocket sends are queued per connection, at most WEBSOCKET_OUTBOX_SIZE
+# messages (keep it above PORTFOLIO_RESUME_LOG so a resume replay fits). A
+# connection still overflowing WEBSOCKET_SLOW_GRACE seconds after it first
+# did, or with a send blocked for WEBSOCKET_SEND_TIMEOUT seconds, is closed
+WEBSOCKET_OUTBOX_SIZE = int(os.getenv('WEBSOCKET_OUTBOX_SIZE', '256'))
+WEBSOCKET_SEND_TIMEOUT = float(os.getenv('WEBSOCKET_SEND_TIMEOUT', '10'))
+WEBSOCKET_SLOW_GRACE = float(os.getenv('WEBSOCKET_SLOW_GRACE', '30'))
+
+# Requests slower than this (milliseconds) are logged to 'api.performance'
+# with their database and provider breakdown
+SLOW_REQUEST_MS = float(os.getenv('SLOW_REQUEST_MS', '500'))
+# Bearer token scrapers must send to /metrics; unset leaves it open
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Outbound call budgets ('requests/second|minute|hour|day') per provider and
+# API key, shared by every worker through Redis. Background callers (Celery,
+# ingest, quote pollers) leave PROVIDER_BUDGET_BACKGROUND_RESERVE of each
+# bucket to interactive requests, and each priority waits at most this many
+# seconds for a token before the provider call is treated as failed
+PROVIDER_RATE_LIMITS = {
+    'finnhub': os.getenv('FINNHUB_RATE_LIMIT', '60/minute'),
+    'alpha_vantage': os.getenv('ALPHA_VANTAGE_RATE_LIMIT', '5/minute'),
+    'twelve_data': os.getenv('TWELVEDATA_RATE_LIMIT', '8/minute'),
+    'gemini': os.getenv('GEMINI_RATE_LIMIT', '60/minute'),
+}
+PROVIDER_BUDGET_BACKGROUND_RESERVE = float(os.getenv('PROVIDER_BUDGET_BACKGROUND_RESERVE', '0.2'))
+PROVIDER_BUDGET_MAX_WAIT = {
+    'interactive': float(os.getenv('PROVIDER_BUDGET_INTERACTIVE_WAIT', '2')),
+    'background': float(os.getenv('PROVIDER_BUDGET_BACKGROUND_WAIT', '10')),
+}
+
+# LLM gateway: concurrent provider calls per worker, seconds a generated
+# recommendation is cached, and the relative width of the price bands
+# prompts are built from (a price move out of its band means a new answer)
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_CACHE_TTL = int(os.getenv('LLM_CACHE_TTL', '3600'))
+LLM_PRICE_BAND = float(os.getenv('LLM_PRICE_BAND', '0.02'))
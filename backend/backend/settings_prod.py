@@ -86,6 +86,12 @@ LOGGING = {
             'filename': BASE_DIR / 'logs/django.log',
             'formatter': 'verbose',
         },
+        'performance': {
+            'level': 'WARNING',
+            'class': 'logging.FileHandler',
+            'filename': BASE_DIR / 'logs/performance.log',
+            'formatter': 'verbose',
+        },
     },
     'loggers': {
         'django': {
@@ -93,6 +99,11 @@ LOGGING = {
             'level': 'ERROR',
             'propagate': True,
         },
+        'api.performance': {
+            'handlers': ['performance'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
     },
 }
 
@@ -102,8 +113,8 @@ REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'] = [
 ]
 
 REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES'] = [
-    'rest_framework.throttling.AnonRateThrottle',
-    'rest_framework.throttling.UserRateThrottle'
+    'api.throttling.AnonGCRAThrottle',
+    'api.throttling.UserGCRAThrottle',
 ]
 
 REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] = {
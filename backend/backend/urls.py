@@ -4,7 +4,7 @@ URL configuration for backend project.
 from django.contrib import admin
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from api.views import UserProfileViewSet
+from api.views import UserProfileViewSet, prometheus_metrics_view
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -20,6 +20,7 @@ urlpatterns = [
     path('api/', include('api.urls')),  # Include API URLs from api/urls.py
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('metrics', prometheus_metrics_view, name='prometheus-metrics'),
 ]
 
 if settings.DEBUG: